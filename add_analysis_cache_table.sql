@@ -0,0 +1,26 @@
+-- Add the analysis_cache table to an existing database
+-- Run this script to update your existing database
+
+-- Cached AI analysis results, keyed by a hash of the combined document text,
+-- knowledge base snapshot, model name and prompt version
+CREATE TABLE IF NOT EXISTS analysis_cache (
+    cache_key CHAR(64) PRIMARY KEY,
+    rfp_id INTEGER REFERENCES rfp_metadata(id) ON DELETE SET NULL,
+    model VARCHAR(100),
+    prompt_version VARCHAR(100),
+    knowledge_base_version CHAR(64),
+    analysis JSONB NOT NULL,
+    member_matching JSONB,
+    hit_count INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_analysis_cache_rfp_id ON analysis_cache(rfp_id);
+CREATE INDEX IF NOT EXISTS idx_analysis_cache_last_used_at ON analysis_cache(last_used_at);
+
+-- Verify the changes
+SELECT column_name, data_type, is_nullable 
+FROM information_schema.columns 
+WHERE table_name = 'analysis_cache' 
+ORDER BY ordinal_position;
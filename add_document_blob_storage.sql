@@ -0,0 +1,24 @@
+-- Allow extracted document text to be kept in the compressed blob store (DOCUMENT_TEXT_STORAGE=blob)
+-- Run this script to update your existing database (PostgreSQL 13 or later)
+
+ALTER TABLE document_contents ADD COLUMN IF NOT EXISTS text_storage VARCHAR(16) DEFAULT 'database';
+
+-- Blob-stored pages keep only a pointer to their compressed frame
+ALTER TABLE document_pages ALTER COLUMN page_text DROP NOT NULL;
+ALTER TABLE document_pages ADD COLUMN IF NOT EXISTS blob_offset BIGINT;
+ALTER TABLE document_pages ADD COLUMN IF NOT EXISTS blob_length INTEGER;
+
+-- The search vector is now written with each page instead of generated from page_text,
+-- so it is kept for pages whose text is not in the database
+ALTER TABLE document_pages ADD COLUMN IF NOT EXISTS search_vector tsvector;
+ALTER TABLE document_pages ALTER COLUMN search_vector DROP EXPRESSION IF EXISTS;
+UPDATE document_pages SET search_vector = to_tsvector('english', page_text)
+WHERE search_vector IS NULL AND page_text IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_document_pages_search ON document_pages USING gin(search_vector);
+
+-- Verify the changes
+SELECT column_name, data_type, is_nullable 
+FROM information_schema.columns 
+WHERE table_name IN ('document_contents', 'document_pages') 
+ORDER BY table_name, ordinal_position;
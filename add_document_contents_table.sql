@@ -0,0 +1,25 @@
+-- Add content-hash deduplication of uploaded documents to an existing database
+-- Run this script to update your existing database
+
+-- Extracted text stored once per uploaded file, keyed by a SHA-256 of the file's bytes,
+-- with a SimHash of the text for near-duplicate detection
+CREATE TABLE IF NOT EXISTS document_contents (
+    content_hash CHAR(64) PRIMARY KEY,
+    document_text TEXT,
+    simhash BIGINT,
+    text_length INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Documents reference their content; duplicates of another document of the same RFP
+-- are kept but left out of the AI analysis
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash CHAR(64) REFERENCES document_contents(content_hash);
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS duplicate_of INTEGER REFERENCES documents(id) ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents(content_hash);
+
+-- Verify the changes
+SELECT column_name, data_type, is_nullable 
+FROM information_schema.columns 
+WHERE table_name IN ('document_contents', 'documents') 
+ORDER BY table_name, ordinal_position;
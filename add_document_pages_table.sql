@@ -0,0 +1,47 @@
+-- Add per-page document storage with precomputed sizes to an existing database
+-- Run this script to update your existing database
+
+-- Extracted text page by page (PDF pages; Word documents in pages of about 3000 characters)
+CREATE TABLE IF NOT EXISTS document_pages (
+    content_hash CHAR(64) NOT NULL REFERENCES document_contents(content_hash) ON DELETE CASCADE,
+    page_number INTEGER NOT NULL,
+    page_text TEXT NOT NULL,
+    char_count INTEGER NOT NULL,
+    estimated_tokens INTEGER NOT NULL,
+    PRIMARY KEY (content_hash, page_number)
+);
+
+-- Totals per content, and rolled up onto each document so sizes can be read without the text
+ALTER TABLE document_contents ADD COLUMN IF NOT EXISTS page_count INTEGER;
+ALTER TABLE document_contents ADD COLUMN IF NOT EXISTS estimated_tokens INTEGER;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS page_count INTEGER;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS text_length INTEGER;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS estimated_tokens INTEGER;
+
+-- Existing contents become a single page (4 characters per token, as estimated by the app)
+INSERT INTO document_pages (content_hash, page_number, page_text, char_count, estimated_tokens)
+SELECT content_hash, 1, COALESCE(document_text, ''), length(COALESCE(document_text, '')), (length(COALESCE(document_text, '')) + 3) / 4
+FROM document_contents
+ON CONFLICT DO NOTHING;
+
+UPDATE document_contents
+SET text_length = length(COALESCE(document_text, '')),
+    page_count = 1,
+    estimated_tokens = (length(COALESCE(document_text, '')) + 3) / 4
+WHERE page_count IS NULL;
+
+UPDATE documents d
+SET page_count = c.page_count, text_length = c.text_length, estimated_tokens = c.estimated_tokens
+FROM document_contents c
+WHERE c.content_hash = d.content_hash AND d.page_count IS NULL;
+
+-- Older documents with inline text have no pages, only totals
+UPDATE documents
+SET text_length = length(document_text), estimated_tokens = (length(document_text) + 3) / 4
+WHERE content_hash IS NULL AND document_text IS NOT NULL AND text_length IS NULL;
+
+-- Verify the changes
+SELECT column_name, data_type, is_nullable 
+FROM information_schema.columns 
+WHERE table_name IN ('document_pages', 'document_contents', 'documents') 
+ORDER BY table_name, ordinal_position;
@@ -0,0 +1,16 @@
+-- Add full-text search over the pages of uploaded documents to an existing database
+-- Run this script to update your existing database (PostgreSQL 12 or later for the generated column)
+
+-- Each page's search vector is computed once when the page is stored
+ALTER TABLE document_pages
+    ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (to_tsvector('english', page_text)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_document_pages_search ON document_pages USING gin(search_vector);
+
+-- Older documents stored without pages are searched through this index
+CREATE INDEX IF NOT EXISTS idx_documents_text_search ON documents USING gin(to_tsvector('english', document_text));
+
+-- Verify the changes
+SELECT indexname, indexdef
+FROM pg_indexes
+WHERE indexname IN ('idx_document_pages_search', 'idx_documents_text_search');
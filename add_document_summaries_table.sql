@@ -0,0 +1,19 @@
+-- Add the document_summaries table to an existing database
+-- Run this script to update your existing database
+
+-- Cached per-document summaries used by incremental AI analysis,
+-- keyed by document id and a hash of the document text
+CREATE TABLE IF NOT EXISTS document_summaries (
+    document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    content_hash CHAR(64) NOT NULL,
+    summary TEXT NOT NULL,
+    model VARCHAR(100),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (document_id, content_hash)
+);
+
+-- Verify the changes
+SELECT column_name, data_type, is_nullable 
+FROM information_schema.columns 
+WHERE table_name = 'document_summaries' 
+ORDER BY ordinal_position;
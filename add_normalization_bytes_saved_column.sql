@@ -0,0 +1,10 @@
+-- Record the bytes removed from extracted text by header/footer stripping and whitespace collapsing
+-- Run this script to update your existing database
+
+ALTER TABLE document_contents ADD COLUMN IF NOT EXISTS normalization_bytes_saved INTEGER DEFAULT 0;
+
+-- Verify the changes
+SELECT column_name, data_type, is_nullable 
+FROM information_schema.columns 
+WHERE table_name = 'document_contents' 
+ORDER BY ordinal_position;
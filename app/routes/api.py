@@ -1,9 +1,21 @@
-from flask import Blueprint, request, jsonify
+import json
+import os
+import time
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_login import login_required
 from app.services.database import get_stats, get_database_connection
+from app.services.document_blobs import DocumentBlobError
+from app.services.document_store import (
+    DOCUMENT_TEXT_SQL, DOCUMENT_CONTENTS_JOIN, delete_orphaned_contents, remove_content_blobs, read_page_text, read_text_range
+)
+from app.services.openai_client import OpenAIBusyError
 
 bp = Blueprint('api', __name__)
 
+# Characters of document text returned per /api/document-text request, by default and at most
+DOCUMENT_TEXT_PAGE_CHARS = 50000
+DOCUMENT_TEXT_MAX_CHARS = 500000
+
 @bp.route('/api/stats')
 @login_required
 def get_stats_endpoint():
@@ -137,8 +149,10 @@ def delete_document(document_id):
         
         # Delete the document
         cursor.execute("DELETE FROM documents WHERE id = %s", (document_id,))
+        orphaned_blobs = delete_orphaned_contents(cursor)
         
         conn.commit()
+        remove_content_blobs(cursor, orphaned_blobs)
         cursor.close()
         conn.close()
         
@@ -164,25 +178,38 @@ def get_documents(rfp_id):
         if not cursor.fetchone():
             return jsonify({'error': 'RFP not found'}), 404
         
-        # Get documents for this RFP
-        cursor.execute("""
-            SELECT id, document_name, document_text, created_at
-            FROM documents 
-            WHERE rfp_id = %s 
-            ORDER BY created_at DESC
+        # Get documents for this RFP - only a preview from the first page and the stored sizes, the
+        # full text is fetched per document from /api/document-text/<document_id>
+        cursor.execute(f"""
+            SELECT d.id, d.document_name, COALESCE(left(p.page_text, 200), left(d.document_text, 200)),
+                   d.text_length, d.created_at, d.duplicate_of, d.page_count, d.estimated_tokens,
+                   d.content_hash, p.blob_offset, p.blob_length
+            FROM documents d
+            LEFT JOIN document_pages p ON p.content_hash = d.content_hash AND p.page_number = 1
+            WHERE d.rfp_id = %s 
+            ORDER BY d.created_at DESC, d.id DESC
         """, (rfp_id,))
         
         documents = []
         for row in cursor.fetchall():
-            # Get first 200 characters of text for preview
-            text_preview = row[2][:200] + "..." if len(row[2]) > 200 else row[2]
+            try:
+                text_preview = (read_page_text(row[2], row[8], row[9], row[10]) or '')[:200]
+            except DocumentBlobError as e:
+                print(f"Preview of document {row[0]} unavailable: {e}")
+                text_preview = ''
+            text_length = row[3] or 0
+            if text_length > 200:
+                text_preview += "..."
             
             documents.append({
                 'id': row[0],
                 'document_name': row[1],
-                'document_text': row[2],
                 'text_preview': text_preview,
-                'created_at': row[3].isoformat() if row[3] else None
+                'text_length': text_length,
+                'page_count': row[6],
+                'estimated_tokens': row[7],
+                'created_at': row[4].isoformat() if row[4] else None,
+                'duplicate_of': row[5]
             })
         
         cursor.close()
@@ -193,6 +220,139 @@ def get_documents(rfp_id):
     except Exception as e:
         return jsonify({'error': f'An error occurred: {str(e)}'}), 500
 
+@bp.route('/api/documents/search', methods=['GET'])
+@login_required
+def search_documents():
+    """Full-text search over all uploaded documents, ranked by RFP, with highlighted snippets"""
+    try:
+        from app.services.document_search import SEARCH_RFPS_PER_PAGE, SEARCH_MAX_RFPS_PER_PAGE, search_documents as run_search
+        
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'A search query (q) is required'}), 400
+        try:
+            rfp_id = int(request.args['rfp_id']) if request.args.get('rfp_id') else None
+            offset = max(0, int(request.args.get('offset', 0)))
+            limit = min(max(1, int(request.args.get('limit', SEARCH_RFPS_PER_PAGE))), SEARCH_MAX_RFPS_PER_PAGE)
+        except ValueError:
+            return jsonify({'error': 'rfp_id, offset and limit must be integers'}), 400
+        
+        started = time.perf_counter()
+        conn = get_database_connection()
+        cursor = conn.cursor()
+        results = run_search(cursor, query, rfp_id=rfp_id, limit=limit, offset=offset)
+        cursor.close()
+        conn.close()
+        
+        next_offset = offset + len(results['rfps'])
+        return jsonify({
+            'success': True,
+            'query': query,
+            'rfps': results['rfps'],
+            'total_rfps': results['total_rfps'],
+            'offset': offset,
+            'next_offset': next_offset if next_offset < results['total_rfps'] else None,
+            'search_ms': round((time.perf_counter() - started) * 1000, 1)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': f'An error occurred: {str(e)}'}), 500
+
+@bp.route('/api/document-text/<int:document_id>', methods=['GET'])
+@login_required
+def get_document_text(document_id):
+    """
+    Get the extracted text of a document, a range of characters at a time (offset and limit),
+    or one page at a time (page)
+    """
+    try:
+        if 'page' in request.args:
+            return _get_document_page(document_id)
+        
+        try:
+            offset = max(0, int(request.args.get('offset', 0)))
+            limit = min(max(1, int(request.args.get('limit', DOCUMENT_TEXT_PAGE_CHARS))), DOCUMENT_TEXT_MAX_CHARS)
+        except ValueError:
+            return jsonify({'error': 'offset and limit must be integers'}), 400
+        
+        conn = get_database_connection()
+        cursor = conn.cursor()
+        
+        # Only the requested range leaves the database (or is decompressed from the blob store)
+        cursor.execute(f"""
+            SELECT d.rfp_id, d.document_name, length({DOCUMENT_TEXT_SQL}), substr({DOCUMENT_TEXT_SQL}, %s, %s),
+                   d.content_hash, c.text_storage
+            FROM documents d
+            {DOCUMENT_CONTENTS_JOIN}
+            WHERE d.id = %s
+        """, (offset + 1, limit, document_id))
+        
+        result = cursor.fetchone()
+        if result and result[5] == 'blob':
+            text, total_length = read_text_range(cursor, result[4], offset, limit)
+        elif result:
+            text, total_length = result[3] or '', result[2] or 0
+        cursor.close()
+        conn.close()
+        
+        if not result:
+            return jsonify({'error': 'Document not found'}), 404
+        
+        next_offset = offset + len(text)
+        
+        return jsonify({
+            'success': True,
+            'document_id': document_id,
+            'rfp_id': result[0],
+            'document_name': result[1],
+            'offset': offset,
+            'text': text,
+            'total_length': total_length,
+            'next_offset': next_offset if next_offset < total_length else None
+        })
+        
+    except DocumentBlobError as e:
+        return jsonify({'error': f'The text of this document cannot be read: {str(e)}'}), 503
+    except Exception as e:
+        return jsonify({'error': f'An error occurred: {str(e)}'}), 500
+
+def _get_document_page(document_id):
+    try:
+        page_number = int(request.args['page'])
+    except ValueError:
+        return jsonify({'error': 'page must be an integer'}), 400
+    
+    conn = get_database_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT d.rfp_id, d.document_name, d.page_count, p.page_text, p.char_count, p.estimated_tokens,
+               d.content_hash, p.blob_offset, p.blob_length
+        FROM documents d
+        LEFT JOIN document_pages p ON p.content_hash = d.content_hash AND p.page_number = %s
+        WHERE d.id = %s
+    """, (page_number, document_id))
+    result = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    
+    if not result:
+        return jsonify({'error': 'Document not found'}), 404
+    page_text = read_page_text(result[3], result[6], result[7], result[8])
+    if page_text is None:
+        return jsonify({'error': f'Page {page_number} not found', 'page_count': result[2]}), 404
+    
+    return jsonify({
+        'success': True,
+        'document_id': document_id,
+        'rfp_id': result[0],
+        'document_name': result[1],
+        'page': page_number,
+        'page_count': result[2],
+        'text': page_text,
+        'char_count': result[4],
+        'estimated_tokens': result[5]
+    })
+
 @bp.route('/api/document-upload/<int:rfp_id>', methods=['POST'])
 @login_required
 def upload_document(rfp_id):
@@ -214,55 +374,258 @@ def upload_document(rfp_id):
             return jsonify({'error': 'No file selected'}), 400
         
         # Validate file type
-        allowed_extensions = {'pdf', 'doc', 'docx'}
-        if not file.filename.lower().endswith(tuple('.' + ext for ext in allowed_extensions)):
+        from app.services.document_extraction import ALLOWED_EXTENSIONS
+        if not file.filename.lower().endswith(tuple('.' + ext for ext in ALLOWED_EXTENSIONS)):
             return jsonify({'error': 'Invalid file type. Please upload PDF, DOC, or DOCX files only.'}), 400
         
-        # Extract text from document
-        import PyPDF2
-        import docx
-        import io
+        # Extract text from document (skipped when the same file was uploaded before) and store it
+        from app.services.document_extraction import DocumentExtractionError
+        from app.services.document_store import ingest_upload
         
-        document_text = ""
-        document_name = file.filename
+        try:
+            result = ingest_upload(cursor, rfp_id, file)
+        except DocumentExtractionError as e:
+            return jsonify({'error': str(e)}), 400
         
-        if file.filename.lower().endswith('.pdf'):
-            # Handle PDF files
-            try:
-                pdf_reader = PyPDF2.PdfReader(io.BytesIO(file.read()))
-                for page in pdf_reader.pages:
-                    document_text += page.extract_text() + "\n"
-            except Exception as e:
-                return jsonify({'error': f'Error reading PDF file: {str(e)}'}), 400
-                
-        elif file.filename.lower().endswith(('.doc', '.docx')):
-            # Handle Word documents
-            try:
-                doc = docx.Document(io.BytesIO(file.read()))
-                for paragraph in doc.paragraphs:
-                    document_text += paragraph.text + "\n"
-            except Exception as e:
-                return jsonify({'error': f'Error reading Word document: {str(e)}'}), 400
+        conn.commit()
+        cursor.close()
+        conn.close()
         
-        # Store in database
-        cursor.execute("""
-            INSERT INTO documents (rfp_id, document_name, document_text)
-            VALUES (%s, %s, %s)
-            RETURNING id, document_name, created_at
-        """, (rfp_id, document_name, document_text))
+        return _document_uploaded(rfp_id, result)
         
-        result = cursor.fetchone()
-        conn.commit()
+    except Exception as e:
+        return jsonify({'error': f'An error occurred: {str(e)}'}), 500
+
+def _document_uploaded(rfp_id, result):
+    """Start the follow-up work for a stored upload and build the upload response"""
+    # Summarize long documents now, so later incremental analyses can use the stored summary
+    from app.services.document_summaries import summarize_document_in_background, summarize_on_upload
+    if not result['duplicate'] and summarize_on_upload():
+        summarize_document_in_background(result['id'], result['document_name'], result['document_text'])
+    
+    # Optionally start analysing the RFP once the upload batch is complete (ANALYSIS_SPECULATIVE_DELAY)
+    from app.services.speculative_analysis import schedule_speculative_analysis
+    schedule_speculative_analysis(rfp_id)
+    
+    return jsonify({
+        'success': True,
+        'document': {
+            'id': result['id'],
+            'document_name': result['document_name'],
+            'created_at': result['created_at'].isoformat() if result['created_at'] else None,
+            'duplicate_of': result['duplicate'],
+            'supersedes': result['supersedes']
+        },
+        'extraction': result['extraction']
+    })
+
+def _chunked_upload_error(e):
+    response = {'error': str(e)}
+    if e.received is not None:
+        response['received'] = e.received
+    return jsonify(response), e.status_code
+
+def _chunked_upload_status(manifest):
+    return {
+        'upload_id': manifest['upload_id'],
+        'document_name': manifest['document_name'],
+        'size': manifest['size'],
+        'received': manifest['received']
+    }
+
+@bp.route('/api/document-upload/<int:rfp_id>/chunked', methods=['POST'])
+@login_required
+def start_chunked_upload(rfp_id):
+    """Start a resumable upload of a large document; the file is then sent with PUT requests in byte ranges"""
+    try:
+        from app.services.chunked_uploads import CHUNKED_UPLOAD_CHUNK_BYTES, ChunkedUploadError, get_chunked_upload_store
+        from app.services.document_extraction import ALLOWED_EXTENSIONS
+        
+        data = request.get_json() or {}
+        document_name = os.path.basename(str(data.get('document_name') or '').replace('\\', '/'))
+        if not document_name:
+            return jsonify({'error': 'document_name is required'}), 400
+        if not document_name.lower().endswith(tuple('.' + ext for ext in ALLOWED_EXTENSIONS)):
+            return jsonify({'error': 'Invalid file type. Please upload PDF, DOC, or DOCX files only.'}), 400
+        try:
+            size = int(data.get('size') or 0)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'size must be a number of bytes'}), 400
+        
+        conn = get_database_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM rfp_metadata WHERE id = %s", (rfp_id,))
+        found = cursor.fetchone()
         cursor.close()
         conn.close()
+        if not found:
+            return jsonify({'error': 'RFP not found'}), 404
+        
+        try:
+            manifest = get_chunked_upload_store().create(rfp_id, document_name, size)
+        except ChunkedUploadError as e:
+            return _chunked_upload_error(e)
+        
+        response = _chunked_upload_status(manifest)
+        response['chunk_size'] = CHUNKED_UPLOAD_CHUNK_BYTES
+        return jsonify(response), 201
+        
+    except Exception as e:
+        return jsonify({'error': f'An error occurred: {str(e)}'}), 500
+
+@bp.route('/api/chunked-upload/<upload_id>', methods=['GET'])
+@login_required
+def get_chunked_upload(upload_id):
+    """Report how many bytes of an upload have arrived, i.e. where to resume it"""
+    from app.services.chunked_uploads import ChunkedUploadError, get_chunked_upload_store
+    try:
+        return jsonify(_chunked_upload_status(get_chunked_upload_store().status(upload_id)))
+    except ChunkedUploadError as e:
+        return _chunked_upload_error(e)
+
+@bp.route('/api/chunked-upload/<upload_id>', methods=['PUT'])
+@login_required
+def put_chunked_upload(upload_id):
+    """Write one byte range of an upload, given by the Content-Range header; the body is streamed to disk"""
+    try:
+        from app.services.chunked_uploads import ChunkedUploadError, get_chunked_upload_store, parse_content_range
+        
+        try:
+            start, end, total = parse_content_range(request.headers.get('Content-Range'))
+            if request.content_length is not None and request.content_length != end - start:
+                raise ChunkedUploadError('Content-Length does not match the Content-Range')
+            manifest = get_chunked_upload_store().write_chunk(upload_id, request.stream, start, end, total)
+        except ChunkedUploadError as e:
+            return _chunked_upload_error(e)
+        
+        return jsonify(_chunked_upload_status(manifest))
+        
+    except Exception as e:
+        return jsonify({'error': f'An error occurred: {str(e)}'}), 500
+
+@bp.route('/api/chunked-upload/<upload_id>/finalize', methods=['POST'])
+@login_required
+def finalize_chunked_upload(upload_id):
+    """Extract and store a completely received upload, like /api/document-upload"""
+    try:
+        from app.services.chunked_uploads import ChunkedUploadError, get_chunked_upload_store
+        from app.services.document_extraction import DocumentExtractionError
+        from app.services.document_store import ingest_file
+        
+        store = get_chunked_upload_store()
+        try:
+            manifest, path, content_hash = store.complete(upload_id)
+        except ChunkedUploadError as e:
+            return _chunked_upload_error(e)
+        
+        rfp_id = manifest['rfp_id']
+        conn = get_database_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT id FROM rfp_metadata WHERE id = %s", (rfp_id,))
+            if not cursor.fetchone():
+                # The RFP was deleted while the upload was in progress, so it can never be finalized:
+                # remove the spool files now instead of leaving them until the upload expires
+                store.discard(upload_id)
+                return jsonify({'error': 'RFP not found'}), 404
+            
+            try:
+                result = ingest_file(cursor, rfp_id, manifest['document_name'], path, content_hash)
+            except DocumentExtractionError as e:
+                store.discard(upload_id)
+                return jsonify({'error': str(e)}), 400
+            
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+        # On any other error the upload is kept, so finalizing can be retried
+        store.discard(upload_id)
+        
+        return _document_uploaded(rfp_id, result)
+        
+    except Exception as e:
+        return jsonify({'error': f'An error occurred: {str(e)}'}), 500
+
+@bp.route('/api/chunked-upload/<upload_id>', methods=['DELETE'])
+@login_required
+def abort_chunked_upload(upload_id):
+    """Abandon an upload and delete what has arrived"""
+    from app.services.chunked_uploads import ChunkedUploadError, get_chunked_upload_store
+    try:
+        store = get_chunked_upload_store()
+        store.status(upload_id)
+        store.discard(upload_id)
+        return jsonify({'success': True})
+    except ChunkedUploadError as e:
+        return _chunked_upload_error(e)
+
+@bp.route('/api/document-upload-batch/<int:rfp_id>', methods=['POST'])
+@login_required
+def upload_documents_batch(rfp_id):
+    """Upload several documents, or ZIP archives of documents, in one request"""
+    try:
+        from app.services.document_extraction import ALLOWED_EXTENSIONS
+        from app.services.document_store import BatchUploadError, expand_batch_uploads, ingest_batch
+        
+        conn = get_database_connection()
+        cursor = conn.cursor()
+        try:
+            # Check if RFP exists
+            cursor.execute("SELECT id FROM rfp_metadata WHERE id = %s", (rfp_id,))
+            if not cursor.fetchone():
+                return jsonify({'error': 'RFP not found'}), 404
+            
+            files = [f for f in request.files.getlist('documents') + request.files.getlist('document') if f.filename]
+            if not files:
+                return jsonify({'error': 'No files uploaded'}), 400
+            
+            try:
+                uploads, skipped = expand_batch_uploads(files, ALLOWED_EXTENSIONS)
+            except BatchUploadError as e:
+                return jsonify({'error': str(e)}), 400
+            if not uploads:
+                return jsonify({'error': 'No PDF, DOC or DOCX documents found in the upload', 'skipped': skipped}), 400
+            
+            # Extract concurrently, then insert every document in one transaction
+            results = ingest_batch(cursor, rfp_id, uploads, workers=int(os.environ.get('BATCH_UPLOAD_WORKERS', 4)))
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+        
+        stored = [result for result in results if result['status'] == 'stored']
+        from app.services.document_summaries import summarize_document_in_background, summarize_on_upload
+        if summarize_on_upload():
+            for result in stored:
+                summarize_document_in_background(result['id'], result['document_name'], result['document_text'])
+        
+        if stored:
+            from app.services.speculative_analysis import schedule_speculative_analysis
+            schedule_speculative_analysis(rfp_id)
+        
+        documents = []
+        for result in results:
+            if result['status'] == 'error':
+                documents.append({'document_name': result['document_name'], 'status': 'error', 'error': result['error']})
+            else:
+                documents.append({
+                    'id': result['id'],
+                    'document_name': result['document_name'],
+                    'status': result['status'],
+                    'created_at': result['created_at'].isoformat() if result['created_at'] else None,
+                    'duplicate_of': result['duplicate'],
+                    'supersedes': result['supersedes'],
+                    'extraction': result['extraction']
+                })
         
         return jsonify({
             'success': True,
-            'document': {
-                'id': result[0],
-                'document_name': result[1],
-                'created_at': result[2].isoformat() if result[2] else None
-            }
+            'documents': documents,
+            'skipped': skipped,
+            'stored': len(stored),
+            'duplicates': sum(1 for result in results if result['status'] == 'duplicate'),
+            'errors': sum(1 for result in results if result['status'] == 'error')
         })
         
     except Exception as e:
@@ -283,11 +646,16 @@ def delete_rfp(rfp_id):
         
         # Delete the RFP (documents will be deleted automatically due to CASCADE)
         cursor.execute("DELETE FROM rfp_metadata WHERE id = %s", (rfp_id,))
+        orphaned_blobs = delete_orphaned_contents(cursor)
         
         conn.commit()
+        remove_content_blobs(cursor, orphaned_blobs)
         cursor.close()
         conn.close()
         
+        from app.services.speculative_analysis import get_speculative_scheduler
+        get_speculative_scheduler().cancel(rfp_id)
+        
         return jsonify({'success': True, 'message': 'RFP and all associated documents deleted successfully'})
         
     except Exception as e:
@@ -379,323 +747,196 @@ def update_rfp(rfp_id):
 def ai_analyze_rfp(rfp_id):
     """Analyze RFP using AI against company knowledge base"""
     try:
-        from app.services.knowledge_base import KnowledgeBaseService
-        
-        # Get RFP metadata and documents
-        conn = get_database_connection()
-        cursor = conn.cursor()
-        
-        # Get RFP metadata
-        cursor.execute("""
-            SELECT project_name, organization_group, project_focus, due_date, 
-                   country, region, industry, opf_gap_size, opf_gaps, deliverables
-            FROM rfp_metadata 
-            WHERE id = %s
-        """, (rfp_id,))
-        rfp_result = cursor.fetchone()
-        
-        if not rfp_result:
-            return jsonify({'error': 'RFP not found'}), 404
+        from app.services.analysis_pipeline import (
+            AnalysisRequestError, prepare_analysis, finalize_analysis, begin_analysis, should_wait_for_leader, wait_for_leader
+        )
         
-        # Get all documents for this RFP
-        cursor.execute("""
-            SELECT document_name, document_text 
-            FROM documents 
-            WHERE rfp_id = %s 
-            ORDER BY created_at DESC
-        """, (rfp_id,))
-        documents = cursor.fetchall()
+        data = request.get_json(silent=True) or {}
+        force_refresh = bool(data.get('force_refresh', False))
         
-        if not documents:
-            return jsonify({'error': 'No documents found for this RFP. Please upload documents first.'}), 400
+        try:
+            job = prepare_analysis(rfp_id, force_refresh=force_refresh, mode=data.get('mode'),
+                                   incremental=data.get('incremental'))
+        except AnalysisRequestError as e:
+            return jsonify({'error': str(e)}), e.status_code
         
-        cursor.close()
-        conn.close()
+        # Only one request per RFP runs the analysis at a time, across all workers
+        lock = begin_analysis(job)
+        try:
+            if should_wait_for_leader(lock):
+                try:
+                    wait_for_leader(job, lock)
+                except AnalysisRequestError as e:
+                    return jsonify({'error': str(e)}), e.status_code
+            
+            if job['cached']:
+                analysis = job['cached']['analysis']
+            else:
+                # Perform AI analysis
+                analysis = job['kb_service'].run_analysis(job['rfp_text'], job['rfp_metadata'], mode=job['mode'],
+                                                          documents=job['analysis_documents'])
+            
+            # Finalize while still holding the lock, so waiting requests find the cached result
+            return jsonify(finalize_analysis(job, analysis))
+        finally:
+            lock.release()
         
-        # Prepare RFP metadata
-        rfp_metadata = {
-            'project_name': rfp_result[0] or '',
-            'organization_group': rfp_result[1] or '',
-            'project_focus': rfp_result[2] or '',
-            'due_date': rfp_result[3].isoformat() if rfp_result[3] else None,
-            'country': rfp_result[4] or '',
-            'region': rfp_result[5] or '',
-            'industry': rfp_result[6] or '',
-            'opf_gap_size': rfp_result[7] or '',
-            'opf_gaps': rfp_result[8] or '',
-            'deliverables': rfp_result[9] or ''
-        }
+    except OpenAIBusyError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': f'An error occurred during AI analysis: {str(e)}'}), 500
+
+
+def _sse_event(event, data):
+    """Format a server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@bp.route('/api/ai-analyze/<int:rfp_id>/stream', methods=['POST'])
+@login_required
+def ai_analyze_rfp_stream(rfp_id):
+    """Analyze RFP using AI, streaming tokens and completed sections as server-sent events"""
+    try:
+        from app.services.analysis_pipeline import (
+            AnalysisRequestError, prepare_analysis, finalize_analysis, begin_analysis, should_wait_for_leader, wait_for_leader
+        )
         
-        # Combine all document text
-        rfp_text = "\n\n".join([
-            f"Document: {doc[0]}\n{doc[1]}" 
-            for doc in documents
-        ])
+        data = request.get_json(silent=True) or {}
+        force_refresh = bool(data.get('force_refresh', False))
         
-        # Initialize knowledge base service
-        kb_service = KnowledgeBaseService()
+        try:
+            job = prepare_analysis(rfp_id, force_refresh=force_refresh, mode=data.get('mode'),
+                                   incremental=data.get('incremental'))
+        except AnalysisRequestError as e:
+            return jsonify({'error': str(e)}), e.status_code
         
-        # Try to initialize knowledge base if it doesn't exist
+    except Exception as e:
+        return jsonify({'error': f'An error occurred during AI analysis: {str(e)}'}), 500
+    
+    def generate():
+        # Only one request per RFP runs the analysis at a time, across all workers
+        lock = begin_analysis(job)
         try:
-            global _kb_initializing
+            if should_wait_for_leader(lock):
+                yield _sse_event('status', {'type': 'status', 'message': 'This RFP is already being analyzed, waiting for that analysis to finish...'})
+                wait_for_leader(job, lock)
             
-            # Check current status using helper function
-            status_result = _check_knowledge_base_status()
+            if job['cached']:
+                analysis = job['cached']['analysis']
+                # Replay the stored sections so the browser renders them the same way as a live run
+                for section, content in analysis.items():
+                    yield _sse_event('section', {'type': 'section', 'section': section, 'content': content})
+            else:
+                analysis = None
+                for event in job['kb_service'].stream_analysis(job['rfp_text'], job['rfp_metadata'], mode=job['mode'],
+                                                                documents=job['analysis_documents']):
+                    if event['type'] == 'complete':
+                        analysis = event['analysis']
+                    else:
+                        yield _sse_event(event['type'], event)
+                
+                yield _sse_event('status', {'type': 'status', 'message': 'Saving analysis and finding relevant team members...'})
             
-            if not status_result['success']:
-                return jsonify({'error': status_result['error']}), 500
+            # Persist the final result through the same path as the non-streaming endpoint
+            yield _sse_event('complete', finalize_analysis(job, analysis))
             
-            # If not initialized, initialize it
-            if status_result['status'] == 'not_initialized':
-                # Check if another process is already initializing
-                if _kb_initializing:
-                    return jsonify({'error': 'Knowledge base is currently being initialized by another process. Please wait a moment and try again.'}), 429
-                
-                # Set lock and initialize
-                _kb_initializing = True
-                try:
-                    print("Knowledge base not initialized, initializing now...")
-                    char_count = kb_service.load_knowledge_base("knowledge_base")
-                    print(f"Knowledge base initialization completed with {char_count} characters loaded")
-                finally:
-                    _kb_initializing = False
-            else:
-                print(f"Knowledge base already initialized with {status_result['char_count']} characters, proceeding with analysis")
+        except AnalysisRequestError as e:
+            yield _sse_event('error', {'error': str(e)})
         except Exception as e:
-            print(f"Error during knowledge base initialization: {e}")
-            # Ensure lock is released on error
-            _kb_initializing = False
-            return jsonify({'error': f'Failed to initialize knowledge base: {str(e)}'}), 500
-        
-        # Perform AI analysis
-        analysis = kb_service.analyze_rfp(rfp_text, rfp_metadata)
-        
-        # Debug: Print analysis structure
-        print(f"Analysis structure: {type(analysis)}")
-        print(f"Analysis keys: {list(analysis.keys()) if isinstance(analysis, dict) else 'Not a dict'}")
-        
-        # Ensure analysis is a dictionary
-        if not isinstance(analysis, dict):
-            analysis = {'error': 'Analysis result is not a dictionary'}
-        
-        # Save analysis results to database
-        conn = get_database_connection()
-        cursor = conn.cursor()
+            print(f"Streaming analysis failed: {e}")
+            yield _sse_event('error', {'error': f'An error occurred during AI analysis: {str(e)}'})
+        finally:
+            lock.release()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@bp.route('/api/ai-analyze/<int:rfp_id>/section/<section_name>', methods=['POST'])
+@login_required
+def ai_regenerate_section(rfp_id, section_name):
+    """Regenerate a single AI analysis section without re-running the full analysis"""
+    try:
+        from app.services.analysis_prompts import ANALYSIS_SECTIONS
+        from app.services.analysis_pipeline import (
+            AnalysisRequestError, RfpAnalysisLock, prepare_analysis, save_analysis_section
+        )
+        from app.services.analysis_cache import update_cached_section
         
-        # Get extracted metadata if available
-        extracted_metadata = analysis.get('extracted_metadata', {})
-        
-        # Debug: Print extracted metadata structure
-        print(f"Extracted metadata: {extracted_metadata}")
-        print(f"Extracted metadata type: {type(extracted_metadata)}")
-        
-        # Helper function to safely extract string values
-        def safe_get_string(data, key, default=''):
-            value = data.get(key, default)
-            print(f"Processing key '{key}' with value: {value} (type: {type(value)})")
-            if isinstance(value, dict):
-                return str(value)  # Convert dict to string
-            elif isinstance(value, list):
-                return str(value)  # Convert list to string
-            elif value is None:
-                return default
-            else:
-                return str(value)  # Convert any other type to string
+        # Accept both the section key and the column name, e.g. risk_assessment or ai_risk_assessment
+        section = section_name[3:] if section_name.startswith('ai_') else section_name
+        if section not in ANALYSIS_SECTIONS:
+            return jsonify({'error': f"Unknown analysis section '{section_name}'. Use one of: {', '.join(ANALYSIS_SECTIONS)}"}), 400
         
-        # Update both AI analysis results and extracted metadata
-        cursor.execute("""
-            UPDATE rfp_metadata 
-            SET 
-                ai_fit_assessment = %s,
-                ai_competitive_position = %s,
-                ai_key_strengths = %s,
-                ai_gaps_challenges = %s,
-                ai_resource_requirements = %s,
-                ai_risk_assessment = %s,
-                ai_recommendations = %s,
-                ai_analysis_date = CURRENT_TIMESTAMP,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE id = %s
-        """, (
-            safe_get_string(analysis, 'fit_assessment', ''),
-            safe_get_string(analysis, 'competitive_position', ''),
-            safe_get_string(analysis, 'key_strengths', ''),
-            safe_get_string(analysis, 'gaps_challenges', ''),
-            safe_get_string(analysis, 'resource_requirements', ''),
-            safe_get_string(analysis, 'risk_assessment', ''),
-            safe_get_string(analysis, 'recommendations', ''),
-            rfp_id
-        ))
+        data = request.get_json(silent=True) or {}
         
-        # Update metadata fields individually to avoid type conflicts
         try:
-            if extracted_metadata.get('organization_group'):
-                cursor.execute("UPDATE rfp_metadata SET organization_group = %s WHERE id = %s", 
-                             (str(extracted_metadata['organization_group']), rfp_id))
-            
-            if extracted_metadata.get('country'):
-                cursor.execute("UPDATE rfp_metadata SET country = %s WHERE id = %s", 
-                             (str(extracted_metadata['country']), rfp_id))
-            
-            if extracted_metadata.get('region'):
-                cursor.execute("UPDATE rfp_metadata SET region = %s WHERE id = %s", 
-                             (str(extracted_metadata['region']), rfp_id))
-            
-            if extracted_metadata.get('industry'):
-                cursor.execute("UPDATE rfp_metadata SET industry = %s WHERE id = %s", 
-                             (str(extracted_metadata['industry']), rfp_id))
-            
-            if extracted_metadata.get('project_focus'):
-                cursor.execute("UPDATE rfp_metadata SET project_focus = %s WHERE id = %s", 
-                             (str(extracted_metadata['project_focus']), rfp_id))
-            
-            if extracted_metadata.get('opf_gap_size'):
-                cursor.execute("UPDATE rfp_metadata SET opf_gap_size = %s WHERE id = %s", 
-                             (str(extracted_metadata['opf_gap_size']), rfp_id))
-            
-            if extracted_metadata.get('opf_gaps'):
-                cursor.execute("UPDATE rfp_metadata SET opf_gaps = %s WHERE id = %s", 
-                             (str(extracted_metadata['opf_gaps']), rfp_id))
-            
-            if extracted_metadata.get('deliverables'):
-                cursor.execute("UPDATE rfp_metadata SET deliverables = %s WHERE id = %s", 
-                             (str(extracted_metadata['deliverables']), rfp_id))
-            
-            if extracted_metadata.get('posting_contact'):
-                cursor.execute("UPDATE rfp_metadata SET posting_contact = %s WHERE id = %s", 
-                             (str(extracted_metadata['posting_contact']), rfp_id))
-            
-            if extracted_metadata.get('potential_experts'):
-                cursor.execute("UPDATE rfp_metadata SET potential_experts = %s WHERE id = %s", 
-                             (str(extracted_metadata['potential_experts']), rfp_id))
-            
-            if extracted_metadata.get('project_cost'):
-                # Validate and format the project cost
-                project_cost = extracted_metadata['project_cost']
-                try:
-                    # Try to convert to float and ensure it's a valid number
-                    if project_cost and project_cost != 'null':
-                        cost_value = float(project_cost)
-                        if cost_value > 0:  # Only accept positive costs
-                            cursor.execute("UPDATE rfp_metadata SET project_cost = %s WHERE id = %s", 
-                                         (cost_value, rfp_id))
-                except (ValueError, TypeError) as e:
-                    print(f"Invalid project cost '{project_cost}': {e}")
-                    # Skip updating this field if cost is invalid
-            
-            if extracted_metadata.get('currency'):
-                cursor.execute("UPDATE rfp_metadata SET currency = %s WHERE id = %s", 
-                             (str(extracted_metadata['currency']), rfp_id))
-            
-            if extracted_metadata.get('specific_staffing_needs'):
-                cursor.execute("UPDATE rfp_metadata SET specific_staffing_needs = %s WHERE id = %s", 
-                             (str(extracted_metadata['specific_staffing_needs']), rfp_id))
-            
-            if extracted_metadata.get('due_date'):
-                # Validate and format the due date
-                due_date = extracted_metadata['due_date']
-                try:
-                    # Try to parse the date and ensure it's in YYYY-MM-DD format
-                    if due_date and due_date != 'null':
-                        # If it's just a year, convert to YYYY-01-01
-                        if len(due_date) == 4 and due_date.isdigit():
-                            due_date = f"{due_date}-01-01"
-                        # If it's YYYY-MM, convert to YYYY-MM-01
-                        elif len(due_date) == 7 and due_date.count('-') == 1:
-                            due_date = f"{due_date}-01"
-                        
-                        # Validate the final date format
-                        from datetime import datetime
-                        datetime.strptime(due_date, '%Y-%m-%d')
-                        
-                        cursor.execute("UPDATE rfp_metadata SET due_date = %s WHERE id = %s", 
-                                     (due_date, rfp_id))
-                except (ValueError, TypeError) as e:
-                    print(f"Invalid date format '{due_date}': {e}")
-                    # Skip updating this field if date is invalid
-        except Exception as e:
-            print(f"Error updating extracted metadata: {e}")
-            print(f"Error type: {type(e)}")
-            raise  # Re-raise to see the full error
+            job = prepare_analysis(rfp_id, force_refresh=True, incremental=data.get('incremental'))
+        except AnalysisRequestError as e:
+            return jsonify({'error': str(e)}), e.status_code
         
-        conn.commit()
-        cursor.close()
-        conn.close()
+        # A full analysis in flight would overwrite the regenerated section when it finishes
+        lock = RfpAnalysisLock(rfp_id)
+        if not lock.try_acquire() and not lock.unavailable:
+            lock.release()
+            return jsonify({'error': 'An analysis of this RFP is in progress. Please try again when it has finished.'}), 409
         
-        # Try to find relevant members based on the analysis
-        member_matching_result = None
         try:
-            from app.services.member_matcher import MemberMatcherService
-            matcher_service = MemberMatcherService()
-            member_matching_result = matcher_service.find_relevant_members(analysis)
-        except Exception as member_error:
-            print(f"Member matching failed: {member_error}")
-            member_matching_result = {
-                'success': False,
-                'error': f'Member matching failed: {str(member_error)}',
-                'keywords': [],
-                'members': []
-            }
+            kb_service = job['kb_service']
+            content = kb_service.regenerate_section(job['rfp_text'], section, job['rfp_metadata'],
+                                                    documents=job['analysis_documents'])
+            save_analysis_section(rfp_id, section, content)
+            
+            # Keep the cached full analysis of the current documents consistent with the stored section
+            try:
+                update_cached_section(job['cache_key'], section, content)
+            except Exception as cache_error:
+                print(f"Failed to update cached analyses: {cache_error}")
+        finally:
+            lock.release()
         
         return jsonify({
             'success': True,
-            'analysis': analysis,
             'rfp_id': rfp_id,
-            'documents_analyzed': len(documents),
-            'member_matching': member_matching_result
+            'section': section,
+            'content': content,
+            'usage': dict(kb_service.usage),
+            'timings_ms': {
+                stage: round(seconds * 1000, 1)
+                for stage, seconds in dict(job['timings'], **kb_service.timings).items()
+            }
         })
         
+    except OpenAIBusyError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
-        return jsonify({'error': f'An error occurred during AI analysis: {str(e)}'}), 500
-
+        return jsonify({'error': f'An error occurred while regenerating the section: {str(e)}'}), 500
 
-# Global flag to prevent multiple simultaneous initializations
-_kb_initializing = False
 
 def _check_knowledge_base_status():
     """Helper function to check knowledge base status consistently"""
     try:
-        import os
-        from app.services.knowledge_base import KnowledgeBaseService
-        
-        kb_service = KnowledgeBaseService()
+        from app.services.kb_store import get_knowledge_base_store
         
-        # Check if knowledge base directory exists and has text files
-        if not os.path.exists(kb_service.knowledge_base_path):
-            return {
-                'success': True,
-                'status': 'not_initialized',
-                'char_count': 0,
-                'message': 'Knowledge base directory not found'
-            }
-        
-        # Count text files in knowledge base directory
-        txt_files = [f for f in os.listdir(kb_service.knowledge_base_path) if f.endswith('.txt')]
-        
-        if not txt_files:
-            return {
-                'success': True,
-                'status': 'not_initialized',
-                'char_count': 0,
-                'message': 'No text files found in knowledge base directory'
-            }
-        
-        # Try to load knowledge base to get character count
+        # The shared store only stats the directory once per revalidation interval
+        store = get_knowledge_base_store()
         try:
-            char_count = kb_service.load_knowledge_base()
+            snapshot = store.get_snapshot()
             return {
                 'success': True,
                 'status': 'initialized',
-                'char_count': char_count,
-                'file_count': len(txt_files),
-                'message': f'Knowledge base is initialized with {len(txt_files)} files ({char_count} characters)'
+                'char_count': snapshot.char_count,
+                'file_count': snapshot.file_count,
+                'message': f'Knowledge base is initialized with {snapshot.file_count} files ({snapshot.char_count} characters)'
             }
         except Exception as e:
             return {
                 'success': True,
                 'status': 'not_initialized',
                 'char_count': 0,
-                'message': f'Knowledge base files found but could not load: {str(e)}'
+                'message': f'Knowledge base could not be loaded: {str(e)}'
             }
             
     except Exception as e:
@@ -740,14 +981,11 @@ def init_knowledge_base():
                 'file_count': status_result.get('file_count', 0)
             })
         
-        # Initialize the knowledge base
-        from app.services.knowledge_base import KnowledgeBaseService
-        kb_service = KnowledgeBaseService()
-        char_count = kb_service.load_knowledge_base("knowledge_base", force_reset=force_reset)
-        
-        # Count files loaded
-        txt_files = [f for f in os.listdir("knowledge_base") if f.endswith('.txt')]
-        file_count = len(txt_files)
+        # Initialize (or reload) the shared knowledge base snapshot
+        from app.services.kb_store import get_knowledge_base_store
+        snapshot = get_knowledge_base_store().get_snapshot(force_reload=force_reset)
+        char_count = snapshot.char_count
+        file_count = snapshot.file_count
         
         action = "reinitialized" if force_reset else "initialized"
         return jsonify({
@@ -1188,6 +1426,7 @@ def find_relevant_members(rfp_id):
         from app.services.member_matcher import MemberMatcherService
         
         # Get RFP analysis from database
+        started = time.perf_counter()
         conn = get_database_connection()
         cursor = conn.cursor()
         
@@ -1202,6 +1441,7 @@ def find_relevant_members(rfp_id):
         rfp_result = cursor.fetchone()
         cursor.close()
         conn.close()
+        database_seconds = time.perf_counter() - started
         
         if not rfp_result:
             return jsonify({'error': 'RFP not found'}), 404
@@ -1231,6 +1471,10 @@ def find_relevant_members(rfp_id):
         # Add RFP context to the result
         result['rfp_id'] = rfp_id
         result['project_name'] = analysis['project_name']
+        result['timings_ms'] = {
+            'database': round((database_seconds + matcher_service.timings['database']) * 1000, 1),
+            'llm': round(matcher_service.timings['llm'] * 1000, 1)
+        }
         
         return jsonify(result)
         
@@ -0,0 +1,103 @@
+import hashlib
+import json
+from typing import Dict, Any, Optional
+from app.services.database import get_database_connection
+
+
+def compute_analysis_cache_key(rfp_text: str, knowledge_base_version: str, model: str, prompt_version: str) -> str:
+    """
+    Content-addressed key for an analysis: identical documents, knowledge base snapshot,
+    model and prompt always map to the same key, regardless of which RFP they belong to
+    """
+    digest = hashlib.sha256()
+    for part in (prompt_version, model, knowledge_base_version, rfp_text):
+        encoded = part.encode('utf-8')
+        # Length-prefix every part so different splits of the same bytes never collide
+        digest.update(len(encoded).to_bytes(8, 'big'))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+def get_cached_analysis(cache_key: str) -> Optional[Dict[str, Any]]:
+    """Return the cached analysis entry for a key, or None on a miss"""
+    conn = get_database_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+            UPDATE analysis_cache
+            SET hit_count = hit_count + 1, last_used_at = CURRENT_TIMESTAMP
+            WHERE cache_key = %s
+            RETURNING analysis, member_matching, model, created_at
+        """, (cache_key,))
+        row = cursor.fetchone()
+        conn.commit()
+
+        if not row:
+            return None
+
+        return {
+            'analysis': row[0],
+            'member_matching': row[1],
+            'model': row[2],
+            'created_at': row[3].isoformat() if row[3] else None
+        }
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def update_cached_section(cache_key: str, section: str, content: Any):
+    """
+    Replace one section of the cached analysis for a key, after it was regenerated on its own.
+    Entries of the RFP under other keys (older prompts, models or knowledge base versions) are
+    left as they were, since the section was generated for the current key only.
+    """
+    conn = get_database_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+            UPDATE analysis_cache
+            SET analysis = jsonb_set(analysis, %s, %s::jsonb)
+            WHERE cache_key = %s
+        """, ([section], json.dumps(content), cache_key))
+        conn.commit()
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def store_cached_analysis(cache_key: str, rfp_id: int, analysis: Dict[str, Any], member_matching: Optional[Dict[str, Any]],
+                          model: str, prompt_version: str, knowledge_base_version: str):
+    """Insert or replace the cached analysis for a key"""
+    conn = get_database_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+            INSERT INTO analysis_cache (cache_key, rfp_id, model, prompt_version, knowledge_base_version,
+                                        analysis, member_matching)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (cache_key) DO UPDATE
+            SET rfp_id = EXCLUDED.rfp_id,
+                analysis = EXCLUDED.analysis,
+                member_matching = EXCLUDED.member_matching,
+                created_at = CURRENT_TIMESTAMP,
+                last_used_at = CURRENT_TIMESTAMP
+        """, (
+            cache_key,
+            rfp_id,
+            model,
+            prompt_version,
+            knowledge_base_version,
+            json.dumps(analysis),
+            json.dumps(member_matching) if member_matching is not None else None
+        ))
+        conn.commit()
+
+    finally:
+        cursor.close()
+        conn.close()
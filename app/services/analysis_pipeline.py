@@ -0,0 +1,545 @@
+import logging
+import os
+import time
+from typing import Dict, Any, List, Optional, Tuple
+from app.services.database import get_database_connection
+from app.services.document_store import DOCUMENT_TEXT_SQL, DOCUMENT_CONTENTS_JOIN, read_document_text
+from app.services.metadata_validation import normalize_due_date, normalize_project_cost
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisRequestError(Exception):
+    """An analysis request that cannot be served, with the HTTP status to report"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def load_rfp_for_analysis(rfp_id: int) -> Tuple[Optional[Dict[str, Any]], List[Tuple[str, str]]]:
+    """
+    Load the RFP metadata and its (document_name, document_text, id) rows, newest first.
+    Returns (None, []) when the RFP does not exist.
+    """
+    conn = get_database_connection()
+    cursor = conn.cursor()
+    
+    try:
+        # Get RFP metadata
+        cursor.execute("""
+            SELECT project_name, organization_group, project_focus, due_date, 
+                   country, region, industry, opf_gap_size, opf_gaps, deliverables
+            FROM rfp_metadata 
+            WHERE id = %s
+        """, (rfp_id,))
+        rfp_result = cursor.fetchone()
+        
+        if not rfp_result:
+            return None, []
+        
+        # Get all documents for this RFP, leaving out duplicates of other documents. Documents of one
+        # batch upload share a created_at, so the id decides which of them is newest
+        cursor.execute(f"""
+            SELECT d.document_name, {DOCUMENT_TEXT_SQL}, d.id, d.content_hash, c.text_storage
+            FROM documents d
+            {DOCUMENT_CONTENTS_JOIN}
+            WHERE d.rfp_id = %s AND d.duplicate_of IS NULL
+            ORDER BY d.created_at DESC, d.id DESC
+        """, (rfp_id,))
+        documents = [
+            (name, read_document_text(text, content_hash, text_storage), document_id)
+            for name, text, document_id, content_hash, text_storage in cursor.fetchall()
+        ]
+    
+    finally:
+        cursor.close()
+        conn.close()
+    
+    # Prepare RFP metadata
+    rfp_metadata = {
+        'project_name': rfp_result[0] or '',
+        'organization_group': rfp_result[1] or '',
+        'project_focus': rfp_result[2] or '',
+        'due_date': rfp_result[3].isoformat() if rfp_result[3] else None,
+        'country': rfp_result[4] or '',
+        'region': rfp_result[5] or '',
+        'industry': rfp_result[6] or '',
+        'opf_gap_size': rfp_result[7] or '',
+        'opf_gaps': rfp_result[8] or '',
+        'deliverables': rfp_result[9] or ''
+    }
+    
+    return rfp_metadata, documents
+
+
+def build_rfp_text(documents: List[Tuple]) -> str:
+    """Combine all document text into the RFP text sent for analysis"""
+    return "\n\n".join([
+        f"Document: {doc[0]}\n{doc[1]}" 
+        for doc in documents
+    ])
+
+
+# Analysis sections in the order of their ai_* columns in rfp_metadata
+STORED_SECTIONS = ['fit_assessment', 'competitive_position', 'key_strengths', 'gaps_challenges',
+                   'resource_requirements', 'risk_assessment', 'recommendations']
+
+
+def safe_get_string(data, key, default=''):
+    """A section value as the text stored in its column"""
+    value = data.get(key, default)
+    if isinstance(value, dict):
+        return str(value)  # Convert dict to string
+    elif isinstance(value, list):
+        return str(value)  # Convert list to string
+    elif value is None:
+        return default
+    else:
+        return str(value)  # Convert any other type to string
+
+
+def analysis_is_stored(rfp_id: int, analysis: Dict[str, Any]) -> bool:
+    """True when the RFP already holds exactly these analysis sections, e.g. from the run that was cached"""
+    conn = get_database_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(f"""
+            SELECT {', '.join('ai_' + section for section in STORED_SECTIONS)}
+            FROM rfp_metadata WHERE id = %s
+        """, (rfp_id,))
+        row = cursor.fetchone()
+        return row is not None and [value or '' for value in row] == [
+            safe_get_string(analysis, section) for section in STORED_SECTIONS
+        ]
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def save_analysis_results(rfp_id: int, analysis: Dict[str, Any]):
+    """
+    Store the AI analysis sections and any extracted metadata on the RFP
+    """
+    # Save analysis results to database
+    conn = get_database_connection()
+    cursor = conn.cursor()
+
+    # Get extracted metadata if available
+    extracted_metadata = analysis.get('extracted_metadata', {})
+
+    logger.debug("Extracted metadata for RFP %s: %r", rfp_id, extracted_metadata)
+
+    # Update both AI analysis results and extracted metadata
+    cursor.execute("""
+        UPDATE rfp_metadata 
+        SET 
+            ai_fit_assessment = %s,
+            ai_competitive_position = %s,
+            ai_key_strengths = %s,
+            ai_gaps_challenges = %s,
+            ai_resource_requirements = %s,
+            ai_risk_assessment = %s,
+            ai_recommendations = %s,
+            ai_analysis_date = CURRENT_TIMESTAMP,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = %s
+    """, (
+        *(safe_get_string(analysis, section) for section in STORED_SECTIONS),
+        rfp_id
+    ))
+
+    # Update metadata fields individually to avoid type conflicts
+    try:
+        if extracted_metadata.get('organization_group'):
+            cursor.execute("UPDATE rfp_metadata SET organization_group = %s WHERE id = %s", 
+                         (str(extracted_metadata['organization_group']), rfp_id))
+
+        if extracted_metadata.get('country'):
+            cursor.execute("UPDATE rfp_metadata SET country = %s WHERE id = %s", 
+                         (str(extracted_metadata['country']), rfp_id))
+
+        if extracted_metadata.get('region'):
+            cursor.execute("UPDATE rfp_metadata SET region = %s WHERE id = %s", 
+                         (str(extracted_metadata['region']), rfp_id))
+
+        if extracted_metadata.get('industry'):
+            cursor.execute("UPDATE rfp_metadata SET industry = %s WHERE id = %s", 
+                         (str(extracted_metadata['industry']), rfp_id))
+
+        if extracted_metadata.get('project_focus'):
+            cursor.execute("UPDATE rfp_metadata SET project_focus = %s WHERE id = %s", 
+                         (str(extracted_metadata['project_focus']), rfp_id))
+
+        if extracted_metadata.get('opf_gap_size'):
+            cursor.execute("UPDATE rfp_metadata SET opf_gap_size = %s WHERE id = %s", 
+                         (str(extracted_metadata['opf_gap_size']), rfp_id))
+
+        if extracted_metadata.get('opf_gaps'):
+            cursor.execute("UPDATE rfp_metadata SET opf_gaps = %s WHERE id = %s", 
+                         (str(extracted_metadata['opf_gaps']), rfp_id))
+
+        if extracted_metadata.get('deliverables'):
+            cursor.execute("UPDATE rfp_metadata SET deliverables = %s WHERE id = %s", 
+                         (str(extracted_metadata['deliverables']), rfp_id))
+
+        if extracted_metadata.get('posting_contact'):
+            cursor.execute("UPDATE rfp_metadata SET posting_contact = %s WHERE id = %s", 
+                         (str(extracted_metadata['posting_contact']), rfp_id))
+
+        if extracted_metadata.get('potential_experts'):
+            cursor.execute("UPDATE rfp_metadata SET potential_experts = %s WHERE id = %s", 
+                         (str(extracted_metadata['potential_experts']), rfp_id))
+
+        if extracted_metadata.get('project_cost'):
+            # Validate and format the project cost
+            project_cost = extracted_metadata['project_cost']
+            try:
+                cost_value = normalize_project_cost(project_cost)
+                if cost_value is not None:
+                    cursor.execute("UPDATE rfp_metadata SET project_cost = %s WHERE id = %s", 
+                                 (cost_value, rfp_id))
+            except (ValueError, TypeError) as e:
+                print(f"Invalid project cost '{project_cost}': {e}")
+                # Skip updating this field if cost is invalid
+
+        if extracted_metadata.get('currency'):
+            cursor.execute("UPDATE rfp_metadata SET currency = %s WHERE id = %s", 
+                         (str(extracted_metadata['currency']), rfp_id))
+
+        if extracted_metadata.get('specific_staffing_needs'):
+            cursor.execute("UPDATE rfp_metadata SET specific_staffing_needs = %s WHERE id = %s", 
+                         (str(extracted_metadata['specific_staffing_needs']), rfp_id))
+
+        if extracted_metadata.get('due_date'):
+            # Validate and format the due date
+            due_date = extracted_metadata['due_date']
+            try:
+                due_date = normalize_due_date(due_date)
+                if due_date is not None:
+                    cursor.execute("UPDATE rfp_metadata SET due_date = %s WHERE id = %s", 
+                                 (due_date, rfp_id))
+            except (ValueError, TypeError) as e:
+                print(f"Invalid date format '{due_date}': {e}")
+                # Skip updating this field if date is invalid
+    except Exception as e:
+        print(f"Error updating extracted metadata: {e}")
+        print(f"Error type: {type(e)}")
+        raise  # Re-raise to see the full error
+
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def save_analysis_section(rfp_id: int, section: str, content: Any):
+    """
+    Store one regenerated analysis section on the RFP, leaving the other sections and the
+    extracted metadata untouched
+    """
+    from app.services.analysis_prompts import ANALYSIS_SECTIONS
+    
+    if section not in ANALYSIS_SECTIONS:
+        raise AnalysisRequestError(f"Unknown analysis section '{section}'", 400)
+    
+    if isinstance(content, (dict, list)):
+        content = str(content)
+    
+    conn = get_database_connection()
+    cursor = conn.cursor()
+    
+    try:
+        # Column names come from the fixed section list above, never from the request
+        cursor.execute(f"""
+            UPDATE rfp_metadata 
+            SET ai_{section} = %s, updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+        """, (content or '', rfp_id))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def find_members_for_analysis(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Find relevant members based on the analysis, reporting failures in the result"""
+    try:
+        from app.services.member_matcher import MemberMatcherService
+        matcher_service = MemberMatcherService()
+        return matcher_service.find_relevant_members(analysis)
+    except Exception as member_error:
+        print(f"Member matching failed: {member_error}")
+        return {
+            'success': False,
+            'error': f'Member matching failed: {str(member_error)}',
+            'keywords': [],
+            'members': []
+        }
+
+
+# First key of the two-key advisory locks taken on RFP analyses, so they cannot collide with other advisory locks
+ANALYSIS_LOCK_NAMESPACE = 4101
+
+
+class RfpAnalysisLock:
+    """
+    Cross-process lock on the analysis of one RFP, held as a PostgreSQL session advisory lock
+    on a dedicated connection. If the database cannot be reached the lock is marked unavailable
+    and callers go ahead without it.
+    """
+
+    def __init__(self, rfp_id: int):
+        self.rfp_id = rfp_id
+        self.conn = None
+        self.held = False
+        self.unavailable = False
+
+    def _connect(self):
+        if self.conn is None:
+            self.conn = get_database_connection()
+            self.conn.autocommit = True
+
+    def try_acquire(self) -> bool:
+        """Take the lock if no other request holds it"""
+        try:
+            self._connect()
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT pg_try_advisory_lock(%s, %s)", (ANALYSIS_LOCK_NAMESPACE, self.rfp_id))
+            self.held = cursor.fetchone()[0]
+            cursor.close()
+        except Exception as e:
+            print(f"Could not take analysis lock for RFP {self.rfp_id}, continuing without it: {e}")
+            self.unavailable = True
+            self.release()
+        return self.held
+
+    def wait(self, timeout: float):
+        """Block until the current holder releases the lock, then hold it"""
+        import psycopg2
+        
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("SET lock_timeout = %s", (f"{int(timeout * 1000)}ms",))
+            cursor.execute("SELECT pg_advisory_lock(%s, %s)", (ANALYSIS_LOCK_NAMESPACE, self.rfp_id))
+            self.held = True
+            cursor.execute("SET lock_timeout = 0")
+        except psycopg2.errors.LockNotAvailable:
+            self.release()
+            raise AnalysisRequestError('Another analysis of this RFP is still running. Please try again shortly.', 409)
+        finally:
+            cursor.close()
+
+    def release(self):
+        """Release the lock (if held) and close its connection"""
+        if self.conn is None:
+            return
+        try:
+            if self.held:
+                cursor = self.conn.cursor()
+                cursor.execute("SELECT pg_advisory_unlock(%s, %s)", (ANALYSIS_LOCK_NAMESPACE, self.rfp_id))
+                cursor.close()
+        except Exception as e:
+            print(f"Error releasing analysis lock for RFP {self.rfp_id}: {e}")
+        finally:
+            self.held = False
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+
+def begin_analysis(job: Dict[str, Any]) -> RfpAnalysisLock:
+    """
+    Single-flight entry point: try to become the one request analysing this RFP. When the
+    returned lock is not held (and not unavailable) another request is already running the
+    analysis, and the caller should wait_for_leader before doing anything else.
+    """
+    lock = RfpAnalysisLock(job['rfp_id'])
+    if not job['cached']:
+        lock.try_acquire()
+    return lock
+
+
+def should_wait_for_leader(lock: RfpAnalysisLock) -> bool:
+    return not lock.held and not lock.unavailable and lock.conn is not None
+
+
+def wait_for_leader(job: Dict[str, Any], lock: RfpAnalysisLock):
+    """
+    Wait for the request already analysing this RFP and reuse its result through the analysis
+    cache. If it produced nothing reusable (it failed, or used another mode) this request now
+    holds the lock and runs the analysis itself.
+    """
+    from app.services.analysis_cache import get_cached_analysis
+    
+    # A forced refresh must not reuse the entry that existed before the leader started
+    previous = None
+    if job['force_refresh']:
+        try:
+            previous = get_cached_analysis(job['cache_key'])
+        except Exception as cache_error:
+            print(f"Analysis cache lookup failed: {cache_error}")
+    
+    print(f"Analysis of RFP {job['rfp_id']} already in progress, waiting for it to finish")
+    started = time.perf_counter()
+    lock.wait(float(os.environ.get('ANALYSIS_LOCK_TIMEOUT', 300)))
+    job['timings']['waiting_for_leader'] = time.perf_counter() - started
+    
+    try:
+        cached = get_cached_analysis(job['cache_key'])
+    except Exception as cache_error:
+        print(f"Analysis cache lookup failed: {cache_error}")
+        cached = None
+    
+    if cached and (previous is None or cached['created_at'] != previous['created_at']):
+        print(f"Reusing the concurrent analysis of RFP {job['rfp_id']}")
+        job['cached'] = cached
+        job['shared_in_flight'] = True
+        lock.release()
+
+
+def prepare_analysis(rfp_id: int, force_refresh: bool = False, mode: str = None, incremental: bool = None) -> Dict[str, Any]:
+    """
+    Load everything an analysis run needs: RFP metadata, documents, the pinned knowledge base
+    snapshot and the cache key. Includes the cached result unless force_refresh is set.
+    In incremental mode older documents are represented by their stored summaries.
+    """
+    from app.services.knowledge_base import KnowledgeBaseService, ANALYSIS_MODEL, ANALYSIS_MODES, PROMPT_VERSION
+    from app.services.analysis_cache import compute_analysis_cache_key, get_cached_analysis
+    
+    # Seconds spent per pipeline stage, reported with the result
+    timings = {}
+    
+    # Get RFP metadata and documents
+    started = time.perf_counter()
+    rfp_metadata, documents = load_rfp_for_analysis(rfp_id)
+    timings['database'] = time.perf_counter() - started
+    
+    if rfp_metadata is None:
+        raise AnalysisRequestError('RFP not found', 404)
+    
+    if not documents:
+        raise AnalysisRequestError('No documents found for this RFP. Please upload documents first.', 400)
+    
+    # Initialize knowledge base service and pin the shared knowledge base snapshot
+    kb_service = KnowledgeBaseService()
+    try:
+        char_count = kb_service.load_knowledge_base()
+        print(f"Using knowledge base snapshot with {char_count} characters, proceeding with analysis")
+    except Exception as e:
+        print(f"Error during knowledge base initialization: {e}")
+        raise AnalysisRequestError(f'Failed to initialize knowledge base: {str(e)}', 500)
+    
+    mode = mode or kb_service.analysis_mode
+    if mode not in ANALYSIS_MODES:
+        raise AnalysisRequestError(f"Unknown analysis mode '{mode}'. Use one of: {', '.join(ANALYSIS_MODES)}", 400)
+    
+    if incremental is None:
+        incremental = kb_service.incremental_analysis
+    
+    # Combine all document text, using stored summaries for all but the newest documents when incremental
+    if incremental:
+        from app.services.document_summaries import build_incremental_documents
+        started = time.perf_counter()
+        analysis_documents, stats = build_incremental_documents(documents, kb_service.full_text_documents)
+        timings['database'] += time.perf_counter() - started
+        print(f"Incremental analysis: {stats['full_text']} documents in full, {stats['summarized']} from stored summaries")
+    else:
+        analysis_documents = [(doc[0], doc[1]) for doc in documents]
+    rfp_text = build_rfp_text(analysis_documents)
+    
+    # Each mode uses different prompts, so it is part of the cached prompt version
+    prompt_version = f"{PROMPT_VERSION}/{mode}"
+    if mode == 'cascade':
+        # The metadata comes from the extraction model, so a different one must not reuse the result
+        prompt_version += f"/{kb_service.extraction_model}"
+    
+    # Identical documents analysed against the same knowledge base, model and prompt reuse the stored result
+    cache_key = compute_analysis_cache_key(rfp_text, kb_service.snapshot.version, ANALYSIS_MODEL, prompt_version)
+    cached = None
+    if not force_refresh:
+        started = time.perf_counter()
+        try:
+            cached = get_cached_analysis(cache_key)
+        except Exception as cache_error:
+            print(f"Analysis cache lookup failed: {cache_error}")
+        timings['database'] += time.perf_counter() - started
+    
+    if cached:
+        print(f"Analysis cache hit for RFP {rfp_id} (key {cache_key[:12]})")
+    
+    return {
+        'rfp_id': rfp_id,
+        'rfp_metadata': rfp_metadata,
+        'documents': documents,
+        'analysis_documents': analysis_documents,
+        'rfp_text': rfp_text,
+        'kb_service': kb_service,
+        'mode': mode,
+        'prompt_version': prompt_version,
+        'cache_key': cache_key,
+        'cached': cached,
+        'force_refresh': force_refresh,
+        'shared_in_flight': False,
+        'timings': timings
+    }
+
+
+def finalize_analysis(job: Dict[str, Any], analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Save a finished analysis, match members and cache it. Returns the API response payload.
+    """
+    from app.services.knowledge_base import ANALYSIS_MODEL
+    from app.services.analysis_cache import store_cached_analysis
+    
+    rfp_id = job['rfp_id']
+    cached = job['cached']
+    
+    # Ensure analysis is a dictionary
+    if not isinstance(analysis, dict):
+        analysis = {'error': 'Analysis result is not a dictionary'}
+    
+    timings = job['timings']
+    
+    # Save analysis results to database. A cache hit was usually saved by the run that produced
+    # it, and is written again only when the RFP holds something else (e.g. another RFP's entry)
+    started = time.perf_counter()
+    if not cached or not analysis_is_stored(rfp_id, analysis):
+        save_analysis_results(rfp_id, analysis)
+    timings['database'] += time.perf_counter() - started
+    
+    # Try to find relevant members based on the analysis
+    member_matching_result = cached['member_matching'] if cached else None
+    if member_matching_result is None:
+        started = time.perf_counter()
+        member_matching_result = find_members_for_analysis(analysis)
+        timings['member_matching'] = time.perf_counter() - started
+    
+    # Responses that could not be parsed into sections, or with failed sections, are not worth reusing
+    if not cached and 'full_analysis' not in analysis and not analysis.get('failed_sections'):
+        try:
+            store_cached_analysis(job['cache_key'], rfp_id, analysis, member_matching_result,
+                                  ANALYSIS_MODEL, job['prompt_version'], job['kb_service'].snapshot.version)
+        except Exception as cache_error:
+            print(f"Failed to store analysis in cache: {cache_error}")
+    
+    return {
+        'success': True,
+        'analysis': analysis,
+        'rfp_id': rfp_id,
+        'documents_analyzed': len(job['documents']),
+        'mode': job['mode'],
+        'member_matching': member_matching_result,
+        'cached': bool(cached),
+        'cached_at': cached['created_at'] if cached else None,
+        'shared_in_flight': job['shared_in_flight'],
+        'escalated_fields': None if cached else list(job['kb_service'].escalated_fields),
+        'usage': None if cached else dict(job['kb_service'].usage),
+        'timings_ms': {
+            stage: round(seconds * 1000, 1)
+            for stage, seconds in dict(timings, **job['kb_service'].timings).items()
+        }
+    }
@@ -0,0 +1,220 @@
+import json
+from typing import Dict, List
+
+ANALYST_INTRO = """You are an expert climate consulting business development analyst for OnePointFive, responsible for evaluating Request for Proposals (RFPs) provided by the user. You have access to our company's knowledge base, which includes:
+- Summaries of past proposals (ASME.txt, EDF.txt, EIT.txt, FAI.txt, Kendra_Scott.txt, Sanofi.txt, Sarona_ADI.txt, Sweef_Kinetik.txt, Talon.txt)
+- Summary of the case studies on our website (all_case_studies.txt)
+- Summary of our master slide deck (master_slide_deck.txt)
+
+Your task is to critically assess the fit of each RFP relative to OnePointFive's capabilities, ensuring that the analysis is both honest and professional. When performing the analysis, consider the following:
+- Be cautious not to overestimate the fit of an RFP. While our capabilities are strong, do not let the marketing content in "all_case_studies.txt" unduly influence the evaluation. This document representss past projects and is intended for promotional purposes, so its content may portray our capabilities too optimistically."""
+
+SYSTEM_MESSAGE = "You are an expert RFP analyst for OPF with complete knowledge of the company. You have access to the COMPLETE RFP content and the most relevant excerpts of the OPF knowledge base. For OPF-specific metadata fields like opf_gap_size and opf_gaps, you must analyze the complete RFP requirements against OPF's complete capabilities to assess gaps. Provide EXTENSIVE, DETAILED, COMPREHENSIVE analysis for each section - think thorough report sections with multiple paragraphs, specific examples, and detailed reasoning. Always return valid JSON with the exact structure requested."
+
+# Metadata fields extracted from the RFP, with the instruction given to the model for each
+METADATA_FIELDS = {
+    "organization_group": "The organization or group issuing the RFP (if clearly stated)",
+    "country": "The country where the project will be implemented (if clearly stated)",
+    "region": "The region or geographic area (if clearly stated)",
+    "industry": "The industry sector (if clearly inferrable). Choose from the most appropriate industry(ies) from the following options: Infrastructure, Culture, Recycling, Carbon Systems, Circularity, Food/Agriculture, Finance, Strategy, Energy Environmental, Development, Transportation, Health & Safety. If the project does not fit clearly into one of these categories, provide the best fit.",
+    "project_focus": "The main focus or objective of the project (if clearly inferrable). Choose the most appropriate focus area(s) from the following options: Skills Development, Agriculture Systems, Transportation Systems, Broad Sustainability Strategy, Natural Disaster, Investment Strategy, Water Assessment, Environmental Analysis, Climate Risk, Circular Economy, Nature-Based Solutions, Climate Change Policy, Energy Systems. If the project does not fit clearly into one of these categories, use a label outside these options but still provide the best fit.",
+    "opf_gap_size": "Assess the size/scope of gaps between RFP requirements and OPF's capabilities from the knowledge base (Small/Medium/Large/None)",
+    "opf_gaps": "Identify specific capability gaps by comparing RFP requirements to OPF's knowledge base capabilities",
+    "deliverables": "The expected deliverables (if clearly stated)",
+    "posting_contact": "Contact information for the posting (if clearly stated)",
+    "potential_experts": "Required expertise or expert profiles (if clearly stated)",
+    "project_cost": "The project budget or cost (if clearly stated, as a number only)",
+    "currency": "The currency for the project cost (if clearly stated)",
+    "specific_staffing_needs": "Specific staffing requirements (if clearly stated)",
+    "due_date": "The proposal due date (if clearly stated, in YYYY-MM-DD format)"
+}
+
+# Analysis sections, with the instruction given to the model for each
+ANALYSIS_SECTIONS = {
+    "fit_assessment": "Provide a comprehensive High/Medium/Low assessment with extensive detailed reasoning. Include specific examples from OPF's knowledge base, cite relevant past projects, client work, and capabilities. Explain the reasoning behind the assessment with multiple supporting points and detailed analysis of how OPF's specific experience aligns with or differs from the RFP requirements. This should be a thorough, multi-paragraph analysis.",
+    "key_strengths": "Provide an extensive analysis of OPF's key strengths relevant to this RFP. Include specific project examples, client names, methodologies, tools, and outcomes from the knowledge base. Detail how each strength directly addresses RFP requirements. Cite specific case studies, successful implementations, and unique differentiators. This should be comprehensive and detailed, covering all relevant strengths with supporting evidence from the knowledge base.",
+    "gaps_challenges": "Conduct a thorough analysis of areas where OPF may face challenges or lack specific expertise required by the RFP. Be detailed about what capabilities are missing, what would need to be developed or acquired, and how significant these gaps are. Include analysis of resource requirements, timeline implications, and potential mitigation strategies. Reference specific requirements from the RFP that may not be fully covered by current OPF capabilities.",
+    "recommendations": "Provide comprehensive, actionable recommendations based on OPF's actual experience and capabilities from the knowledge base. Include detailed strategies for approach, methodology, team composition, timeline considerations, and risk mitigation. Reference similar past projects and lessons learned. Provide multiple recommendation categories such as strategic approach, tactical execution, resource allocation, and partnership considerations.",
+    "resource_requirements": "Conduct a detailed analysis of specific team members, skill sets, resources, tools, and capabilities OPF would need for this project. Based on the knowledge base, identify existing team members who could contribute and specify additional hires or partnerships needed. Include analysis of budget implications, timeline for resource acquisition, and organizational capacity considerations.",
+    "risk_assessment": "Provide a comprehensive risk analysis covering technical, operational, financial, timeline, and strategic risks specific to this RFP and OPF's capabilities. Reference past project experiences from the knowledge base where similar risks were encountered. Include detailed mitigation strategies for each identified risk and contingency planning recommendations.",
+    "competitive_position": "Conduct an extensive analysis of how OPF compares to potential competitors for this RFP. Reference specific past wins, losses, and competitive situations from the knowledge base. Detail OPF's unique differentiators, potential weaknesses relative to competitors, and strategic positioning recommendations. Include market analysis and competitive intelligence based on OPF's experience."
+}
+
+METADATA_INSTRUCTIONS = """TASK 1: METADATA EXTRACTION
+Extract information from the RFP text provided. For OPF-specific fields, use your knowledge of OPF's capabilities from the knowledge base to assess what gaps exist between what the RFP requires and what OPF can deliver.
+OPF-specific fields include: opf_gap_size, opf_gaps
+
+CRITICAL FOR OPF-SPECIFIC METADATA:
+- opf_gap_size: Compare RFP requirements against OPF's capabilities to determine the size/scope of gaps
+- opf_gaps: Identify specific areas where OPF lacks capabilities mentioned in the RFP
+- Use the OPF knowledge base excerpts provided to make these assessments"""
+
+ANALYSIS_INSTRUCTIONS = """TASK 2: RFP ANALYSIS
+Analyze this RFP against OPF's SPECIFIC capabilities and experience from the knowledge base provided.
+
+CRITICAL REQUIREMENTS FOR ANALYSIS:
+1. Reference SPECIFIC projects, clients, or capabilities from OPF's complete knowledge base
+2. Use actual company names, project examples, and specific expertise mentioned
+3. Avoid generic statements - be specific about OPF's actual experience
+4. When mentioning capabilities, reference where they come from in the knowledge base
+5. Use your complete understanding of OPF from the knowledge base to provide insightful analysis"""
+
+METADATA_GUIDELINES = """METADATA EXTRACTION GUIDELINES:
+- Extract information that is explicitly stated or can be reasonably inferred
+- For OPF-specific fields (opf_gap_size, opf_gaps), analyze the COMPLETE RFP requirements against the COMPLETE OPF knowledge base
+- opf_gap_size: Determine gap size by comparing what RFP needs vs what OPF can deliver based on knowledge base
+- opf_gaps: List specific missing capabilities by analyzing RFP needs against OPF's complete capability set
+- For dates, use FULL YYYY-MM-DD format (e.g., '2029-12-31', not just '2029')
+- If only year is given, use YYYY-01-01 format
+- If year and month are given, use YYYY-MM-01 format
+- For costs, extract only the numeric value
+- If a non-OPF field is not mentioned or unclear, use null"""
+
+ANALYSIS_GUIDELINES = """ANALYSIS GUIDELINES:
+- Every analysis point must reference specific information from the COMPLETE OPF knowledge base
+- Provide EXTENSIVE, DETAILED, COMPREHENSIVE responses - aim for thorough, multi-paragraph analyses for each section
+- Be highly specific about OPF's actual experience from the complete knowledge base, not generic consulting capabilities
+- Reference specific client names, project types, methodologies, tools, outcomes, and lessons learned from the complete knowledge base
+- Use the FULL RFP content and the OPF knowledge base excerpts for comprehensive analysis
+- Each analysis section should be substantial and detailed - think comprehensive report sections, not brief summaries
+- Include specific examples, case studies, numbers, outcomes, and evidence from the knowledge base wherever possible
+- Provide actionable insights with detailed reasoning and supporting evidence
+- Make each section comprehensive enough to stand alone as a thorough analysis"""
+
+
+def _json_schema(structure: Dict) -> str:
+    return json.dumps(structure, indent=4, ensure_ascii=False)
+
+
+def assemble_messages(instructions: str, context: str, rfp_text: str, task: str = None) -> List[Dict[str, str]]:
+    """
+    Lay out a prompt so that consecutive calls share the longest possible prefix, which lets
+    the provider reuse its cached prompt prefix:
+    1. System text, instructions and output schema - fixed for a given kind of call
+    2. The knowledge base context - identical whenever the same passages are selected
+    3. The RFP text, last
+    An optional short task message goes after the RFP, so calls that differ only in the
+    task (such as the per-section calls) still share everything up to and including the RFP.
+    """
+    messages = [
+        {"role": "system", "content": f"{SYSTEM_MESSAGE}\n\n{instructions}"},
+        {"role": "user", "content": f"RELEVANT OPF COMPANY CAPABILITIES AND EXPERIENCE (most relevant knowledge base excerpts):\n{context}"},
+        {"role": "user", "content": f"COMPLETE RFP CONTENT:\n{rfp_text}"}
+    ]
+    if task:
+        messages.append({"role": "user", "content": task})
+    return messages
+
+
+def build_combined_messages(rfp_text: str, context: str) -> List[Dict[str, str]]:
+    """Messages for the single call that extracts metadata and writes every analysis section"""
+    schema = _json_schema({"extracted_metadata": METADATA_FIELDS, "analysis": ANALYSIS_SECTIONS})
+    instructions = f"""{ANALYST_INTRO}
+
+When an RFP is provided, you have two primary tasks:
+1. EXTRACT METADATA from the RFP
+2. ANALYZE the RFP against OPF's specific capabilities
+
+{METADATA_INSTRUCTIONS}
+
+{ANALYSIS_INSTRUCTIONS}
+
+Return a SINGLE JSON response with this exact structure:
+{schema}
+
+{METADATA_GUIDELINES}
+
+{ANALYSIS_GUIDELINES}"""
+    return assemble_messages(instructions, context, rfp_text)
+
+
+# Shared instructions for the parallel calls; the per-call task and schema follow the RFP
+PARALLEL_INSTRUCTIONS = f"""{ANALYST_INTRO}
+
+You will be asked for ONE part of the RFP evaluation at a time: either the metadata extraction or a single analysis section.
+
+{METADATA_INSTRUCTIONS}
+
+{ANALYSIS_INSTRUCTIONS}
+
+{METADATA_GUIDELINES}
+
+{ANALYSIS_GUIDELINES}"""
+
+
+def build_metadata_messages(rfp_text: str, context: str, fields: List[str] = None,
+                            rejected: Dict[str, str] = None) -> List[Dict[str, str]]:
+    """
+    Messages for a call that only extracts the RFP metadata fields. fields restricts the call to
+    some of them, and rejected maps fields to the reason an earlier extraction was not accepted.
+    """
+    schema = METADATA_FIELDS if fields is None else {field: METADATA_FIELDS[field] for field in fields}
+    retry = ""
+    if rejected:
+        reasons = "\n".join(f"- {field}: {reason}" for field, reason in rejected.items())
+        retry = f"""
+
+An earlier extraction of these fields was rejected. Check the RFP carefully and follow the format instructions exactly:
+{reasons}"""
+
+    task = f"""Your task is to EXTRACT METADATA from the RFP above.{retry}
+
+Return a SINGLE JSON object with this exact structure:
+{_json_schema(schema)}"""
+    return assemble_messages(PARALLEL_INSTRUCTIONS, context, rfp_text, task)
+
+
+def build_analysis_messages(rfp_text: str, context: str) -> List[Dict[str, str]]:
+    """
+    Messages for a call that writes every analysis section but no metadata, for when the
+    metadata is extracted by a separate call (the cascade mode)
+    """
+    task = f"""Your task is to write ALL sections of the RFP analysis. The metadata is extracted separately, do not include it.
+
+Return a SINGLE JSON object with this exact structure:
+{_json_schema({"analysis": ANALYSIS_SECTIONS})}"""
+    return assemble_messages(PARALLEL_INSTRUCTIONS, context, rfp_text, task)
+
+
+def build_section_messages(section: str, rfp_text: str, context: str, known_metadata: Dict = None) -> List[Dict[str, str]]:
+    """
+    Messages for a call that writes a single analysis section. known_metadata holds RFP details
+    established by an earlier analysis, so a regenerated section stays consistent with them.
+    """
+    known = ""
+    if known_metadata:
+        details = {key: value for key, value in known_metadata.items() if value}
+        if details:
+            known = f"""
+
+RFP details already established by an earlier analysis (keep the section consistent with them):
+{_json_schema(details)}"""
+
+    task = f"""Your task is to write ONE section of the RFP analysis: {section}.{known}
+
+Return a SINGLE JSON object with this exact structure:
+{_json_schema({section: ANALYSIS_SECTIONS[section]})}"""
+    return assemble_messages(PARALLEL_INSTRUCTIONS, context, rfp_text, task)
+
+
+SUMMARY_SYSTEM_MESSAGE = "You condense RFP documents for a proposal analyst. Keep every concrete fact the analyst needs and drop boilerplate. Never invent information."
+
+SUMMARY_INSTRUCTIONS = """Summarize the RFP document excerpt below so it can stand in for the full text in a bid/no-bid analysis.
+Preserve, verbatim where possible:
+- The issuing organization, country and region
+- Scope of work, objectives and every deliverable
+- Required expertise, staffing and qualifications
+- Budget, currency, contract value and payment terms
+- Submission deadline and other key dates
+- Contact details and submission instructions
+- Evaluation criteria and any mandatory requirements
+Use concise bullet points grouped under short headings. If the excerpt contains none of this, say so in one line."""
+
+
+def build_summary_messages(document_name: str, text: str, part: int = 1, total_parts: int = 1) -> List[Dict[str, str]]:
+    """Messages for summarizing one chunk of an RFP document (the map step of a map-reduce analysis)"""
+    label = document_name if total_parts == 1 else f"{document_name} (part {part} of {total_parts})"
+    return [
+        {"role": "system", "content": f"{SUMMARY_SYSTEM_MESSAGE}\n\n{SUMMARY_INSTRUCTIONS}"},
+        {"role": "user", "content": f"DOCUMENT: {label}\n{text}"}
+    ]
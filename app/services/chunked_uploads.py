@@ -0,0 +1,217 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+# Size limit of one chunked upload, and the chunk size suggested to clients
+CHUNKED_UPLOAD_MAX_BYTES = 500 * 1024 * 1024
+CHUNKED_UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+
+# Unfinished uploads untouched for this long are deleted
+CHUNKED_UPLOAD_EXPIRY_SECONDS = 24 * 3600
+
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+CONTENT_RANGE_PATTERN = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class ChunkedUploadError(Exception):
+    """A chunked upload request that cannot be served, with the HTTP status to report"""
+
+    def __init__(self, message: str, status_code: int = 400, received: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.received = received
+
+
+def parse_content_range(header: Optional[str]) -> Tuple[int, int, int]:
+    """Parse 'bytes start-end/total' into (start, end exclusive, total)"""
+    match = CONTENT_RANGE_PATTERN.match((header or '').strip())
+    if not match:
+        raise ChunkedUploadError("A Content-Range header of the form 'bytes start-end/total' is required")
+    start, last, total = (int(value) for value in match.groups())
+    if last < start or last >= total:
+        raise ChunkedUploadError(f"Invalid Content-Range '{header}'")
+    return start, last + 1, total
+
+
+class ChunkedUploadStore:
+    """
+    Resumable uploads of large documents, sent as a series of byte ranges.
+
+    Each upload is a data file and a JSON manifest in the upload directory, so every web worker
+    process sees the same state and an upload survives a dropped connection or a restart. Chunks
+    are streamed from the request straight into the data file at their offset; the manifest records
+    how many contiguous bytes have arrived, which is where a client resumes. Writes to one upload
+    are serialized with a file lock on its manifest.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = CHUNKED_UPLOAD_MAX_BYTES,
+                 expiry_seconds: float = CHUNKED_UPLOAD_EXPIRY_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.expiry_seconds = expiry_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, upload_id: str) -> Tuple[str, str]:
+        if not UPLOAD_ID_PATTERN.match(upload_id or ''):
+            raise ChunkedUploadError('Upload not found', 404)
+        base = os.path.join(self.directory, upload_id)
+        return base + '.json', base + '.part'
+
+    def _read_manifest(self, manifest_path: str) -> Dict[str, Any]:
+        try:
+            with open(manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise ChunkedUploadError('Upload not found or expired', 404)
+
+    def _write_manifest(self, manifest_path: str, manifest: Dict[str, Any]):
+        manifest['updated_at'] = time.time()
+        temporary_path = manifest_path + '.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(temporary_path, manifest_path)
+
+    def _locked(self, upload_id: str):
+        """Open the upload's lock file, locked exclusively until it is closed"""
+        manifest_path, _ = self._paths(upload_id)
+        if not os.path.exists(manifest_path):
+            raise ChunkedUploadError('Upload not found or expired', 404)
+        lock_file = open(manifest_path + '.lock', 'a')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def create(self, rfp_id: int, document_name: str, size: int) -> Dict[str, Any]:
+        """Start an upload of size bytes; returns its manifest"""
+        if size <= 0:
+            raise ChunkedUploadError('The upload size must be given in bytes')
+        if size > self.max_bytes:
+            raise ChunkedUploadError(f'Documents can be at most {self.max_bytes // (1024 * 1024)} MB', 413)
+        self.cleanup_expired()
+
+        upload_id = uuid.uuid4().hex
+        manifest_path, data_path = self._paths(upload_id)
+        with open(data_path, 'wb') as f:
+            f.truncate(size)
+        manifest = {
+            'upload_id': upload_id,
+            'rfp_id': rfp_id,
+            'document_name': document_name,
+            'size': size,
+            'received': 0,
+            'created_at': time.time()
+        }
+        self._write_manifest(manifest_path, manifest)
+        return manifest
+
+    def status(self, upload_id: str) -> Dict[str, Any]:
+        manifest_path, _ = self._paths(upload_id)
+        return self._read_manifest(manifest_path)
+
+    def write_chunk(self, upload_id: str, stream, start: int, end: int, total: int) -> Dict[str, Any]:
+        """
+        Write bytes [start, end) read from stream. A chunk may overlap what has already arrived
+        (a retry), but may not leave a gap; the error then carries the offset to resume from.
+        """
+        manifest_path, data_path = self._paths(upload_id)
+        lock_file = self._locked(upload_id)
+        try:
+            manifest = self._read_manifest(manifest_path)
+            if total != manifest['size']:
+                raise ChunkedUploadError(f"The upload was started with a size of {manifest['size']} bytes", 400,
+                                         manifest['received'])
+            if start > manifest['received']:
+                raise ChunkedUploadError(f"Expected the chunk at offset {manifest['received']}", 409,
+                                         manifest['received'])
+
+            written = 0
+            with open(data_path, 'r+b') as f:
+                f.seek(start)
+                remaining = end - start
+                while remaining > 0:
+                    chunk = stream.read(min(1024 * 1024, remaining))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    written += len(chunk)
+                    remaining -= len(chunk)
+
+            # A connection dropped mid-chunk still keeps the bytes that arrived
+            manifest['received'] = max(manifest['received'], start + written)
+            self._write_manifest(manifest_path, manifest)
+            if written < end - start:
+                raise ChunkedUploadError(f'The chunk ended after {written} of {end - start} bytes', 400,
+                                         manifest['received'])
+            return manifest
+        finally:
+            lock_file.close()
+
+    def complete(self, upload_id: str) -> Tuple[Dict[str, Any], str, str]:
+        """
+        Check that every byte has arrived and hash the file. Returns (manifest, data path,
+        SHA-256 hash); the caller ingests the file and then calls discard.
+        """
+        manifest_path, data_path = self._paths(upload_id)
+        lock_file = self._locked(upload_id)
+        try:
+            manifest = self._read_manifest(manifest_path)
+            if manifest['received'] < manifest['size']:
+                raise ChunkedUploadError(f"The upload is incomplete: {manifest['received']} of {manifest['size']} bytes received",
+                                         409, manifest['received'])
+            digest = hashlib.sha256()
+            with open(data_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            return manifest, data_path, digest.hexdigest()
+        finally:
+            lock_file.close()
+
+    def discard(self, upload_id: str):
+        manifest_path, data_path = self._paths(upload_id)
+        for path in (manifest_path, data_path, manifest_path + '.lock'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def cleanup_expired(self) -> int:
+        """Delete unfinished uploads not written to within the expiry time"""
+        removed = 0
+        cutoff = time.time() - self.expiry_seconds
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            upload_id = name[:-len('.json')]
+            try:
+                if os.path.getmtime(os.path.join(self.directory, name)) < cutoff:
+                    self.discard(upload_id)
+                    removed += 1
+            except (OSError, ChunkedUploadError):
+                continue
+        if removed:
+            print(f"Deleted {removed} expired chunked uploads")
+        return removed
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_chunked_upload_store() -> ChunkedUploadStore:
+    """Return the per-process upload store configured from the environment"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ChunkedUploadStore(
+                    os.environ.get('CHUNKED_UPLOAD_DIR') or os.path.join(tempfile.gettempdir(), 'rfp-chunked-uploads'),
+                    max_bytes=int(os.environ.get('CHUNKED_UPLOAD_MAX_BYTES', CHUNKED_UPLOAD_MAX_BYTES)),
+                    expiry_seconds=float(os.environ.get('CHUNKED_UPLOAD_EXPIRY_HOURS', 24)) * 3600
+                )
+    return _store
@@ -0,0 +1,169 @@
+import mmap
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Union
+
+# Memory maps kept open for reads of recently used blobs
+OPEN_BLOBS = 128
+
+# Compressed bytes fed to the decompressor at a time when a whole blob is read frame by frame
+FRAME_READ_BYTES = 64 * 1024
+
+
+class DocumentBlobError(Exception):
+    """A document text blob that cannot be written or read"""
+
+
+class DocumentBlobStore:
+    """
+    Extracted document text stored outside Postgres, as one zstd-compressed file per content hash.
+
+    Each page is compressed as an independent zstd frame and the frames are concatenated, so a
+    page is read by decompressing only its own frame; Postgres keeps the frame's offset and length
+    (and the page's search vector) in document_pages. Blobs are written once to a temporary file
+    and renamed into place, and are read through memory maps that stay open for hot documents, so
+    repeated reads come from the OS page cache without copying whole files.
+    """
+
+    def __init__(self, directory: str, compression_level: int = 3):
+        self.directory = directory
+        self.compression_level = compression_level
+        self._maps: 'OrderedDict[str, mmap.mmap]' = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, content_hash: str) -> str:
+        if len(content_hash) != 64 or not all(c in '0123456789abcdef' for c in content_hash):
+            raise DocumentBlobError(f"Invalid content hash '{content_hash}'")
+        return os.path.join(self.directory, content_hash[:2], content_hash + '.zst')
+
+    def write(self, content_hash: str, pages: List[str]) -> List[Tuple[int, int]]:
+        """Compress and store the pages of a document; returns the (offset, length) of each page's frame"""
+        import zstandard
+
+        compressor = zstandard.ZstdCompressor(level=self.compression_level)
+        frames = [compressor.compress(page.encode('utf-8')) for page in pages]
+
+        path = self.path(content_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temporary_path = tempfile.mkstemp(prefix='.blob-', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for frame in frames:
+                    f.write(frame)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary_path, path)
+        except BaseException:
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+            raise
+
+        pointers = []
+        offset = 0
+        for frame in frames:
+            pointers.append((offset, len(frame)))
+            offset += len(frame)
+        return pointers
+
+    def _map(self, content_hash: str) -> Union[mmap.mmap, bytes]:
+        with self._lock:
+            mapped = self._maps.get(content_hash)
+            if mapped is not None:
+                self._maps.move_to_end(content_hash)
+                return mapped
+
+        try:
+            with open(self.path(content_hash), 'rb') as f:
+                # A document without pages is an empty file, which cannot be mapped
+                if os.fstat(f.fileno()).st_size == 0:
+                    return b''
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            raise DocumentBlobError(f"Text blob of content {content_hash[:12]} is missing from {self.directory}")
+        except (OSError, ValueError) as e:
+            raise DocumentBlobError(f"Text blob of content {content_hash[:12]} cannot be read: {e}")
+
+        with self._lock:
+            mapped = self._maps.setdefault(content_hash, mapped)
+            self._maps.move_to_end(content_hash)
+            # Evicted maps are not closed, a reader may still be using them; they are unmapped once unreferenced
+            while len(self._maps) > OPEN_BLOBS:
+                self._maps.popitem(last=False)
+            return mapped
+
+    def read_page(self, content_hash: str, offset: int, length: int) -> str:
+        """Decompress one page's frame"""
+        return self.read_text(content_hash, [(offset, length)])
+
+    def read_text(self, content_hash: str, pointers: Optional[List[Tuple[int, int]]] = None) -> str:
+        """Decompress a whole document, or only the pages given by their pointers"""
+        import zstandard
+
+        mapped = self._map(content_hash)
+        decompressor = zstandard.ZstdDecompressor()
+        try:
+            if pointers is not None:
+                return "".join(decompressor.decompress(mapped[offset:offset + length]).decode('utf-8')
+                               for offset, length in pointers)
+            return self._decompress_frames(decompressor, memoryview(mapped)).decode('utf-8')
+        except (zstandard.ZstdError, UnicodeDecodeError) as e:
+            raise DocumentBlobError(f"Text blob of content {content_hash[:12]} is corrupt: {e}")
+
+    @staticmethod
+    def _decompress_frames(decompressor, data: memoryview) -> bytes:
+        """
+        Decompress every frame of a blob in turn. Unlike a stream reader across frames, this fails
+        on a truncated blob instead of returning the text before the cut.
+        """
+        import zstandard
+
+        parts = []
+        position = 0
+        while position < len(data):
+            frame = decompressor.decompressobj()
+            while not frame.eof:
+                if position >= len(data):
+                    raise zstandard.ZstdError('the blob ends inside a frame')
+                chunk = data[position:position + FRAME_READ_BYTES]
+                parts.append(frame.decompress(chunk))
+                position += len(chunk)
+            # The next frame starts in the bytes this one did not use
+            position -= len(frame.unused_data)
+        return b"".join(parts)
+
+    def remove(self, content_hash: str):
+        with self._lock:
+            self._maps.pop(content_hash, None)
+        try:
+            os.remove(self.path(content_hash))
+        except FileNotFoundError:
+            pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def text_storage_backend() -> str:
+    """Where newly extracted text is stored: 'database' (default) or 'blob' (DOCUMENT_TEXT_STORAGE)"""
+    backend = os.environ.get('DOCUMENT_TEXT_STORAGE', 'database').lower()
+    if backend not in ('database', 'blob'):
+        raise DocumentBlobError(f"Unknown DOCUMENT_TEXT_STORAGE '{backend}'. Use 'database' or 'blob'")
+    return backend
+
+
+def get_document_blob_store() -> DocumentBlobStore:
+    """Return the per-process blob store configured from the environment"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                directory = os.environ.get('DOCUMENT_BLOB_DIR') or os.path.join(
+                    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'document_blobs')
+                _store = DocumentBlobStore(directory, int(os.environ.get('DOCUMENT_BLOB_COMPRESSION_LEVEL', 3)))
+    return _store
@@ -0,0 +1,260 @@
+import hashlib
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Tuple
+from app.services.extraction_engines import (
+    PDF_ENGINES, ExtractionEngineError, select_pdf_engine, extract_docx_text, extract_legacy_doc_text
+)
+
+# Document types accepted for upload
+ALLOWED_EXTENSIONS = ('pdf', 'doc', 'docx')
+
+# PDFs with fewer pages than this are extracted as a single page range, the split is not worth it.
+# They still go to the process pool when a page time budget is set, see DocumentExtractor.
+PARALLEL_MIN_PAGES = 16
+
+# Word documents have no stored page breaks; their text is stored in pages of about this many characters
+WORD_PAGE_CHARS = 3000
+
+
+class DocumentExtractionError(Exception):
+    """A document whose text could not be extracted"""
+
+
+class PageTimeout(Exception):
+    pass
+
+
+def _raise_page_timeout(signum, frame):
+    raise PageTimeout()
+
+
+def extract_pdf_pages(path: str, start: int, end: int, page_time_budget: float = 0,
+                      engine_name: str = 'pypdf2') -> List[Tuple[str, bool]]:
+    """
+    Extract pages [start, end) of a PDF with the named engine, returning (text, timed_out) per page.
+    Runs in a pool worker process; a page taking longer than page_time_budget seconds is
+    interrupted and left empty.
+    """
+    # Interrupting a page needs SIGALRM, which only works on the main thread of a process
+    use_alarm = page_time_budget > 0 and hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+    if page_time_budget > 0 and not use_alarm:
+        print(f"Extracting pages {start + 1}-{end} of {path} without the {page_time_budget:g}s page time budget: "
+              f"pages can only be interrupted on the main thread of a process")
+    previous_handler = signal.signal(signal.SIGALRM, _raise_page_timeout) if use_alarm else None
+
+    pages = []
+    try:
+        engine = PDF_ENGINES[engine_name]()
+        engine.open(path)
+        try:
+            for page_number in range(start, end):
+                try:
+                    if use_alarm:
+                        signal.setitimer(signal.ITIMER_REAL, page_time_budget)
+                    pages.append((engine.page_text(page_number), False))
+                except PageTimeout:
+                    pages.append(('', True))
+                finally:
+                    if use_alarm:
+                        signal.setitimer(signal.ITIMER_REAL, 0)
+        finally:
+            engine.close()
+    finally:
+        if use_alarm:
+            signal.signal(signal.SIGALRM, previous_handler)
+    return pages
+
+
+def split_text_pages(text: str, page_chars: int = WORD_PAGE_CHARS) -> List[str]:
+    """Split text at line ends into pages of at least page_chars characters; the pages join back to text"""
+    pages = []
+    current = []
+    current_chars = 0
+    for line in text.splitlines(keepends=True):
+        current.append(line)
+        current_chars += len(line)
+        if current_chars >= page_chars:
+            pages.append("".join(current))
+            current = []
+            current_chars = 0
+    if current or not pages:
+        pages.append("".join(current))
+    return pages
+
+
+class DocumentExtractor:
+    """
+    Extracts the text of uploaded PDF and Word documents.
+
+    Uploads are spooled to a temporary file instead of being read into memory. PDFs are read
+    with the configured engine, or one picked by file size (see select_pdf_engine). Large PDFs
+    are split into page ranges extracted concurrently by a process pool (the pure Python engines
+    hold the GIL, so threads would not help), subject to a per-page and a total time budget.
+    With a page time budget every PDF goes through the pool: pages are interrupted with SIGALRM,
+    which only works on a process's main thread, and gthread web workers serve requests on other
+    threads. Page texts are kept, so callers can store the document page by page (see extract_file_pages).
+    """
+
+    def __init__(self, workers: int = None, page_time_budget: float = 10.0, total_time_budget: float = 120.0,
+                 pdf_engine: str = 'auto'):
+        self.workers = workers or os.cpu_count() or 1
+        self.pdf_engine = pdf_engine
+        self.page_time_budget = page_time_budget
+        self.total_time_budget = total_time_budget
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn rather than fork: forking a multi-threaded web worker is not safe
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def _reset_pool(self):
+        """Drop a pool whose workers may still be busy with abandoned pages"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            for process in list(getattr(pool, '_processes', {}).values()):
+                process.terminate()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def spool(self, stream, suffix: str = '') -> Tuple[str, str]:
+        """Write an upload stream to a temporary file in chunks; returns its path and SHA-256 hash"""
+        digest = hashlib.sha256()
+        fd, path = tempfile.mkstemp(prefix='upload-', suffix=suffix)
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = stream.read(1024 * 1024)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+        return path, digest.hexdigest()
+
+    def extract_upload(self, file_storage) -> Tuple[str, Dict[str, Any]]:
+        """Extract the text of an uploaded file (a werkzeug FileStorage). Returns (text, stats)."""
+        extension = os.path.splitext(file_storage.filename)[1].lower()
+        path, _ = self.spool(file_storage.stream, suffix=extension)
+        try:
+            return self.extract_file(path, extension)
+        finally:
+            os.remove(path)
+
+    def extract_file(self, path: str, extension: str) -> Tuple[str, Dict[str, Any]]:
+        pages, stats = self.extract_file_pages(path, extension)
+        return "".join(pages), stats
+
+    def extract_file_pages(self, path: str, extension: str) -> Tuple[List[str], Dict[str, Any]]:
+        """Extract a file's text as a list of pages that join to the full text. Returns (pages, stats)."""
+        if extension == '.pdf':
+            return self.extract_pdf(path)
+        if extension in ('.doc', '.docx'):
+            return self.extract_word(path, extension)
+        raise DocumentExtractionError(f"Unsupported file type '{extension}'")
+
+    def extract_pdf(self, path: str, engine_name: str = None) -> Tuple[List[str], Dict[str, Any]]:
+        started = time.perf_counter()
+        try:
+            engine_name = engine_name or select_pdf_engine(os.path.getsize(path), self.pdf_engine)
+            engine = PDF_ENGINES[engine_name]()
+            engine.open(path)
+            try:
+                page_count = engine.page_count()
+            finally:
+                engine.close()
+        except Exception as e:
+            raise DocumentExtractionError(f'Error reading PDF file: {str(e)}')
+
+        try:
+            if self.page_time_budget > 0 or (page_count >= PARALLEL_MIN_PAGES and self.workers >= 2):
+                pages, workers = self._extract_pdf_parallel(path, page_count, engine_name)
+            else:
+                pages = extract_pdf_pages(path, 0, page_count, self.page_time_budget, engine_name)
+                workers = 1
+        except DocumentExtractionError:
+            raise
+        except Exception as e:
+            raise DocumentExtractionError(f'Error reading PDF file: {str(e)}')
+
+        seconds = time.perf_counter() - started
+        stats = {
+            'engine': engine_name,
+            'pages': page_count,
+            'workers': workers,
+            'timed_out_pages': [number + 1 for number, (_, timed_out) in enumerate(pages) if timed_out],
+            'seconds': round(seconds, 3),
+            'pages_per_second': round(page_count / seconds, 1) if seconds > 0 else None
+        }
+        print(f"Extracted {page_count} PDF pages with {engine_name} on {workers} workers in {seconds:.2f}s "
+              f"({stats['pages_per_second']} pages/s), {len(stats['timed_out_pages'])} pages timed out")
+        return [page_text + "\n" for page_text, _ in pages], stats
+
+    def _extract_pdf_parallel(self, path: str, page_count: int, engine_name: str) -> Tuple[List[Tuple[str, bool]], int]:
+        """
+        Split the pages into about four ranges per worker (one range for small PDFs) and extract
+        them on the process pool. Returns the pages and the number of workers used.
+        """
+        if page_count < PARALLEL_MIN_PAGES or self.workers < 2:
+            batch_size = max(1, page_count)
+        else:
+            batch_size = max(1, -(-page_count // (self.workers * 4)))
+        ranges = [(start, min(start + batch_size, page_count)) for start in range(0, page_count, batch_size)]
+
+        pool = self._get_pool()
+        futures = [pool.submit(extract_pdf_pages, path, start, end, self.page_time_budget, engine_name) for start, end in ranges]
+        done, pending = wait(futures, timeout=self.total_time_budget)
+        if pending:
+            self._reset_pool()
+            raise DocumentExtractionError(f'Text extraction took longer than {self.total_time_budget:g} seconds '
+                                          f'({page_count} pages). Try splitting the document.')
+
+        pages = []
+        try:
+            for future in futures:
+                pages.extend(future.result())
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool for the next upload
+            self._reset_pool()
+            raise DocumentExtractionError('Text extraction failed: a PDF extraction worker stopped unexpectedly')
+        return pages, min(self.workers, len(ranges))
+
+    def extract_word(self, path: str, extension: str = '.docx') -> Tuple[List[str], Dict[str, Any]]:
+        started = time.perf_counter()
+        engine_name = 'legacy-doc' if extension == '.doc' else 'python-docx'
+        try:
+            text = extract_legacy_doc_text(path) if extension == '.doc' else extract_docx_text(path)
+        except ExtractionEngineError as e:
+            raise DocumentExtractionError(str(e))
+        except Exception as e:
+            raise DocumentExtractionError(f'Error reading Word document: {str(e)}')
+        pages = split_text_pages(text)
+        return pages, {'engine': engine_name, 'pages': len(pages), 'seconds': round(time.perf_counter() - started, 3)}
+
+
+_extractor = None
+_extractor_lock = threading.Lock()
+
+
+def get_document_extractor() -> DocumentExtractor:
+    """Return the per-process extractor configured from the environment"""
+    global _extractor
+    if _extractor is None:
+        with _extractor_lock:
+            if _extractor is None:
+                _extractor = DocumentExtractor(
+                    workers=int(os.environ.get('PDF_EXTRACTION_WORKERS', 0)) or None,
+                    page_time_budget=float(os.environ.get('PDF_PAGE_TIME_BUDGET', 10)),
+                    total_time_budget=float(os.environ.get('PDF_EXTRACTION_TIME_BUDGET', 120)),
+                    pdf_engine=os.environ.get('PDF_EXTRACTION_ENGINE', 'auto')
+                )
+    return _extractor
@@ -0,0 +1,134 @@
+import html
+from typing import Any, Dict, Optional
+
+# Results are paged by RFP; each RFP lists its best matching pages
+SEARCH_RFPS_PER_PAGE = 10
+SEARCH_MAX_RFPS_PER_PAGE = 50
+SEARCH_HITS_PER_RFP = 3
+
+# ts_headline markers, replaced with <mark> once the snippet is HTML-escaped
+_START_SEL = '⟦'
+_STOP_SEL = '⟧'
+HEADLINE_OPTIONS = (f'StartSel="{_START_SEL}", StopSel="{_STOP_SEL}", MaxFragments=2, MaxWords=30, MinWords=10, '
+                    f'FragmentDelimiter=" … "')
+
+# Matches come from the GIN indexes on document_pages.search_vector and, for older documents
+# stored without pages, on to_tsvector('english', documents.document_text). Both sides are ranked
+# first; ts_headline runs in the outer query, so only on the hits of the requested page. Pages
+# kept in the blob store have no text in the database; their snippets are made by HEADLINE_SQL.
+SEARCH_SQL = """
+    WITH search AS (
+        SELECT websearch_to_tsquery('english', %(query)s) AS query
+    ),
+    hits AS (
+        SELECT d.rfp_id, d.id AS document_id, d.document_name, p.page_number,
+               ts_rank_cd(p.search_vector, search.query) AS rank
+        FROM search, document_pages p
+        JOIN documents d ON d.content_hash = p.content_hash
+        WHERE p.search_vector @@ search.query
+          AND d.duplicate_of IS NULL
+          AND (%(rfp_id)s IS NULL OR d.rfp_id = %(rfp_id)s)
+        UNION ALL
+        SELECT d.rfp_id, d.id, d.document_name, NULL,
+               ts_rank_cd(to_tsvector('english', d.document_text), search.query)
+        FROM search, documents d
+        WHERE d.content_hash IS NULL
+          AND to_tsvector('english', d.document_text) @@ search.query
+          AND (%(rfp_id)s IS NULL OR d.rfp_id = %(rfp_id)s)
+    ),
+    ranked AS (
+        SELECT hits.*,
+               row_number() OVER (PARTITION BY rfp_id ORDER BY rank DESC, document_id, page_number) AS hit_number,
+               max(rank) OVER (PARTITION BY rfp_id) AS rfp_rank,
+               count(*) OVER (PARTITION BY rfp_id) AS rfp_hits
+        FROM hits
+    ),
+    rfps AS (
+        SELECT rfp_id, rfp_rank, rfp_hits, count(*) OVER () AS total_rfps
+        FROM ranked
+        WHERE hit_number = 1
+        ORDER BY rfp_rank DESC, rfp_id
+        LIMIT %(limit)s OFFSET %(offset)s
+    )
+    SELECT rfps.rfp_id, m.project_name, m.organization_group, rfps.rfp_rank, rfps.rfp_hits, rfps.total_rfps,
+           r.document_id, r.document_name, r.page_number, r.rank,
+           ts_headline('english', COALESCE(p.page_text, d.document_text), search.query, %(headline_options)s),
+           d.content_hash, p.blob_offset, p.blob_length
+    FROM rfps
+    JOIN ranked r ON r.rfp_id = rfps.rfp_id AND r.hit_number <= %(hits_per_rfp)s
+    JOIN rfp_metadata m ON m.id = rfps.rfp_id
+    JOIN documents d ON d.id = r.document_id
+    LEFT JOIN document_pages p ON p.content_hash = d.content_hash AND p.page_number = r.page_number
+    CROSS JOIN search
+    ORDER BY rfps.rfp_rank DESC, rfps.rfp_id, r.hit_number
+"""
+
+HEADLINE_SQL = """
+    SELECT ts_headline('english', page.text, websearch_to_tsquery('english', %s), %s)
+    FROM unnest(%s::text[]) WITH ORDINALITY AS page (text, number)
+    ORDER BY page.number
+"""
+
+
+def snippet_html(headline: str) -> str:
+    """HTML-escape a ts_headline snippet and turn its markers into <mark> tags"""
+    return html.escape(headline or '').replace(_START_SEL, '<mark>').replace(_STOP_SEL, '</mark>')
+
+
+def search_documents(cursor, query: str, rfp_id: Optional[int] = None, limit: int = SEARCH_RFPS_PER_PAGE,
+                     offset: int = 0, hits_per_rfp: int = SEARCH_HITS_PER_RFP) -> Dict[str, Any]:
+    """
+    Full-text search over the extracted text of all uploaded documents (web search syntax: words,
+    "quoted phrases", OR, -excluded). Returns the RFPs with matches, best first, each with its
+    best matching pages and highlighted snippets.
+    """
+    cursor.execute(SEARCH_SQL, {
+        'query': query,
+        'rfp_id': rfp_id,
+        'limit': limit,
+        'offset': offset,
+        'hits_per_rfp': hits_per_rfp,
+        'headline_options': HEADLINE_OPTIONS
+    })
+
+    rows = cursor.fetchall()
+
+    # Snippets of blob-stored pages: the page texts are read here and sent back for ts_headline
+    blob_hits = [i for i, row in enumerate(rows) if row[10] is None and row[12] is not None]
+    if blob_hits:
+        from app.services.document_blobs import DocumentBlobError
+        from app.services.document_store import read_page_text
+        texts = []
+        for i in blob_hits:
+            try:
+                texts.append(read_page_text(None, rows[i][11], rows[i][12], rows[i][13]))
+            except DocumentBlobError as e:
+                # The hit is still listed, without a snippet
+                print(f"Search snippet of document {rows[i][6]} page {rows[i][8]} unavailable: {e}")
+                texts.append('')
+        cursor.execute(HEADLINE_SQL, (query, HEADLINE_OPTIONS, texts))
+        headlines = dict(zip(blob_hits, (row[0] for row in cursor.fetchall())))
+        rows = [row[:10] + (headlines[i],) + row[11:] if i in headlines else row for i, row in enumerate(rows)]
+
+    rfps = []
+    total_rfps = 0
+    for row in rows:
+        total_rfps = row[5]
+        if not rfps or rfps[-1]['rfp_id'] != row[0]:
+            rfps.append({
+                'rfp_id': row[0],
+                'project_name': row[1],
+                'organization_group': row[2],
+                'rank': round(row[3], 4),
+                'hit_count': row[4],
+                'hits': []
+            })
+        rfps[-1]['hits'].append({
+            'document_id': row[6],
+            'document_name': row[7],
+            'page': row[8],
+            'rank': round(row[9], 4),
+            'snippet_html': snippet_html(row[10])
+        })
+
+    return {'rfps': rfps, 'total_rfps': total_rfps}
@@ -0,0 +1,464 @@
+import hashlib
+import os
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+# Words per shingle hashed into a document's SimHash
+SHINGLE_WORDS = 3
+
+# Texts with fewer shingles get no SimHash: empty extractions (scanned PDFs) would all share the
+# same hash, and short texts such as cover sheets from one template differ in too few shingles
+SIMHASH_MIN_SHINGLES = 50
+
+# Limits of a batch upload, after expanding ZIP archives
+BATCH_UPLOAD_MAX_FILES = 50
+BATCH_UPLOAD_MAX_BYTES = 200 * 1024 * 1024
+
+
+class BatchUploadError(Exception):
+    """A batch upload rejected as a whole, e.g. over the size limits or with a corrupt ZIP"""
+
+
+# SQL expression for a document's text: stored once in document_contents for uploads with a
+# content hash, inline in documents.document_text for older rows. It is NULL for contents whose
+# text_storage is 'blob'; read those with read_document_text.
+DOCUMENT_TEXT_SQL = "COALESCE(d.document_text, c.document_text)"
+DOCUMENT_CONTENTS_JOIN = "LEFT JOIN document_contents c ON c.content_hash = d.content_hash"
+
+
+# For each bit 0-7, a translation table mapping every byte value to 1 if that bit is set, else 0
+_BIT_TABLES = [bytes((value >> bit) & 1 for value in range(256)) for bit in range(8)]
+
+
+def compute_simhash(text: str) -> Optional[int]:
+    """
+    64-bit SimHash over word shingles; similar texts differ in few bits. None for texts with fewer
+    than SIMHASH_MIN_SHINGLES shingles, which are only matched by their file hash. The shingle
+    hashes are concatenated and the set bits of each position are counted with bytes.translate, so
+    the per-bit work runs in C rather than as a Python loop over 64 bits of every shingle.
+    """
+    words = re.findall(r"\w+", (text or '').lower())
+    if len(words) - SHINGLE_WORDS + 1 < SIMHASH_MIN_SHINGLES:
+        return None
+    shingles = map(" ".join, zip(*(words[i:] for i in range(SHINGLE_WORDS))))
+
+    digests = b"".join(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest() for shingle in shingles)
+    count = len(digests) // 8
+
+    simhash = 0
+    for byte_index in range(8):
+        # Digests are read big-endian: byte 0 holds bits 63-56 of the hash
+        column = digests[byte_index::8]
+        for bit in range(8):
+            if 2 * column.translate(_BIT_TABLES[bit]).count(1) > count:
+                simhash |= 1 << ((7 - byte_index) * 8 + bit)
+    # Stored in a signed BIGINT column
+    return simhash - (1 << 64) if simhash >= 1 << 63 else simhash
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin((a ^ b) & ((1 << 64) - 1)).count('1')
+
+
+def read_document_text(document_text: Optional[str], content_hash: Optional[str], text_storage: Optional[str]) -> str:
+    """A document's text as selected with DOCUMENT_TEXT_SQL, read from the blob store when it is kept there"""
+    if text_storage == 'blob':
+        from app.services.document_blobs import get_document_blob_store
+        return get_document_blob_store().read_text(content_hash)
+    return document_text or ''
+
+
+def read_page_text(page_text: Optional[str], content_hash: Optional[str], blob_offset: Optional[int],
+                   blob_length: Optional[int]) -> Optional[str]:
+    """A document_pages row's text, decompressed from the blob store when only its pointer is stored"""
+    if page_text is None and blob_offset is not None:
+        from app.services.document_blobs import get_document_blob_store
+        return get_document_blob_store().read_page(content_hash, blob_offset, blob_length)
+    return page_text
+
+
+def read_text_range(cursor, content_hash: str, offset: int, limit: int) -> Tuple[str, int]:
+    """
+    Characters [offset, offset + limit) of a blob-stored text, decompressing only the pages they
+    fall on. Returns (text, total length).
+    """
+    from app.services.document_blobs import get_document_blob_store
+
+    cursor.execute("""
+        SELECT char_count, blob_offset, blob_length FROM document_pages
+        WHERE content_hash = %s ORDER BY page_number
+    """, (content_hash,))
+    start = 0
+    first_start = None
+    pointers = []
+    for char_count, blob_offset, blob_length in cursor.fetchall():
+        end = start + char_count
+        if end > offset and start < offset + limit:
+            if first_start is None:
+                first_start = start
+            pointers.append((blob_offset, blob_length))
+        start = end
+    if not pointers:
+        return '', start
+    text = get_document_blob_store().read_text(content_hash, pointers)
+    return text[offset - first_start:offset - first_start + limit], start
+
+
+def get_stored_contents(cursor, content_hashes: List[str]) -> Dict[str, Tuple[str, int]]:
+    """(document_text, simhash) of previously extracted contents, by content hash"""
+    if not content_hashes:
+        return {}
+    cursor.execute("""
+        SELECT content_hash, document_text, simhash, text_storage FROM document_contents WHERE content_hash = ANY(%s)
+    """, (list(content_hashes),))
+    return {row[0]: (read_document_text(row[1], row[0], row[3]), row[2]) for row in cursor.fetchall()}
+
+
+def store_content(cursor, content_hash: str, document_text: str, simhash: Optional[int], pages: List[str] = None,
+                  bytes_saved: int = 0):
+    """
+    Store extracted text and its SimHash under the hash of the uploaded file, with its pages, their
+    sizes and search vectors in document_pages. With DOCUMENT_TEXT_STORAGE=blob the text itself goes
+    to the compressed blob store and Postgres keeps only the page pointers.
+    """
+    from psycopg2.extras import execute_values
+    from app.services.document_blobs import get_document_blob_store, text_storage_backend
+    from app.services.kb_retrieval import estimate_tokens
+
+    pages = pages if pages is not None else [document_text]
+    text_storage = text_storage_backend()
+    if text_storage == 'blob':
+        pointers = get_document_blob_store().write(content_hash, pages)
+    else:
+        pointers = [(None, None)] * len(pages)
+
+    page_rows = [
+        (content_hash, number, page_text, text_storage == 'database', len(page_text), estimate_tokens(page_text),
+         blob_offset, blob_length)
+        for number, (page_text, (blob_offset, blob_length)) in enumerate(zip(pages, pointers), start=1)
+    ]
+    cursor.execute("""
+        INSERT INTO document_contents (content_hash, document_text, simhash, text_length, page_count, estimated_tokens,
+                                       normalization_bytes_saved, text_storage)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (content_hash) DO NOTHING
+    """, (content_hash, document_text if text_storage == 'database' else None, simhash, len(document_text),
+          len(page_rows), sum(row[5] for row in page_rows), bytes_saved, text_storage))
+    if cursor.rowcount:
+        # The page text is sent once: it is indexed for search, and kept only when stored in the database
+        execute_values(cursor, """
+            INSERT INTO document_pages (content_hash, page_number, page_text, char_count, estimated_tokens,
+                                        blob_offset, blob_length, search_vector)
+            SELECT v.content_hash, v.page_number, CASE WHEN v.keep_text THEN v.page_text END, v.char_count,
+                   v.estimated_tokens, v.blob_offset, v.blob_length, to_tsvector('english', v.page_text)
+            FROM (VALUES %s) AS v (content_hash, page_number, page_text, keep_text, char_count, estimated_tokens,
+                                   blob_offset, blob_length)
+        """, page_rows, template="(%s, %s, %s, %s, %s, %s, %s::bigint, %s::integer)", page_size=500)
+
+
+def find_duplicates(cursor, rfp_id: int, content_hash: str, simhash: Optional[int]) -> List[Dict[str, Any]]:
+    """
+    Find the existing documents of the RFP with the same content (same file hash) or nearly the
+    same text (SimHash within DOCUMENT_SIMHASH_DISTANCE bits), oldest first. Texts without a
+    SimHash (empty or short) only match by file hash.
+    """
+    max_distance = int(os.environ.get('DOCUMENT_SIMHASH_DISTANCE', 3))
+    cursor.execute("""
+        SELECT d.id, d.document_name, d.content_hash, c.simhash
+        FROM documents d
+        JOIN document_contents c ON c.content_hash = d.content_hash
+        WHERE d.rfp_id = %s AND d.duplicate_of IS NULL
+        ORDER BY d.created_at, d.id
+    """, (rfp_id,))
+    matches = []
+    for document_id, document_name, existing_hash, existing_simhash in cursor.fetchall():
+        if existing_hash == content_hash:
+            matches.append({'id': document_id, 'document_name': document_name, 'match': 'exact'})
+        elif (simhash is not None and existing_simhash is not None
+              and hamming_distance(existing_simhash, simhash) <= max_distance):
+            matches.append({'id': document_id, 'document_name': document_name, 'match': 'near'})
+    return matches
+
+
+def spool_upload(document_name: str, stream) -> Dict[str, Any]:
+    """Spool one uploaded file to disk and hash it; the returned item is filled in by the later steps"""
+    from app.services.document_extraction import get_document_extractor
+
+    extension = os.path.splitext(document_name)[1].lower()
+    path, content_hash = get_document_extractor().spool(stream, suffix=extension)
+    return {'document_name': document_name, 'extension': extension, 'path': path, 'content_hash': content_hash}
+
+
+def extract_spooled(item: Dict[str, Any], stored: Dict[str, Tuple[str, int]]):
+    """
+    Fill in the item's text: the stored text when the same file was uploaded before, otherwise
+    extracted from the spooled file. Raises DocumentExtractionError.
+    """
+    from app.services.document_extraction import get_document_extractor
+
+    if item['content_hash'] in stored:
+        item['document_text'], item['simhash'] = stored[item['content_hash']]
+        item['pages'] = None
+        item['stored'] = True
+        item['extraction'] = {'reused': True}
+        print(f"Reusing extracted text of {item['document_name']} (content {item['content_hash'][:12]})")
+    else:
+        pages, item['extraction'] = get_document_extractor().extract_file_pages(item['path'], item['extension'])
+        item['pages'] = normalize_extracted_pages(item, pages)
+        item['document_text'] = "".join(item['pages'])
+        # Hashed here, in the batch's extraction workers, rather than inside the insert transaction
+        item['simhash'] = compute_simhash(item['document_text'])
+        item['stored'] = False
+
+
+def normalize_extracted_pages(item: Dict[str, Any], pages: List[str]) -> List[str]:
+    """
+    Strip repeated headers and footers and collapse whitespace (DOCUMENT_TEXT_NORMALIZATION, on by
+    default), recording the saving in the item's extraction stats. Only PDF pages are checked for
+    repeats; the pages of Word documents are cut by length and have no headers in their text.
+    """
+    from app.services.text_normalization import normalize_pages
+
+    if os.environ.get('DOCUMENT_TEXT_NORMALIZATION', 'true').lower() not in ('true', '1', 'yes'):
+        item['bytes_saved'] = 0
+        return pages
+
+    pages, stats = normalize_pages(pages, strip_repeated=item['extension'] == '.pdf')
+    item['extraction']['normalization'] = stats
+    item['bytes_saved'] = stats['bytes_saved']
+    print(f"Normalized {item['document_name']}: removed {stats['lines_removed']} repeated lines, "
+          f"saved {stats['bytes_saved']} of {stats['bytes_before']} bytes")
+    return pages
+
+
+def discard_spooled(item: Dict[str, Any]):
+    try:
+        os.remove(item['path'])
+    except OSError:
+        pass
+
+
+def insert_document(cursor, rfp_id: int, item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Store an extracted item's content (if new) and insert its document row, with the content's
+    page and token totals copied onto it. A second copy of a file already uploaded to the RFP is
+    recorded with duplicate_of and left out of the analysis. A near-duplicate is usually a
+    corrected re-export, so it replaces the older documents it resembles instead: those are
+    marked as duplicates of the new document.
+    """
+    if not item['stored']:
+        store_content(cursor, item['content_hash'], item['document_text'], item['simhash'], item['pages'],
+                      item.get('bytes_saved', 0))
+        item['stored'] = True
+
+    matches = find_duplicates(cursor, rfp_id, item['content_hash'], item['simhash'])
+    duplicate = next((match for match in matches if match['match'] == 'exact'), None)
+    superseded = [] if duplicate else matches
+    if duplicate:
+        print(f"{item['document_name']} is a copy of document {duplicate['id']}, excluding it from analysis")
+
+    cursor.execute("""
+        INSERT INTO documents (rfp_id, document_name, content_hash, duplicate_of, page_count, text_length, estimated_tokens)
+        SELECT %s, %s, c.content_hash, %s, c.page_count, c.text_length, c.estimated_tokens
+        FROM document_contents c
+        WHERE c.content_hash = %s
+        RETURNING id, document_name, created_at
+    """, (rfp_id, item['document_name'], duplicate['id'] if duplicate else None, item['content_hash']))
+    row = cursor.fetchone()
+
+    if superseded:
+        # Documents that duplicated the superseded ones now point at the new document as well
+        superseded_ids = [match['id'] for match in superseded]
+        cursor.execute("""
+            UPDATE documents SET duplicate_of = %s
+            WHERE rfp_id = %s AND (id = ANY(%s) OR duplicate_of = ANY(%s))
+        """, (row[0], rfp_id, superseded_ids, superseded_ids))
+        print(f"{item['document_name']} supersedes near-duplicate documents {superseded_ids}, "
+              f"excluding them from analysis")
+
+    return {
+        'id': row[0],
+        'document_name': row[1],
+        'created_at': row[2],
+        'document_text': item['document_text'],
+        'content_hash': item['content_hash'],
+        'duplicate': duplicate,
+        'supersedes': superseded,
+        'extraction': item['extraction']
+    }
+
+
+def ingest_upload(cursor, rfp_id: int, file_storage) -> Dict[str, Any]:
+    """
+    Hash an uploaded file, extract its text unless the same file was uploaded before, and insert
+    the document row. Raises DocumentExtractionError.
+    """
+    item = spool_upload(file_storage.filename, file_storage.stream)
+    try:
+        extract_spooled(item, get_stored_contents(cursor, [item['content_hash']]))
+    finally:
+        discard_spooled(item)
+    return insert_document(cursor, rfp_id, item)
+
+
+def ingest_file(cursor, rfp_id: int, document_name: str, path: str, content_hash: str) -> Dict[str, Any]:
+    """
+    Like ingest_upload, for a file already on disk (e.g. an assembled chunked upload). The file
+    is left in place. Raises DocumentExtractionError.
+    """
+    item = {
+        'document_name': document_name,
+        'extension': os.path.splitext(document_name)[1].lower(),
+        'path': path,
+        'content_hash': content_hash
+    }
+    extract_spooled(item, get_stored_contents(cursor, [content_hash]))
+    return insert_document(cursor, rfp_id, item)
+
+
+def ingest_batch(cursor, rfp_id: int, uploads: List[Tuple[str, Any]], workers: int = 4) -> List[Dict[str, Any]]:
+    """
+    Ingest many (document_name, stream) uploads: spool and hash them, look up known contents in
+    one query, extract the new ones concurrently (each distinct file once) and insert all rows
+    with the caller's cursor, so the caller commits them in one transaction. Returns one status
+    per upload; a file that fails to extract does not stop the others.
+    """
+    from app.services.document_extraction import DocumentExtractionError
+
+    items = []
+    try:
+        for document_name, stream in uploads:
+            items.append(spool_upload(document_name, stream))
+
+        stored = get_stored_contents(cursor, [item['content_hash'] for item in items])
+
+        # Extract each distinct new file once; identical files in the batch share the result
+        first_by_hash = {}
+        for item in items:
+            first_by_hash.setdefault(item['content_hash'], item)
+        to_extract = []
+        for item in first_by_hash.values():
+            if item['content_hash'] in stored:
+                extract_spooled(item, stored)
+            else:
+                to_extract.append(item)
+
+        errors = {}
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = {executor.submit(extract_spooled, item, stored): item for item in to_extract}
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    future.result()
+                except DocumentExtractionError as e:
+                    errors[item['content_hash']] = str(e)
+    finally:
+        for item in items:
+            discard_spooled(item)
+
+    results = []
+    for item in items:
+        content_hash = item['content_hash']
+        if content_hash in errors:
+            results.append({'document_name': item['document_name'], 'status': 'error', 'error': errors[content_hash]})
+            continue
+        if 'document_text' not in item:
+            # A copy of another file in this batch
+            source = first_by_hash[content_hash]
+            item.update({key: source.get(key) for key in ('document_text', 'pages', 'simhash', 'stored', 'extraction',
+                                                          'bytes_saved')})
+        result = insert_document(cursor, rfp_id, item)
+        result['status'] = 'duplicate' if result['duplicate'] else 'stored'
+        results.append(result)
+    return results
+
+
+def expand_batch_uploads(files, allowed_extensions) -> Tuple[List[Tuple[str, Any]], List[Dict[str, str]]]:
+    """
+    Turn the files of a batch upload into (document_name, stream) uploads, expanding ZIP archives
+    into their documents. Returns the uploads and the files skipped (unsupported types, folders).
+    The limits are checked against the uncompressed sizes before anything is read.
+    """
+    max_files = int(os.environ.get('BATCH_UPLOAD_MAX_FILES', BATCH_UPLOAD_MAX_FILES))
+    max_bytes = int(os.environ.get('BATCH_UPLOAD_MAX_BYTES', BATCH_UPLOAD_MAX_BYTES))
+    suffixes = tuple('.' + ext for ext in allowed_extensions)
+
+    uploads = []
+    skipped = []
+    total_bytes = 0
+    for file_storage in files:
+        name = file_storage.filename
+        if name.lower().endswith('.zip'):
+            try:
+                archive = zipfile.ZipFile(file_storage.stream)
+            except zipfile.BadZipFile:
+                raise BatchUploadError(f'"{name}" is not a valid ZIP archive')
+            for member in archive.infolist():
+                member_name = os.path.basename(member.filename)
+                if member.is_dir() or member.filename.startswith('__MACOSX/') or not member_name or member_name.startswith('.'):
+                    continue
+                if not member_name.lower().endswith(suffixes):
+                    skipped.append({'document_name': f"{name}/{member.filename}", 'reason': 'Unsupported file type'})
+                    continue
+                total_bytes += member.file_size
+                uploads.append((member_name, _LazyZipMember(archive, member)))
+        elif name.lower().endswith(suffixes):
+            uploads.append((name, file_storage.stream))
+        else:
+            skipped.append({'document_name': name, 'reason': 'Unsupported file type'})
+
+        if len(uploads) > max_files:
+            raise BatchUploadError(f'A batch upload can contain at most {max_files} documents')
+        if total_bytes > max_bytes:
+            raise BatchUploadError(f'The ZIP archives expand to more than {max_bytes // (1024 * 1024)} MB')
+
+    return uploads, skipped
+
+
+class _LazyZipMember:
+    """A ZIP member opened only when it is read, so only one member stream is open at a time"""
+
+    def __init__(self, archive: zipfile.ZipFile, member: zipfile.ZipInfo):
+        self.archive = archive
+        self.member = member
+        self._stream = None
+
+    def read(self, size: int = -1) -> bytes:
+        if self._stream is None:
+            self._stream = self.archive.open(self.member)
+        data = self._stream.read(size)
+        if not data:
+            self._stream.close()
+        return data
+
+
+def delete_orphaned_contents(cursor) -> List[str]:
+    """
+    Delete stored contents no document refers to any more. Returns the content hashes whose text
+    is in the blob store; pass them to remove_content_blobs once the transaction is committed.
+    """
+    cursor.execute("""
+        DELETE FROM document_contents c
+        WHERE NOT EXISTS (SELECT 1 FROM documents d WHERE d.content_hash = c.content_hash)
+        RETURNING c.content_hash, c.text_storage
+    """)
+    return [content_hash for content_hash, text_storage in cursor.fetchall() if text_storage == 'blob']
+
+
+def remove_content_blobs(cursor, content_hashes: List[str]):
+    """
+    Delete the text blobs of contents deleted by delete_orphaned_contents, after the commit. A
+    content uploaded again in the meantime is stored anew, so its blob is kept.
+    """
+    if not content_hashes:
+        return
+    from app.services.document_blobs import get_document_blob_store
+
+    cursor.execute("SELECT content_hash FROM document_contents WHERE content_hash = ANY(%s)", (content_hashes,))
+    restored = {row[0] for row in cursor.fetchall()}
+    store = get_document_blob_store()
+    for content_hash in content_hashes:
+        if content_hash not in restored:
+            store.remove(content_hash)
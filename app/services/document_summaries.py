@@ -0,0 +1,136 @@
+import hashlib
+import os
+import threading
+from typing import Dict, Any, List, Tuple
+from app.services.database import get_database_connection
+from app.services.kb_retrieval import estimate_tokens
+
+# Documents shorter than this are always sent in full - a summary would save little or nothing
+SUMMARY_MIN_TOKENS = 2000
+
+
+def compute_document_hash(document_text: str) -> str:
+    """Hash of a document's text, so a summary is never reused for different content"""
+    return hashlib.sha256((document_text or '').encode('utf-8')).hexdigest()
+
+
+def get_document_summaries(document_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Return {document_id: {content_hash, summary, model}} for every stored summary of the given documents"""
+    if not document_ids:
+        return {}
+
+    conn = get_database_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+            SELECT document_id, content_hash, summary, model
+            FROM document_summaries
+            WHERE document_id = ANY(%s)
+        """, (list(document_ids),))
+
+        return {
+            row[0]: {'content_hash': row[1], 'summary': row[2], 'model': row[3]}
+            for row in cursor.fetchall()
+        }
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def store_document_summary(document_id: int, content_hash: str, summary: str, model: str):
+    """Insert or replace the summary of one version of a document"""
+    conn = get_database_connection()
+    cursor = conn.cursor()
+
+    try:
+        # Only the summary of the current content is kept per document
+        cursor.execute("DELETE FROM document_summaries WHERE document_id = %s AND content_hash <> %s",
+                       (document_id, content_hash))
+        cursor.execute("""
+            INSERT INTO document_summaries (document_id, content_hash, summary, model)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (document_id, content_hash) DO UPDATE
+            SET summary = EXCLUDED.summary,
+                model = EXCLUDED.model,
+                created_at = CURRENT_TIMESTAMP
+        """, (document_id, content_hash, summary, model))
+        conn.commit()
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def needs_summary(document_text: str) -> bool:
+    """True when a document is long enough to be worth summarizing"""
+    return estimate_tokens(document_text or '') >= SUMMARY_MIN_TOKENS
+
+
+def summarize_document(document_id: int, document_name: str, document_text: str):
+    """Summarize one document and store the result, unless a summary of this content already exists"""
+    from app.services.knowledge_base import KnowledgeBaseService, SUMMARY_MODEL
+
+    if not needs_summary(document_text):
+        return
+
+    content_hash = compute_document_hash(document_text)
+    existing = get_document_summaries([document_id]).get(document_id)
+    if existing and existing['content_hash'] == content_hash:
+        return
+
+    kb_service = KnowledgeBaseService()
+    summary = kb_service.summarize_documents([(document_name, document_text)])[0]
+    store_document_summary(document_id, content_hash, summary, SUMMARY_MODEL)
+    print(f"Stored summary for document {document_id} ({document_name}): "
+          f"{len(document_text)} -> {len(summary)} characters")
+
+
+def summarize_on_upload() -> bool:
+    """
+    Whether long documents are summarized as soon as they are uploaded. Only incremental analyses
+    use the summaries, so this is on in incremental mode (ANALYSIS_INCREMENTAL) and otherwise only
+    with DOCUMENT_SUMMARIES_ON_UPLOAD, since every summary is an extra model call per upload.
+    """
+    return (os.environ.get('ANALYSIS_INCREMENTAL', 'false').lower() == 'true'
+            or os.environ.get('DOCUMENT_SUMMARIES_ON_UPLOAD', 'false').lower() == 'true')
+
+
+def summarize_document_in_background(document_id: int, document_name: str, document_text: str):
+    """Summarize a newly uploaded document on a background thread, so the upload returns immediately"""
+    if not needs_summary(document_text):
+        return
+
+    def run():
+        try:
+            summarize_document(document_id, document_name, document_text)
+        except Exception as e:
+            print(f"Background summary of document {document_id} failed: {e}")
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def build_incremental_documents(documents: List[Tuple], full_text_count: int = 1) -> Tuple[List[Tuple[str, str]], Dict[str, int]]:
+    """
+    Replace all but the newest full_text_count documents with their stored summaries.
+    documents are (document_name, document_text, id) rows, newest first. Documents without a
+    summary of their current content keep their full text and are summarized in the background
+    for the next run.
+    """
+    older = documents[full_text_count:]
+    summaries = get_document_summaries([doc[2] for doc in older])
+
+    prepared = [(doc[0], doc[1]) for doc in documents[:full_text_count]]
+    stats = {'full_text': len(prepared), 'summarized': 0}
+    for name, text, document_id in (doc[:3] for doc in older):
+        stored = summaries.get(document_id)
+        if stored and stored['content_hash'] == compute_document_hash(text):
+            prepared.append((f"{name} (summary)", stored['summary']))
+            stats['summarized'] += 1
+        else:
+            prepared.append((name, text))
+            stats['full_text'] += 1
+            summarize_document_in_background(document_id, name, text)
+
+    return prepared, stats
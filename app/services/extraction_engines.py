@@ -0,0 +1,195 @@
+import importlib.util
+import os
+import shutil
+import subprocess
+import threading
+import zipfile
+from typing import Dict, List, Type
+
+
+class ExtractionEngineError(Exception):
+    """An extraction engine that is not installed or cannot read a document"""
+
+
+class PdfEngine:
+    """
+    Text extraction back-end for PDFs. An engine is opened on one file and then asked for the
+    text of individual pages, so a document can be split into page ranges across processes.
+    """
+
+    name = ''
+    requires = ''
+
+    @classmethod
+    def available(cls) -> bool:
+        return importlib.util.find_spec(cls.requires) is not None
+
+    def open(self, path: str):
+        raise NotImplementedError
+
+    def page_count(self) -> int:
+        raise NotImplementedError
+
+    def page_text(self, number: int) -> str:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PyPDF2Engine(PdfEngine):
+    """Pure Python, always installed; moderate speed and text quality"""
+
+    name = 'pypdf2'
+    requires = 'PyPDF2'
+
+    def open(self, path: str):
+        import PyPDF2
+        self._file = open(path, 'rb')
+        self._reader = PyPDF2.PdfReader(self._file)
+
+    def page_count(self) -> int:
+        return len(self._reader.pages)
+
+    def page_text(self, number: int) -> str:
+        return self._reader.pages[number].extract_text() or ''
+
+    def close(self):
+        self._file.close()
+
+
+class PdfminerEngine(PdfEngine):
+    """pdfminer.six: pure Python layout analysis; best reading order, slowest"""
+
+    name = 'pdfminer'
+    requires = 'pdfminer'
+
+    def open(self, path: str):
+        from pdfminer.pdfinterp import PDFResourceManager
+        from pdfminer.pdfpage import PDFPage
+        self._file = open(path, 'rb')
+        self._resources = PDFResourceManager()
+        self._pages = list(PDFPage.get_pages(self._file))
+
+    def page_count(self) -> int:
+        return len(self._pages)
+
+    def page_text(self, number: int) -> str:
+        from io import StringIO
+        from pdfminer.converter import TextConverter
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfinterp import PDFPageInterpreter
+
+        output = StringIO()
+        device = TextConverter(self._resources, output, laparams=LAParams())
+        try:
+            PDFPageInterpreter(self._resources, device).process_page(self._pages[number])
+        finally:
+            device.close()
+        return output.getvalue().strip('\x0c')
+
+    def close(self):
+        self._file.close()
+
+
+class PdfiumEngine(PdfEngine):
+    """pypdfium2: bindings to Chrome's PDFium; fastest by a wide margin"""
+
+    name = 'pypdfium2'
+    requires = 'pypdfium2'
+
+    # PDFium is not thread-safe, so calls from the request threads of one process are serialized
+    _lock = threading.Lock()
+
+    def open(self, path: str):
+        import pypdfium2
+        with self._lock:
+            self._document = pypdfium2.PdfDocument(path)
+
+    def page_count(self) -> int:
+        return len(self._document)
+
+    def page_text(self, number: int) -> str:
+        with self._lock:
+            page = self._document[number]
+            try:
+                text_page = page.get_textpage()
+                try:
+                    return text_page.get_text_range().replace('\r\n', '\n')
+                finally:
+                    text_page.close()
+            finally:
+                page.close()
+
+    def close(self):
+        with self._lock:
+            self._document.close()
+
+
+PDF_ENGINES: Dict[str, Type[PdfEngine]] = {
+    engine.name: engine for engine in (PdfiumEngine, PyPDF2Engine, PdfminerEngine)
+}
+
+# Engine preference for automatic selection. pdfminer's better reading order is worth its cost
+# on small files only; large files go to the fastest engine installed.
+PDF_ENGINE_PREFERENCE = ('pypdfium2', 'pdfminer', 'pypdf2')
+LARGE_PDF_ENGINE_PREFERENCE = ('pypdfium2', 'pypdf2')
+LARGE_PDF_BYTES = 2 * 1024 * 1024
+
+
+def available_pdf_engines() -> List[str]:
+    return [name for name, engine in PDF_ENGINES.items() if engine.available()]
+
+
+def select_pdf_engine(size_bytes: int, configured: str = 'auto') -> str:
+    """
+    Pick the PDF engine for a file: the configured one when it is installed, otherwise the first
+    installed engine in the preference order for the file's size
+    """
+    if configured and configured != 'auto':
+        if configured not in PDF_ENGINES:
+            raise ExtractionEngineError(f"Unknown PDF extraction engine '{configured}'. "
+                                        f"Use 'auto' or one of: {', '.join(PDF_ENGINES)}")
+        if PDF_ENGINES[configured].available():
+            return configured
+        print(f"PDF extraction engine '{configured}' is not installed, selecting one automatically")
+
+    preference = LARGE_PDF_ENGINE_PREFERENCE if size_bytes >= LARGE_PDF_BYTES else PDF_ENGINE_PREFERENCE
+    for name in preference:
+        if PDF_ENGINES[name].available():
+            return name
+    raise ExtractionEngineError("No PDF extraction engine is installed")
+
+
+def extract_docx_text(path: str) -> str:
+    import docx
+    doc = docx.Document(path)
+    return "".join(paragraph.text + "\n" for paragraph in doc.paragraphs)
+
+
+def extract_legacy_doc_text(path: str) -> str:
+    """
+    Extract a Word 97-2003 .doc file, which python-docx cannot read, with antiword or a headless
+    LibreOffice. A .docx file that was merely renamed to .doc is read directly.
+    """
+    if zipfile.is_zipfile(path):
+        return extract_docx_text(path)
+
+    if shutil.which('antiword'):
+        result = subprocess.run(['antiword', '-w', '0', path], capture_output=True, timeout=120)
+        if result.returncode != 0:
+            raise ExtractionEngineError(f"antiword failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+        return result.stdout.decode('utf-8', 'replace')
+
+    office = shutil.which('soffice') or shutil.which('libreoffice')
+    if office:
+        import tempfile
+        with tempfile.TemporaryDirectory(prefix='doc-convert-') as output_dir:
+            subprocess.run([office, '--headless', '--convert-to', 'txt:Text', '--outdir', output_dir, path],
+                           capture_output=True, timeout=180, check=True)
+            converted = os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0] + '.txt')
+            with open(converted, encoding='utf-8', errors='replace') as f:
+                return f.read()
+
+    raise ExtractionEngineError("Legacy .doc files need antiword or LibreOffice installed on the server. "
+                                "Please save the document as .docx or PDF and upload it again.")
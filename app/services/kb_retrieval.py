@@ -0,0 +1,182 @@
+import math
+import re
+from collections import Counter
+from typing import List, Dict, Tuple
+
+# Rough characters-per-token ratio for English text with the OpenAI tokenizers
+CHARS_PER_TOKEN = 4
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+_STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'been', 'but', 'by', 'can', 'for', 'from',
+    'has', 'have', 'in', 'into', 'is', 'it', 'its', 'of', 'on', 'or', 'our', 'shall', 'should',
+    'such', 'that', 'the', 'their', 'them', 'there', 'these', 'they', 'this', 'those', 'to',
+    'was', 'we', 'were', 'which', 'will', 'with', 'within', 'would', 'you', 'your'
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local estimate of the number of tokens in a piece of text"""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def estimate_message_tokens(messages: List[Dict[str, str]]) -> int:
+    """Estimate the prompt tokens of a list of chat messages, including per-message framing"""
+    return sum(estimate_tokens(message['content']) + 4 for message in messages) + 3
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords and single characters removed"""
+    return [
+        token for token in _TOKEN_PATTERN.findall(text.lower())
+        if len(token) > 1 and token not in _STOPWORDS
+    ]
+
+
+def chunk_documents(documents: List[Tuple[str, str]], chunk_chars: int = 1200) -> List[Dict]:
+    """
+    Split (source_name, text) pairs into paragraph-aligned passages of roughly chunk_chars
+    """
+    passages = []
+    for source, text in documents:
+        paragraphs = [p.strip() for p in re.split(r'\n\s*\n', text) if p.strip()]
+        current = []
+        current_len = 0
+        for paragraph in paragraphs:
+            if current and current_len + len(paragraph) > chunk_chars:
+                passages.append({'source': source, 'text': "\n\n".join(current)})
+                current = []
+                current_len = 0
+            current.append(paragraph)
+            current_len += len(paragraph)
+        if current:
+            passages.append({'source': source, 'text': "\n\n".join(current)})
+
+    for position, passage in enumerate(passages):
+        passage['position'] = position
+        passage['tokens'] = estimate_tokens(passage['text'])
+    return passages
+
+
+def split_text(text: str, max_chars: int) -> List[str]:
+    """
+    Split text into pieces of at most max_chars, preferring paragraph and then line boundaries
+    """
+    pieces = []
+    remaining = text.strip()
+    while len(remaining) > max_chars:
+        window = remaining[:max_chars]
+        cut = window.rfind('\n\n')
+        if cut < max_chars // 2:
+            cut = window.rfind('\n')
+        if cut < max_chars // 2:
+            cut = window.rfind(' ')
+        if cut < max_chars // 2:
+            cut = max_chars
+        pieces.append(remaining[:cut].strip())
+        remaining = remaining[cut:].strip()
+    if remaining:
+        pieces.append(remaining)
+    return pieces
+
+
+class BM25Index:
+    """In-memory Okapi BM25 index over knowledge base passages"""
+
+    def __init__(self, passages: List[Dict], k1: float = 1.5, b: float = 0.75):
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+
+        # Inverted index: term -> list of (passage position, term frequency)
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_lengths = []
+        for position, passage in enumerate(passages):
+            term_counts = Counter(tokenize(passage['text']))
+            self.doc_lengths.append(sum(term_counts.values()))
+            for term, count in term_counts.items():
+                self.postings.setdefault(term, []).append((position, count))
+
+        self.avg_doc_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+        passage_count = len(passages)
+        self.idf = {
+            term: math.log(1 + (passage_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+        self.total_tokens = sum(passage['tokens'] for passage in passages)
+
+    def score(self, query_text: str, max_query_terms: int = 300) -> List[Tuple[float, int]]:
+        """
+        Score every passage against the query text and return (score, position) pairs, best first.
+        Long queries such as a full RFP are reduced to their most discriminative terms.
+        """
+        query_counts = Counter(term for term in tokenize(query_text) if term in self.postings)
+        if not query_counts:
+            return []
+
+        # Weight query terms by how often the RFP uses them and how rare they are in the corpus
+        weighted_terms = sorted(
+            query_counts.items(),
+            key=lambda item: (1 + math.log(item[1])) * self.idf[item[0]],
+            reverse=True
+        )[:max_query_terms]
+
+        scores = [0.0] * len(self.passages)
+        for term, query_count in weighted_terms:
+            idf = self.idf[term]
+            query_weight = 1 + math.log(query_count)
+            for position, term_count in self.postings[term]:
+                length_norm = 1 - self.b + self.b * self.doc_lengths[position] / self.avg_doc_length
+                scores[position] += query_weight * idf * term_count * (self.k1 + 1) / (term_count + self.k1 * length_norm)
+
+        return sorted(
+            ((value, position) for position, value in enumerate(scores) if value > 0),
+            reverse=True
+        )
+
+    def select_context(self, query_text: str, token_budget: int) -> Tuple[str, Dict]:
+        """
+        Build a context string from the top-scoring passages that fit within token_budget.
+        Selected passages are emitted in their original corpus order, grouped by source file.
+        """
+        if self.total_tokens <= token_budget:
+            selected = list(range(len(self.passages)))
+        else:
+            selected = []
+            used_tokens = 0
+            for _, position in self.score(query_text):
+                passage_tokens = self.passages[position]['tokens']
+                if used_tokens + passage_tokens > token_budget:
+                    continue
+                selected.append(position)
+                used_tokens += passage_tokens
+
+            # Nothing in the knowledge base matched the query, fall back to corpus order
+            if not selected:
+                for position, passage in enumerate(self.passages):
+                    if used_tokens + passage['tokens'] > token_budget:
+                        break
+                    selected.append(position)
+                    used_tokens += passage['tokens']
+
+        sections = []
+        current_source = None
+        for position in sorted(selected):
+            passage = self.passages[position]
+            if passage['source'] != current_source:
+                current_source = passage['source']
+                sections.append(f"=== {current_source} ===")
+            sections.append(passage['text'])
+        context = "\n\n".join(sections)
+
+        stats = {
+            'passages_selected': len(selected),
+            'passages_total': len(self.passages),
+            'context_tokens': estimate_tokens(context),
+            'knowledge_base_tokens': self.total_tokens,
+            'sources': sorted({self.passages[position]['source'] for position in selected})
+        }
+        return context, stats
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from app.services.kb_retrieval import BM25Index, chunk_documents
+
+# Project root knowledge_base directory used when no explicit path is given
+DEFAULT_KNOWLEDGE_BASE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "knowledge_base"
+)
+
+
+class KnowledgeBaseSnapshot:
+    """Immutable view of the knowledge base files loaded at one point in time"""
+
+    def __init__(self, files: List[Tuple[str, str]], fingerprint: Tuple):
+        self.files = files
+        self.fingerprint = fingerprint
+        self.text = "\n\n".join(f"=== {name} ===\n{content}" for name, content in files)
+        self.index = BM25Index(chunk_documents(files))
+        self.version = hashlib.sha256(self.text.encode('utf-8')).hexdigest()
+        self.loaded_at = time.time()
+
+    @property
+    def char_count(self) -> int:
+        return len(self.text)
+
+    @property
+    def file_count(self) -> int:
+        return len(self.files)
+
+
+class KnowledgeBaseStore:
+    """
+    Per-process knowledge base cache. The directory is re-checked at most every
+    revalidate_interval seconds by comparing file mtimes and sizes, and a changed
+    directory is reloaded into a new snapshot that replaces the old one atomically.
+    Callers holding the previous snapshot keep using it undisturbed.
+    """
+
+    def __init__(self, path: str, revalidate_interval: float = 30.0):
+        self.path = path
+        self.revalidate_interval = revalidate_interval
+        self._snapshot: Optional[KnowledgeBaseSnapshot] = None
+        self._last_checked = 0.0
+        self._reload_lock = threading.Lock()
+
+    def _fingerprint(self) -> Tuple:
+        """(name, mtime, size) of every text file, using stat calls only"""
+        entries = []
+        for root, dirs, files in os.walk(self.path):
+            for file in files:
+                if file.endswith('.txt'):
+                    stat = os.stat(os.path.join(root, file))
+                    entries.append((os.path.relpath(os.path.join(root, file), self.path), stat.st_mtime_ns, stat.st_size))
+        return tuple(sorted(entries))
+
+    def _load(self, fingerprint: Tuple) -> KnowledgeBaseSnapshot:
+        loaded_files = []
+        for relative_path, _, _ in fingerprint:
+            file_path = os.path.join(self.path, relative_path)
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read().strip()
+                    if content:
+                        loaded_files.append((os.path.basename(relative_path), content))
+                        print(f"Loaded {relative_path}: {len(content)} characters")
+            except Exception as e:
+                print(f"Warning: Could not load {file_path}: {str(e)}")
+                continue
+
+        if not loaded_files:
+            raise Exception("No text files were successfully loaded. Please check your file paths.")
+
+        snapshot = KnowledgeBaseSnapshot(loaded_files, fingerprint)
+        print(f"Knowledge base loaded: {snapshot.file_count} files, {snapshot.char_count} total characters, "
+              f"{len(snapshot.index.passages)} passages indexed")
+        return snapshot
+
+    def get_snapshot(self, force_reload: bool = False) -> KnowledgeBaseSnapshot:
+        """
+        Return the current snapshot, revalidating against the directory when the check interval has elapsed
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and not force_reload and time.monotonic() - self._last_checked < self.revalidate_interval:
+            return snapshot
+
+        # Another thread is already revalidating - keep serving the current snapshot meanwhile
+        if snapshot is not None and not force_reload:
+            if not self._reload_lock.acquire(blocking=False):
+                return snapshot
+        else:
+            self._reload_lock.acquire()
+
+        try:
+            if not os.path.isdir(self.path):
+                raise Exception(f"Knowledge base directory not found: {self.path}")
+
+            fingerprint = self._fingerprint()
+            current = self._snapshot
+            if current is None or force_reload or current.fingerprint != fingerprint:
+                if current is not None and current.fingerprint != fingerprint:
+                    print("Knowledge base files changed, reloading snapshot")
+                self._snapshot = self._load(fingerprint)
+            self._last_checked = time.monotonic()
+            return self._snapshot
+        finally:
+            self._reload_lock.release()
+
+    def peek(self) -> Optional[KnowledgeBaseSnapshot]:
+        """Return the loaded snapshot without touching the filesystem"""
+        return self._snapshot
+
+    def invalidate(self):
+        """Force the next get_snapshot call to revalidate against the directory"""
+        self._last_checked = 0.0
+
+
+_stores: Dict[str, KnowledgeBaseStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_knowledge_base_store(path: str = None) -> KnowledgeBaseStore:
+    """Return the shared store for a knowledge base directory, creating it on first use"""
+    path = os.path.abspath(path or DEFAULT_KNOWLEDGE_BASE_PATH)
+    store = _stores.get(path)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(path)
+            if store is None:
+                interval = float(os.environ.get('KB_REVALIDATE_INTERVAL', 30))
+                store = KnowledgeBaseStore(path, revalidate_interval=interval)
+                _stores[path] = store
+    return store
@@ -1,6 +1,37 @@
 import os
-import openai
-from typing import List, Dict, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Iterator, Tuple
+from app.services.kb_retrieval import estimate_tokens, estimate_message_tokens, split_text, CHARS_PER_TOKEN
+from app.services.kb_store import get_knowledge_base_store
+from app.services.openai_client import get_openai_client
+from app.services.prompt_trace import get_prompt_trace_sink
+from app.services.stream_parser import IncrementalSectionParser
+from app.services.metadata_validation import validate_metadata
+from app.services.analysis_prompts import (
+    ANALYSIS_SECTIONS, METADATA_FIELDS, build_combined_messages, build_analysis_messages, build_metadata_messages,
+    build_section_messages, build_summary_messages
+)
+
+# Model used for the analysis sections (and the combined metadata extraction and analysis call)
+ANALYSIS_MODEL = "gpt-4o"
+
+# Small, fast model that extracts the RFP metadata in cascade mode
+EXTRACTION_MODEL = "gpt-4o-mini"
+
+# Cheaper model used to summarize oversized RFP documents before the analysis
+SUMMARY_MODEL = "gpt-4o-mini"
+
+# Size of the document chunks summarized in the map step, and the summary length for each
+SUMMARY_CHUNK_TOKENS = 12000
+SUMMARY_MAX_TOKENS = 1500
+
+# Supported ways of running an analysis, see KnowledgeBaseService.run_analysis
+ANALYSIS_MODES = ('cascade', 'combined', 'parallel')
+
+# Bump whenever the analysis prompt or output structure changes, so cached analyses are not reused
+PROMPT_VERSION = "2025-10-stable-prefix-v3"
 
 class KnowledgeBaseService:
     def __init__(self):
@@ -8,17 +39,61 @@ class KnowledgeBaseService:
         if not self.openai_api_key:
             raise Exception("OPENAI_API_KEY environment variable not set")
         
-        # Get the absolute path to the knowledge_base directory
-        current_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        self.knowledge_base_path = os.path.join(current_dir, "knowledge_base")
-        self.knowledge_base_text = None
+        # Shared per-process store - loaded once and revalidated by file mtimes and sizes
+        self.knowledge_base_store = get_knowledge_base_store()
+        self.knowledge_base_path = self.knowledge_base_store.path
+        
+        # Snapshot pinned for the lifetime of this service, so a reload never changes an in-flight analysis
+        self.snapshot = None
+        
+        # Maximum number of knowledge base tokens sent with each RFP analysis
+        self.context_token_budget = int(os.environ.get('KB_CONTEXT_TOKEN_BUDGET', 4000))
+        
+        # 'cascade' writes the analysis while a smaller model extracts the metadata concurrently,
+        # 'combined' sends one prompt for everything, 'parallel' issues one request per section concurrently
+        self.analysis_mode = os.environ.get('ANALYSIS_MODE', 'cascade')
+        self.max_parallel_requests = int(os.environ.get('ANALYSIS_MAX_PARALLEL_REQUESTS', 8))
+        
+        # Estimated prompt tokens allowed per analysis call; larger RFPs are summarized document by document first.
+        # gpt-4o accepts 128k tokens including the 8000 reserved for the response, the rest is estimation headroom.
+        self.prompt_token_budget = int(os.environ.get('ANALYSIS_PROMPT_TOKEN_BUDGET', 100000))
+        
+        # Incremental analysis sends only the newest documents in full and stored summaries for the rest
+        self.incremental_analysis = os.environ.get('ANALYSIS_INCREMENTAL', 'false').lower() == 'true'
+        self.full_text_documents = int(os.environ.get('ANALYSIS_FULL_TEXT_DOCUMENTS', 1))
+        
+        # Model routing for metadata in cascade mode: fields the extraction model gets wrong are
+        # extracted again by the escalation model
+        self.extraction_model = os.environ.get('ANALYSIS_EXTRACTION_MODEL', EXTRACTION_MODEL)
+        self.escalation_model = os.environ.get('ANALYSIS_ESCALATION_MODEL', ANALYSIS_MODEL)
+        self.escalated_fields = []
+        
+        # Token usage of the calls made by this service, including prompt tokens served from the provider's prompt cache
+        self.usage = {'calls': 0, 'prompt_tokens': 0, 'cached_prompt_tokens': 0, 'completion_tokens': 0}
+        self._usage_lock = threading.Lock()
+        
+        # Seconds spent per stage (prompt_build, llm, parse, summaries), summed over calls
+        self.timings = {}
+        
+        # Sampled, opt-in tracing of prompts and responses (PROMPT_TRACE_SAMPLE_RATE); None when not traced
+        self.trace_sink = get_prompt_trace_sink()
+        self.trace_id = self.trace_sink.new_trace_id()
+    
+    @property
+    def knowledge_base_text(self):
+        return self.snapshot.text if self.snapshot is not None else None
+    
+    @property
+    def knowledge_base_index(self):
+        return self.snapshot.index if self.snapshot is not None else None
         
     def reset_knowledge_base(self):
         """
-        Reset the knowledge base by clearing cached text
+        Reset the knowledge base so the next load revalidates against the directory
         """
         try:
-            self.knowledge_base_text = None
+            self.snapshot = None
+            self.knowledge_base_store.invalidate()
             print("Cleared cached knowledge base text")
             return True
         except Exception as e:
@@ -27,209 +102,556 @@ class KnowledgeBaseService:
     
     def load_knowledge_base(self, documents_path: str = None, force_reset: bool = False):
         """
-        Load all knowledge base text files directly into memory
+        Load all knowledge base text files into the shared store and pin the current snapshot
         """
-        # Reset if requested
-        if force_reset:
-            self.reset_knowledge_base()
-        
-        # Use default path if none provided
-        if documents_path is None:
-            documents_path = self.knowledge_base_path
-        
-        # Return cached text if already loaded and not forcing reset
-        if self.knowledge_base_text is not None and not force_reset:
-            return len(self.knowledge_base_text)
+        if documents_path is not None:
+            self.knowledge_base_store = get_knowledge_base_store(documents_path)
+            self.knowledge_base_path = self.knowledge_base_store.path
         
-        all_text = []
-        file_count = 0
-        
-        # Load all text files directly
-        for root, dirs, files in os.walk(documents_path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                try:
-                    if file.endswith('.txt'):
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            content = f.read().strip()
-                            if content:
-                                all_text.append(f"=== {file} ===\n{content}")
-                                file_count += 1
-                                print(f"Loaded {file}: {len(content)} characters")
-                except Exception as e:
-                    print(f"Warning: Could not load {file_path}: {str(e)}")
-                    continue
-        
-        if not all_text:
-            raise Exception("No text files were successfully loaded. Please check your file paths.")
-        
-        # Combine all text with separators
-        self.knowledge_base_text = "\n\n".join(all_text)
-        
-        print(f"Knowledge base loaded: {file_count} files, {len(self.knowledge_base_text)} total characters")
-        return len(self.knowledge_base_text)
+        self.snapshot = self.knowledge_base_store.get_snapshot(force_reload=force_reset)
+        return self.snapshot.char_count
     
-    def analyze_rfp(self, rfp_text: str, rfp_metadata: Dict[str, Any]) -> Dict[str, Any]:
+    def select_context(self, rfp_text: str) -> str:
         """
-        Analyze RFP against company knowledge base using direct text approach
+        Select the knowledge base passages most relevant to the RFP within the context token budget
+        """
+        context, stats = self.knowledge_base_index.select_context(rfp_text, self.context_token_budget)
+        print(f"Selected {stats['passages_selected']}/{stats['passages_total']} knowledge base passages "
+              f"({stats['context_tokens']}/{stats['knowledge_base_tokens']} tokens) from: {', '.join(stats['sources'])}")
+        return context
+    
+    def _prepare_context(self, rfp_text: str) -> str:
+        """
+        Make sure the knowledge base is loaded and select the context for this RFP
         """
         # Load knowledge base if not already loaded
-        if self.knowledge_base_text is None:
+        if self.knowledge_base_index is None:
             try:
                 self.load_knowledge_base()
             except Exception as e:
                 print(f"Knowledge base not loaded: {e}")
                 raise Exception("Knowledge base not available. Please initialize the knowledge base first.")
         
-        # Use the complete knowledge base text as context - NO TRUNCATION
-        context = self.knowledge_base_text
-        print(f"Using complete knowledge base as context: {len(context)} characters")
-        print(f"Using complete RFP text: {len(rfp_text)} characters")
+        # Only the knowledge base passages relevant to this RFP are sent, so the prompt is dominated by the RFP
+        context = self.select_context(rfp_text)
+        print(f"Using complete RFP text: {len(rfp_text)} characters (~{estimate_tokens(rfp_text)} tokens)")
+        return context
+    
+    def _prepare_analysis(self, rfp_text: str) -> List[Dict[str, str]]:
+        """
+        Build the chat messages for the combined metadata extraction and analysis call
+        """
+        context = self._prepare_context(rfp_text)
         
         # Create comprehensive prompt that combines metadata extraction and analysis
-        # IMPORTANT: Pass FULL RFP text and FULL knowledge base - no truncation anywhere
-        combined_prompt = f"""
-        You are an expert climate consulting business development analyst for OnePointFive, responsible for evaluating Request for Proposals (RFPs) provided by the user. You have access to our company's knowledge base, which includes:
-        - Summaries of past proposals (ASME.txt, EDF.txt, EIT.txt, FAI.txt, Kendra_Scott.txt, Sanofi.txt, Sarona_ADI.txt, Sweef_Kinetik.txt, Talon.txt)
-        - Summary of the case studies on our website (all_case_studies.txt)
-        - Summary of our master slide deck (master_slide_deck.txt)
-
-        Your task is to critically assess the fit of each RFP relative to OnePointFive's capabilities, ensuring that the analysis is both honest and professional. When performing the analysis, consider the following:
-        - Be cautious not to overestimate the fit of an RFP. While our capabilities are strong, do not let the marketing content in "all_case_studies.txt" unduly influence the evaluation. This document representss past projects and is intended for promotional purposes, so its content may portray our capabilities too optimistically.
+        # IMPORTANT: Pass FULL RFP text - the knowledge base is reduced to the most relevant passages
+        messages = build_combined_messages(rfp_text, context)
+        prompt_chars = sum(len(message["content"]) for message in messages)
+        print(f"Total context size being sent to OpenAI: {prompt_chars} characters "
+              f"(knowledge base {len(context)}, RFP {len(rfp_text)})")
         
-        When an RFP is provided, you have two primary tasks:
-        1. EXTRACT METADATA from the RFP
-        2. ANALYZE the RFP against OPF's specific capabilities
-
-        COMPLETE RFP CONTENT:
-        {rfp_text}
-
-        COMPLETE OPF COMPANY CAPABILITIES AND EXPERIENCE:
-        {context}
-
-        TASK 1: METADATA EXTRACTION
-        Extract information from the RFP text above. For OPF-specific fields, use your knowledge of OPF's capabilities from the knowledge base to assess what gaps exist between what the RFP requires and what OPF can deliver.
-        OPF-specific fields include: opf_gap_size, opf_gaps
-
-        CRITICAL FOR OPF-SPECIFIC METADATA:
-        - opf_gap_size: Compare RFP requirements against OPF's capabilities to determine the size/scope of gaps
-        - opf_gaps: Identify specific areas where OPF lacks capabilities mentioned in the RFP
-        - Use the complete OPF knowledge base above to make these assessments
-
-        TASK 2: RFP ANALYSIS
-        Analyze this RFP against OPF's SPECIFIC capabilities and experience from the complete knowledge base above.
-
-        CRITICAL REQUIREMENTS FOR ANALYSIS:
-        1. Reference SPECIFIC projects, clients, or capabilities from OPF's complete knowledge base
-        2. Use actual company names, project examples, and specific expertise mentioned
-        3. Avoid generic statements - be specific about OPF's actual experience
-        4. When mentioning capabilities, reference where they come from in the knowledge base
-        5. Use your complete understanding of OPF from the knowledge base to provide insightful analysis
-
-        Return a SINGLE JSON response with this exact structure:
-        {{
-            "extracted_metadata": {{
-                "organization_group": "The organization or group issuing the RFP (if clearly stated)",
-                "country": "The country where the project will be implemented (if clearly stated)",
-                "region": "The region or geographic area (if clearly stated)",
-                "industry": "The industry sector (if clearly inferrable). Choose from the most appropriate industry(ies) from the following options: Infrastructure, Culture, Recycling, Carbon Systems, Circularity, Food/Agriculture, Finance, Strategy, Energy Environmental, Development, Transportation, Health & Safety. If the project does not fit clearly into one of these categories, provide the best fit.",
-                "project_focus": "The main focus or objective of the project (if clearly inferrable). Choose the most appropriate focus area(s) from the following options: Skills Development, Agriculture Systems, Transportation Systems, Broad Sustainability Strategy, Natural Disaster, Investment Strategy, Water Assessment, Environmental Analysis, Climate Risk, Circular Economy, Nature-Based Solutions, Climate Change Policy, Energy Systems. If the project does not fit clearly into one of these categories, use a label outside these options but still provide the best fit.",
-                "opf_gap_size": "Assess the size/scope of gaps between RFP requirements and OPF's capabilities from the knowledge base (Small/Medium/Large/None)",
-                "opf_gaps": "Identify specific capability gaps by comparing RFP requirements to OPF's knowledge base capabilities",
-                "deliverables": "The expected deliverables (if clearly stated)",
-                "posting_contact": "Contact information for the posting (if clearly stated)",
-                "potential_experts": "Required expertise or expert profiles (if clearly stated)",
-                "project_cost": "The project budget or cost (if clearly stated, as a number only)",
-                "currency": "The currency for the project cost (if clearly stated)",
-                "specific_staffing_needs": "Specific staffing requirements (if clearly stated)",
-                "due_date": "The proposal due date (if clearly stated, in YYYY-MM-DD format)"
-            }},
-            "analysis": {{
-                "fit_assessment": "Provide a comprehensive High/Medium/Low assessment with extensive detailed reasoning. Include specific examples from OPF's knowledge base, cite relevant past projects, client work, and capabilities. Explain the reasoning behind the assessment with multiple supporting points and detailed analysis of how OPF's specific experience aligns with or differs from the RFP requirements. This should be a thorough, multi-paragraph analysis.",
-                "key_strengths": "Provide an extensive analysis of OPF's key strengths relevant to this RFP. Include specific project examples, client names, methodologies, tools, and outcomes from the knowledge base. Detail how each strength directly addresses RFP requirements. Cite specific case studies, successful implementations, and unique differentiators. This should be comprehensive and detailed, covering all relevant strengths with supporting evidence from the knowledge base.",
-                "gaps_challenges": "Conduct a thorough analysis of areas where OPF may face challenges or lack specific expertise required by the RFP. Be detailed about what capabilities are missing, what would need to be developed or acquired, and how significant these gaps are. Include analysis of resource requirements, timeline implications, and potential mitigation strategies. Reference specific requirements from the RFP that may not be fully covered by current OPF capabilities.",
-                "recommendations": "Provide comprehensive, actionable recommendations based on OPF's actual experience and capabilities from the knowledge base. Include detailed strategies for approach, methodology, team composition, timeline considerations, and risk mitigation. Reference similar past projects and lessons learned. Provide multiple recommendation categories such as strategic approach, tactical execution, resource allocation, and partnership considerations.",
-                "resource_requirements": "Conduct a detailed analysis of specific team members, skill sets, resources, tools, and capabilities OPF would need for this project. Based on the knowledge base, identify existing team members who could contribute and specify additional hires or partnerships needed. Include analysis of budget implications, timeline for resource acquisition, and organizational capacity considerations.",
-                "risk_assessment": "Provide a comprehensive risk analysis covering technical, operational, financial, timeline, and strategic risks specific to this RFP and OPF's capabilities. Reference past project experiences from the knowledge base where similar risks were encountered. Include detailed mitigation strategies for each identified risk and contingency planning recommendations.",
-                "competitive_position": "Conduct an extensive analysis of how OPF compares to potential competitors for this RFP. Reference specific past wins, losses, and competitive situations from the knowledge base. Detail OPF's unique differentiators, potential weaknesses relative to competitors, and strategic positioning recommendations. Include market analysis and competitive intelligence based on OPF's experience."
-            }}
-        }}
-
-        METADATA EXTRACTION GUIDELINES:
-        - Extract information that is explicitly stated or can be reasonably inferred
-        - For OPF-specific fields (opf_gap_size, opf_gaps), analyze the COMPLETE RFP requirements against the COMPLETE OPF knowledge base
-        - opf_gap_size: Determine gap size by comparing what RFP needs vs what OPF can deliver based on knowledge base
-        - opf_gaps: List specific missing capabilities by analyzing RFP needs against OPF's complete capability set
-        - For dates, use FULL YYYY-MM-DD format (e.g., '2029-12-31', not just '2029')
-        - If only year is given, use YYYY-01-01 format
-        - If year and month are given, use YYYY-MM-01 format
-        - For costs, extract only the numeric value
-        - If a non-OPF field is not mentioned or unclear, use null
-
-        ANALYSIS GUIDELINES:
-        - Every analysis point must reference specific information from the COMPLETE OPF knowledge base
-        - Provide EXTENSIVE, DETAILED, COMPREHENSIVE responses - aim for thorough, multi-paragraph analyses for each section
-        - Be highly specific about OPF's actual experience from the complete knowledge base, not generic consulting capabilities
-        - Reference specific client names, project types, methodologies, tools, outcomes, and lessons learned from the complete knowledge base
-        - Use the FULL RFP content and FULL OPF knowledge base for comprehensive analysis
-        - Each analysis section should be substantial and detailed - think comprehensive report sections, not brief summaries
-        - Include specific examples, case studies, numbers, outcomes, and evidence from the knowledge base wherever possible
-        - Provide actionable insights with detailed reasoning and supporting evidence
-        - Make each section comprehensive enough to stand alone as a thorough analysis
-        """
-        
-        # Debug: Write prompts to output.txt for debugging
-        try:
-            # Get the absolute path to the project root directory
-            current_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-            output_file_path = os.path.join(current_dir, "output.txt")
-            
-            with open(output_file_path, 'w', encoding='utf-8') as f:
-                f.write("=== DEBUG: OpenAI Combined Prompt and COMPLETE Context ===\n\n")
-                f.write(f"PROMPT LENGTH: {len(combined_prompt)} characters\n")
-                f.write(f"KNOWLEDGE BASE LENGTH: {len(context)} characters\n")
-                f.write(f"RFP TEXT LENGTH: {len(rfp_text)} characters\n")
-                f.write(f"TOTAL CONTEXT SIZE: {len(combined_prompt)} characters\n\n")
-                
-                f.write("=== COMBINED METADATA EXTRACTION & ANALYSIS PROMPT (COMPLETE) ===\n")
-                f.write(combined_prompt)
-                f.write("\n\n=== COMPLETE KNOWLEDGE BASE CONTEXT (NO TRUNCATION) ===\n")
-                f.write(context)
-                f.write(f"\n\n=== COMPLETE RFP TEXT (NO TRUNCATION) ===\n")
-                f.write(rfp_text)
-                f.write("\n\n=== END DEBUG INFO ===\n")
-            print(f"Complete debug information written to: {output_file_path}")
-            print(f"Total context size being sent to OpenAI: {len(combined_prompt)} characters")
-        except Exception as debug_e:
-            print(f"Warning: Could not write debug output: {debug_e}")
-        
-        # Call OpenAI API with combined prompt for both analysis and metadata extraction
-        client = openai.OpenAI(api_key=self.openai_api_key)
-        
-        # Single API call for both metadata extraction and analysis with COMPLETE context
+        return messages
+    
+    def _create_completion(self, client, messages: List[Dict[str, str]], max_tokens: int = 8000,
+                           model: str = ANALYSIS_MODEL, **kwargs):
+        """
+        Call the analysis model, turning context length errors into a readable message
+        """
         try:
-            # Try with GPT-4o first - using complete context without any truncation
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are an expert RFP analyst for OPF with complete knowledge of the company. You have access to the COMPLETE RFP content and COMPLETE OPF knowledge base. For OPF-specific metadata fields like opf_gap_size and opf_gaps, you must analyze the complete RFP requirements against OPF's complete capabilities to assess gaps. Provide EXTENSIVE, DETAILED, COMPREHENSIVE analysis for each section - think thorough report sections with multiple paragraphs, specific examples, and detailed reasoning. Always return valid JSON with the exact structure requested."},
-                    {"role": "user", "content": combined_prompt}
-                ],
+            return client.create_chat_completion(
+                model=model,
+                messages=messages,
                 temperature=0.2,  # Lower temperature for consistent, specific responses
-                max_tokens=8000  # Balanced for comprehensive analysis while avoiding worker timeouts
+                max_tokens=max_tokens,  # 8000 is balanced for comprehensive analysis while avoiding worker timeouts
+                **kwargs
             )
         except Exception as e:
             if "context_length_exceeded" in str(e):
                 # If context is too long, we need to handle this differently since we don't want to truncate
-                print(f"Context length exceeded. Total prompt size: {len(combined_prompt)} characters")
+                prompt_size = sum(len(message["content"]) for message in messages)
+                print(f"Context length exceeded. Total prompt size: {prompt_size} characters")
                 print("Consider using a model with larger context window or splitting the analysis")
-                raise Exception(f"Context too large ({len(combined_prompt)} characters) for available models. Consider using a model with larger context window.")
+                raise Exception(f"Context too large ({prompt_size} characters) for available models. Consider using a model with larger context window.")
             else:
                 raise e
+    
+    def _record_usage(self, usage, label: str = 'analysis'):
+        """
+        Add the token usage of one response to self.usage and log how much of the prompt was a cache hit
+        """
+        if usage is None:
+            return
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached_tokens = (getattr(details, 'cached_tokens', None) or 0) if details is not None else 0
+        prompt_tokens = usage.prompt_tokens or 0
+        
+        with self._usage_lock:
+            self.usage['calls'] += 1
+            self.usage['prompt_tokens'] += prompt_tokens
+            self.usage['cached_prompt_tokens'] += cached_tokens
+            self.usage['completion_tokens'] += usage.completion_tokens or 0
+        
+        print(f"OpenAI usage for {label}: {prompt_tokens} prompt tokens ({cached_tokens} cached), "
+              f"{usage.completion_tokens} completion tokens")
+    
+    def estimate_prompt_tokens(self, rfp_text: str) -> int:
+        """
+        Estimate the prompt size of an analysis of rfp_text before anything is sent. The combined
+        prompt is the largest one either analysis mode sends, so it bounds both.
+        """
+        return estimate_message_tokens(build_combined_messages(rfp_text, "")) + self.context_token_budget
+    
+    def needs_map_reduce(self, rfp_text: str) -> bool:
+        """True when the RFP is too large to analyse directly within the prompt token budget"""
+        return self.estimate_prompt_tokens(rfp_text) > self.prompt_token_budget
+    
+    def _plan_summaries(self, documents: List[Tuple[str, str]]) -> List[int]:
+        """
+        Pick the documents to replace with summaries: the largest ones first, until the estimated
+        prompt fits the budget. Smaller documents keep their full text.
+        """
+        from app.services.analysis_pipeline import build_rfp_text
+        
+        estimated = self.estimate_prompt_tokens(build_rfp_text(documents))
+        chunk_chars = SUMMARY_CHUNK_TOKENS * CHARS_PER_TOKEN
         
-        # Parse the combined response
+        by_size = sorted(range(len(documents)), key=lambda i: len(documents[i][1]), reverse=True)
+        selected = []
+        for i in by_size:
+            if estimated <= self.prompt_token_budget:
+                break
+            document_tokens = estimate_tokens(documents[i][1])
+            chunk_count = -(-len(documents[i][1]) // chunk_chars)
+            summary_tokens = chunk_count * SUMMARY_MAX_TOKENS
+            if summary_tokens >= document_tokens:
+                continue
+            selected.append(i)
+            estimated -= document_tokens - summary_tokens
+        return selected
+    
+    def summarize_documents(self, documents: List[Tuple[str, str]]) -> List[str]:
+        """
+        Map step: split each document into chunks and summarize all chunks concurrently.
+        Returns one summary per document, in the order given.
+        """
+        chunk_chars = SUMMARY_CHUNK_TOKENS * CHARS_PER_TOKEN
+        jobs = []
+        for doc_index, (name, text) in enumerate(documents):
+            chunks = split_text(text, chunk_chars)
+            for part, chunk in enumerate(chunks, start=1):
+                jobs.append((doc_index, part, build_summary_messages(name, chunk, part, len(chunks))))
+        
+        print(f"Summarizing {len(documents)} documents in {len(jobs)} chunks with {SUMMARY_MODEL}")
+        client = get_openai_client(self.openai_api_key)
+        
+        parts = {}
+        with ThreadPoolExecutor(max_workers=self.max_parallel_requests) as executor:
+            futures = {
+                executor.submit(self._create_completion, client, messages, max_tokens=SUMMARY_MAX_TOKENS,
+                                model=SUMMARY_MODEL): (doc_index, part, messages)
+                for doc_index, part, messages in jobs
+            }
+            for future in as_completed(futures):
+                doc_index, part, messages = futures[future]
+                try:
+                    response = future.result()
+                except Exception as e:
+                    raise Exception(f"Failed to summarize document '{documents[doc_index][0]}': {str(e)}")
+                self._record_usage(response.usage, label=f"summary of {documents[doc_index][0]} part {part}")
+                parts[(doc_index, part)] = response.choices[0].message.content.strip()
+                self._trace(f"summary-{documents[doc_index][0]}-{part}", messages, parts[(doc_index, part)],
+                            SUMMARY_MODEL, None, response.usage)
+        
+        return [
+            "\n\n".join(parts[key] for key in sorted(key for key in parts if key[0] == doc_index))
+            for doc_index in range(len(documents))
+        ]
+    
+    def fit_rfp_to_budget(self, rfp_text: str, documents: List[Tuple[str, str]] = None) -> str:
+        """
+        Return the RFP text to analyse. Within the prompt token budget that is rfp_text itself;
+        otherwise the largest documents are replaced by summaries (map) and the analysis then
+        runs once over the result (reduce).
+        """
+        from app.services.analysis_pipeline import build_rfp_text
+        
+        estimated = self.estimate_prompt_tokens(rfp_text)
+        if estimated <= self.prompt_token_budget:
+            return rfp_text
+        
+        documents = [(doc[0], doc[1] or '') for doc in (documents or [("RFP", rfp_text)])]
+        selected = self._plan_summaries(documents)
+        print(f"Estimated prompt of {estimated} tokens exceeds the {self.prompt_token_budget} token budget, "
+              f"summarizing {len(selected)} of {len(documents)} documents")
+        
+        started = time.perf_counter()
+        summaries = self.summarize_documents([documents[i] for i in selected])
+        self._add_timing('summaries', time.perf_counter() - started)
+        reduced = list(documents)
+        for i, summary in zip(selected, summaries):
+            reduced[i] = (f"{documents[i][0]} (summary)", summary)
+        
+        reduced_text = build_rfp_text(reduced)
+        estimated = self.estimate_prompt_tokens(reduced_text)
+        if estimated > self.prompt_token_budget:
+            raise Exception(f"RFP is too large to analyse even after summarizing its documents "
+                            f"(~{estimated} tokens, budget {self.prompt_token_budget}).")
+        print(f"Analysing summarized RFP text: {len(reduced_text)} characters (~{estimate_tokens(reduced_text)} tokens)")
+        return reduced_text
+    
+    def _add_timing(self, stage: str, seconds: float):
+        with self._usage_lock:
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+    
+    def _trace(self, label: str, messages: List[Dict[str, str]], response_text: str, model: str,
+               seconds: float = None, usage=None):
+        """Hand one model call to the trace sink when this request is sampled"""
+        if self.trace_id is None:
+            return
+        self.trace_sink.record(self.trace_id, label, messages, response_text, {
+            'model': model,
+            'llm_ms': round(seconds * 1000, 1) if seconds is not None else None,
+            'prompt_tokens': getattr(usage, 'prompt_tokens', None),
+            'completion_tokens': getattr(usage, 'completion_tokens', None),
+            'knowledge_base_version': self.snapshot.version if self.snapshot is not None else None
+        })
+    
+    def analyze_rfp(self, rfp_text: str, rfp_metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Analyze RFP against company knowledge base using direct text approach
+        """
+        started = time.perf_counter()
+        messages = self._prepare_analysis(rfp_text)
+        self._add_timing('prompt_build', time.perf_counter() - started)
+        
+        # Single API call for both metadata extraction and analysis
+        client = get_openai_client(self.openai_api_key)
+        started = time.perf_counter()
+        response = self._create_completion(client, messages)
+        llm_seconds = time.perf_counter() - started
+        self._add_timing('llm', llm_seconds)
+        self._record_usage(response.usage)
         response_text = response.choices[0].message.content.strip()
+        self._trace('analysis', messages, response_text, ANALYSIS_MODEL, llm_seconds, response.usage)
+        
+        started = time.perf_counter()
+        analysis = self._parse_analysis_response(response_text)
+        self._add_timing('parse', time.perf_counter() - started)
+        return analysis
+    
+    def stream_analyze_rfp(self, rfp_text: str, rfp_metadata: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the combined analysis. Yields token events as text arrives, section events as soon as
+        each analysis section (or the metadata object) is complete, and a final complete event
+        carrying the same structure analyze_rfp returns.
+        """
+        started = time.perf_counter()
+        messages = self._prepare_analysis(rfp_text)
+        self._add_timing('prompt_build', time.perf_counter() - started)
+        
+        client = get_openai_client(self.openai_api_key)
+        response_text, _ = yield from self._stream_analysis_call(client, messages)
+        
+        started = time.perf_counter()
+        analysis = self._parse_analysis_response(response_text)
+        self._add_timing('parse', time.perf_counter() - started)
+        yield {'type': 'complete', 'analysis': analysis}
+    
+    def _stream_analysis_call(self, client, messages: List[Dict[str, str]], metadata_future=None):
+        """
+        Stream one analysis call, yielding token and section events, and return the response text.
+        metadata_future is the concurrent metadata extraction of cascade mode: its section event is
+        yielded as soon as it finishes, and its result is returned along with the text.
+        """
+        started = time.perf_counter()
+        stream = self._create_completion(client, messages, stream=True, stream_options={"include_usage": True})
+        
+        parser = IncrementalSectionParser()
+        response_parts = []
+        usage = None
+        metadata = None
+        for chunk in stream:
+            if metadata_future is not None and metadata is None and metadata_future.done():
+                metadata = self._metadata_result(metadata_future)
+                yield {'type': 'section', 'section': 'extracted_metadata', 'content': metadata}
+            
+            # With include_usage the final chunk carries the usage and no choices
+            if chunk.usage is not None:
+                usage = chunk.usage
+                self._record_usage(chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            response_parts.append(delta)
+            yield {'type': 'token', 'content': delta}
+            
+            for path, value in parser.feed(delta):
+                if path == ('extracted_metadata',):
+                    yield {'type': 'section', 'section': 'extracted_metadata', 'content': value}
+                elif len(path) == 2 and path[0] == 'analysis':
+                    yield {'type': 'section', 'section': path[1], 'content': value}
+        
+        llm_seconds = time.perf_counter() - started
+        response_text = "".join(response_parts).strip()
+        self._trace('analysis-stream', messages, response_text, ANALYSIS_MODEL, llm_seconds, usage)
+        
+        # The metadata call usually finishes first; otherwise its wait is part of the LLM time
+        if metadata_future is not None and metadata is None:
+            metadata = self._metadata_result(metadata_future)
+            yield {'type': 'section', 'section': 'extracted_metadata', 'content': metadata}
+        self._add_timing('llm', time.perf_counter() - started)
+        return response_text, metadata
+    
+    def analyze_rfp_cascade(self, rfp_text: str, rfp_metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Write the analysis sections with the analysis model while the extraction model pulls the
+        metadata out concurrently, merged into the structure analyze_rfp returns
+        """
+        started = time.perf_counter()
+        context = self._prepare_context(rfp_text)
+        messages = build_analysis_messages(rfp_text, context)
+        self._add_timing('prompt_build', time.perf_counter() - started)
         
+        client = get_openai_client(self.openai_api_key)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            metadata_future = executor.submit(self.extract_metadata, client, rfp_text, context)
+            response = self._create_completion(client, messages)
+            llm_seconds = time.perf_counter() - started
+            metadata = self._metadata_result(metadata_future)
+        self._add_timing('llm', time.perf_counter() - started)
+        self._record_usage(response.usage)
+        response_text = response.choices[0].message.content.strip()
+        self._trace('analysis', messages, response_text, ANALYSIS_MODEL, llm_seconds, response.usage)
+        
+        started = time.perf_counter()
+        analysis = self._parse_analysis_response(response_text)
+        self._add_timing('parse', time.perf_counter() - started)
+        if metadata:
+            analysis['extracted_metadata'] = metadata
+        return analysis
+    
+    def stream_analyze_cascade(self, rfp_text: str, rfp_metadata: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming counterpart of analyze_rfp_cascade: the analysis call is streamed and the metadata
+        section is yielded whenever the concurrent extraction finishes
+        """
+        started = time.perf_counter()
+        context = self._prepare_context(rfp_text)
+        messages = build_analysis_messages(rfp_text, context)
+        self._add_timing('prompt_build', time.perf_counter() - started)
+        
+        client = get_openai_client(self.openai_api_key)
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            metadata_future = executor.submit(self.extract_metadata, client, rfp_text, context)
+            response_text, metadata = yield from self._stream_analysis_call(client, messages, metadata_future)
+        finally:
+            executor.shutdown(wait=False)
+        
+        started = time.perf_counter()
+        analysis = self._parse_analysis_response(response_text)
+        self._add_timing('parse', time.perf_counter() - started)
+        if metadata:
+            analysis['extracted_metadata'] = metadata
+        yield {'type': 'complete', 'analysis': analysis}
+    
+    def extract_metadata(self, client, rfp_text: str, context: str) -> Dict[str, Any]:
+        """
+        Extract the RFP metadata with the extraction model and validate every field. Only fields
+        that fail validation (all of them if the call itself fails) are extracted again with the
+        escalation model; fields still invalid after that are left empty.
+        """
+        fields = list(METADATA_FIELDS)
+        try:
+            extracted = self._run_parallel_call(client, 'extracted_metadata', build_metadata_messages(rfp_text, context),
+                                                model=self.extraction_model)
+            metadata, failures = validate_metadata(extracted, fields)
+        except Exception as e:
+            print(f"Metadata extraction with {self.extraction_model} failed: {e}")
+            metadata = {}
+            failures = {field: 'the extraction call failed' for field in fields}
+        
+        if not failures:
+            return metadata
+        
+        self.escalated_fields = list(failures)
+        print(f"Escalating metadata fields to {self.escalation_model}: "
+              f"{', '.join(f'{field} ({reason})' for field, reason in failures.items())}")
+        messages = build_metadata_messages(rfp_text, context, fields=list(failures), rejected=failures)
+        try:
+            extracted = self._run_parallel_call(client, 'extracted_metadata', messages, model=self.escalation_model,
+                                                label='extracted_metadata-escalation')
+            escalated, still_failing = validate_metadata(extracted, list(failures))
+        except Exception as e:
+            # The fields that passed validation are kept either way
+            print(f"Metadata escalation with {self.escalation_model} failed: {e}")
+            escalated = {}
+            still_failing = {field: 'the escalation call failed' for field in failures}
+        metadata.update(escalated)
+        for field, reason in still_failing.items():
+            print(f"Leaving metadata field {field} empty after escalation: {reason}")
+            metadata[field] = None
+        return metadata
+    
+    def _metadata_result(self, metadata_future) -> Dict[str, Any]:
+        """The concurrent metadata extraction's result; a failure leaves the metadata empty"""
+        try:
+            return metadata_future.result()
+        except Exception as e:
+            print(f"Metadata extraction failed: {e}")
+            return {}
+    
+    def run_analysis(self, rfp_text: str, rfp_metadata: Dict[str, Any], mode: str = None,
+                     documents: List[Tuple[str, str]] = None) -> Dict[str, Any]:
+        """
+        Analyze the RFP in cascade mode, with the combined single-call prompt or with the parallel
+        per-section calls.
+        Oversized RFPs are summarized per document first, see fit_rfp_to_budget.
+        """
+        rfp_text = self.fit_rfp_to_budget(rfp_text, documents)
+        mode = mode or self.analysis_mode
+        if mode == 'parallel':
+            return self.analyze_rfp_parallel(rfp_text, rfp_metadata)
+        if mode == 'cascade':
+            return self.analyze_rfp_cascade(rfp_text, rfp_metadata)
+        return self.analyze_rfp(rfp_text, rfp_metadata)
+    
+    def stream_analysis(self, rfp_text: str, rfp_metadata: Dict[str, Any], mode: str = None,
+                        documents: List[Tuple[str, str]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming counterpart of run_analysis. In parallel mode sections arrive whole as each call finishes.
+        """
+        if self.needs_map_reduce(rfp_text):
+            yield {'type': 'status', 'message': 'RFP documents are too large for one request, summarizing them first...'}
+            rfp_text = self.fit_rfp_to_budget(rfp_text, documents)
+        
+        mode = mode or self.analysis_mode
+        if mode == 'parallel':
+            sections = {}
+            for event in self.iter_parallel_analysis(rfp_text, rfp_metadata):
+                sections[event['section']] = event['content']
+                yield event
+            yield {'type': 'complete', 'analysis': self._merge_parallel_sections(sections)}
+        elif mode == 'cascade':
+            yield from self.stream_analyze_cascade(rfp_text, rfp_metadata)
+        else:
+            yield from self.stream_analyze_rfp(rfp_text, rfp_metadata)
+    
+    def iter_parallel_analysis(self, rfp_text: str, rfp_metadata: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Issue metadata extraction and every analysis section as concurrent requests over the same
+        selected context, yielding a section event as each one completes
+        """
+        started = time.perf_counter()
+        context = self._prepare_context(rfp_text)
+        
+        calls = {'extracted_metadata': build_metadata_messages(rfp_text, context)}
+        for section in ANALYSIS_SECTIONS:
+            calls[section] = build_section_messages(section, rfp_text, context)
+        self._add_timing('prompt_build', time.perf_counter() - started)
+        
+        # The shared client is thread-safe, so all calls share one connection pool and rate limiter
+        client = get_openai_client(self.openai_api_key)
+        
+        # Wall-clock time of the concurrent calls; parsing inside each call is timed separately
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_parallel_requests) as executor:
+            futures = {
+                executor.submit(self._run_parallel_call, client, name, messages): name
+                for name, messages in calls.items()
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    content = future.result()
+                    error = None
+                except Exception as e:
+                    print(f"Parallel analysis call for {name} failed: {e}")
+                    content = {} if name == 'extracted_metadata' else f"Section generation failed: {str(e)}"
+                    error = str(e)
+                yield {'type': 'section', 'section': name, 'content': content, 'error': error}
+        self._add_timing('llm', time.perf_counter() - started)
+    
+    def analyze_rfp_parallel(self, rfp_text: str, rfp_metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Analyze RFP with concurrent per-section calls, merged into the same structure analyze_rfp returns
+        """
+        sections = {}
+        failed = []
+        for event in self.iter_parallel_analysis(rfp_text, rfp_metadata):
+            sections[event['section']] = event['content']
+            if event['error']:
+                failed.append(event['section'])
+        
+        analysis = self._merge_parallel_sections(sections)
+        if failed:
+            analysis['failed_sections'] = failed
+        return analysis
+    
+    def regenerate_section(self, rfp_text: str, section: str, rfp_metadata: Dict[str, Any],
+                           documents: List[Tuple[str, str]] = None) -> Any:
+        """
+        Write a single analysis section again with the narrow per-section prompt. The stored RFP
+        metadata is passed along instead of being extracted again; the prompt shares its prefix
+        with the parallel-mode calls, so a recent analysis of the same RFP is a prompt cache hit.
+        """
+        rfp_text = self.fit_rfp_to_budget(rfp_text, documents)
+        
+        started = time.perf_counter()
+        context = self._prepare_context(rfp_text)
+        messages = build_section_messages(section, rfp_text, context, known_metadata=rfp_metadata)
+        self._add_timing('prompt_build', time.perf_counter() - started)
+        
+        client = get_openai_client(self.openai_api_key)
+        started = time.perf_counter()
+        content = self._run_parallel_call(client, section, messages)
+        self._add_timing('llm', time.perf_counter() - started)
+        return content
+    
+    def _run_parallel_call(self, client, name: str, messages: List[Dict[str, str]], model: str = ANALYSIS_MODEL,
+                           label: str = None):
+        """Run one call of the parallel analysis and return its parsed content"""
+        import json
+        
+        label = label or name
+        max_tokens = 1500 if name == 'extracted_metadata' else 2000
+        started = time.perf_counter()
+        response = self._create_completion(client, messages, max_tokens=max_tokens, model=model,
+                                           response_format={"type": "json_object"})
+        llm_seconds = time.perf_counter() - started
+        self._record_usage(response.usage, label=f"{label} ({model})")
+        response_text = response.choices[0].message.content.strip()
+        self._trace(label, messages, response_text, model, llm_seconds, response.usage)
+        
+        started = time.perf_counter()
+        try:
+            result = json.loads(response_text)
+        except json.JSONDecodeError:
+            print(f"JSON parsing failed for {name}, using raw response")
+            return {} if name == 'extracted_metadata' else response_text
+        finally:
+            self._add_timing('parse', time.perf_counter() - started)
+        
+        if name == 'extracted_metadata':
+            return result if isinstance(result, dict) else {}
+        return result.get(name, response_text) if isinstance(result, dict) else response_text
+    
+    def _merge_parallel_sections(self, sections: Dict[str, Any]) -> Dict[str, Any]:
+        """Merge per-section results into the analysis dict, in the usual section order"""
+        analysis = {section: sections.get(section, '') for section in ANALYSIS_SECTIONS}
+        
+        # Add extracted metadata to analysis for backward compatibility
+        if sections.get('extracted_metadata'):
+            analysis['extracted_metadata'] = sections['extracted_metadata']
+        return analysis
+    
+    def _parse_analysis_response(self, response_text: str) -> Dict[str, Any]:
+        """
+        Parse the combined JSON response into the analysis dict, tolerating truncated or wrapped JSON
+        """
         # Try to extract JSON from the response
         try:
             import json
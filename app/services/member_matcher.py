@@ -1,13 +1,17 @@
 import os
-import openai
+import time
 from typing import List, Dict, Any
 from app.services.database import get_database_connection, search_database
+from app.services.openai_client import get_openai_client
 
 class MemberMatcherService:
     def __init__(self):
         self.openai_api_key = os.environ.get('OPENAI_API_KEY')
         if not self.openai_api_key:
             raise Exception("OPENAI_API_KEY environment variable not set")
+        
+        # Seconds spent per stage (llm, database) by find_relevant_members
+        self.timings = {'llm': 0.0, 'database': 0.0}
     
     def extract_expertise_keywords(self, analysis: Dict[str, Any]) -> List[str]:
         """
@@ -24,7 +28,7 @@ class MemberMatcherService:
             return []
         
         # Use OpenAI to extract specific expertise keywords/phrases
-        client = openai.OpenAI(api_key=self.openai_api_key)
+        client = get_openai_client(self.openai_api_key)
         
         prompt = f"""
         Based on the following RFP analysis sections that identify gaps and resource requirements, 
@@ -54,7 +58,7 @@ class MemberMatcherService:
         """
         
         try:
-            response = client.chat.completions.create(
+            response = client.create_chat_completion(
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": "You are an expert at identifying specific expertise requirements from business analysis."},
@@ -215,7 +219,7 @@ class MemberMatcherService:
             member_data.append(member_info)
         
         # Create prompt for ranking
-        client = openai.OpenAI(api_key=self.openai_api_key)
+        client = get_openai_client(self.openai_api_key)
         
         prompt = f"""
         You are an expert at matching team members to project requirements. 
@@ -252,7 +256,7 @@ class MemberMatcherService:
         """
         
         try:
-            response = client.chat.completions.create(
+            response = client.create_chat_completion(
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": "You are an expert at matching team members to project requirements."},
@@ -309,7 +313,9 @@ class MemberMatcherService:
         """
         try:
             # Step 1: Extract expertise keywords from analysis
+            started = time.perf_counter()
             keywords = self.extract_expertise_keywords(rfp_analysis)
+            self.timings['llm'] += time.perf_counter() - started
             print(f"Extracted keywords: {keywords}")
             
             if not keywords:
@@ -321,7 +327,9 @@ class MemberMatcherService:
                 }
             
             # Step 2: Search for members matching keywords
+            started = time.perf_counter()
             members = self.search_members_by_keywords(keywords)
+            self.timings['database'] += time.perf_counter() - started
             print(f"Found {len(members)} members matching keywords")
             
             if not members:
@@ -333,7 +341,9 @@ class MemberMatcherService:
                 }
             
             # Step 3: Rank members by relevance
+            started = time.perf_counter()
             ranked_members = self.rank_members_by_relevance(members, rfp_analysis, keywords)
+            self.timings['llm'] += time.perf_counter() - started
             print(f"Ranked {len(ranked_members)} members by relevance")
             
             return {
@@ -0,0 +1,111 @@
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# Allowed values for opf_gap_size, matching the instruction in the metadata prompt
+GAP_SIZES = ('Small', 'Medium', 'Large', 'None')
+
+# Length limits of the rfp_metadata columns the extracted values are stored in
+FIELD_MAX_LENGTHS = {
+    'organization_group': 255,
+    'country': 100,
+    'region': 100,
+    'industry': 100,
+    'opf_gap_size': 50,
+    'posting_contact': 255,
+    'currency': 50
+}
+
+# Values a model uses to say "not stated"
+_EMPTY_VALUES = {'', 'null', 'none', 'n/a', 'na', 'not specified', 'not stated', 'unknown'}
+
+
+def is_empty_value(value: Any) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return value.strip().lower() in _EMPTY_VALUES
+    if isinstance(value, (list, dict)):
+        return len(value) == 0
+    return False
+
+
+def normalize_due_date(value: Any) -> Optional[str]:
+    """
+    Return the due date as YYYY-MM-DD, expanding YYYY and YYYY-MM. Returns None when no date is
+    given and raises ValueError for anything that is not a valid date.
+    """
+    if is_empty_value(value):
+        return None
+    due_date = str(value).strip()
+
+    # If it's just a year, convert to YYYY-01-01
+    if len(due_date) == 4 and due_date.isdigit():
+        due_date = f"{due_date}-01-01"
+    # If it's YYYY-MM, convert to YYYY-MM-01
+    elif len(due_date) == 7 and due_date.count('-') == 1:
+        due_date = f"{due_date}-01"
+
+    # Validate the final date format
+    datetime.strptime(due_date, '%Y-%m-%d')
+    return due_date
+
+
+def normalize_project_cost(value: Any) -> Optional[float]:
+    """
+    Return the project cost as a positive number, ignoring thousands separators and currency
+    symbols. Returns None when no cost is given and raises ValueError for anything else.
+    """
+    if is_empty_value(value):
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid project cost {value!r}")
+    if isinstance(value, (int, float)):
+        cost = float(value)
+    else:
+        cleaned = re.sub(r'[\s,$€£]', '', str(value))
+        cost = float(cleaned)
+    if cost <= 0:
+        raise ValueError(f"Project cost must be positive, got {value!r}")
+    return cost
+
+
+def validate_metadata(metadata: Dict[str, Any], fields: List[str]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Check extracted metadata field by field. Returns (clean_values, failures) where failures maps
+    each rejected field to the reason. Fields the model left empty are valid and come back as None.
+    """
+    clean = {}
+    failures = {}
+    if not isinstance(metadata, dict):
+        return {field: None for field in fields}, {field: 'metadata was not a JSON object' for field in fields}
+
+    for field in fields:
+        value = metadata.get(field)
+        if is_empty_value(value):
+            clean[field] = None
+            continue
+
+        try:
+            if field == 'due_date':
+                clean[field] = normalize_due_date(value)
+            elif field == 'project_cost':
+                clean[field] = normalize_project_cost(value)
+            elif field == 'opf_gap_size':
+                matches = [size for size in GAP_SIZES if size.lower() == str(value).strip().lower()]
+                if not matches:
+                    raise ValueError(f"expected one of {', '.join(GAP_SIZES)}, got {value!r}")
+                clean[field] = matches[0]
+            elif field in FIELD_MAX_LENGTHS:
+                if isinstance(value, dict):
+                    raise ValueError("expected text, got an object")
+                text = ', '.join(str(item) for item in value) if isinstance(value, list) else str(value).strip()
+                if len(text) > FIELD_MAX_LENGTHS[field]:
+                    raise ValueError(f"longer than {FIELD_MAX_LENGTHS[field]} characters")
+                clean[field] = text
+            else:
+                clean[field] = value
+        except (ValueError, TypeError) as e:
+            failures[field] = str(e)
+
+    return clean, failures
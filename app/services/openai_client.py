@@ -0,0 +1,231 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Tuple
+import httpx
+import openai
+from app.services.kb_retrieval import estimate_message_tokens
+
+# Errors worth retrying: rate limits, timeouts, dropped connections and server errors
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+
+class OpenAIBusyError(Exception):
+    """The API kept rejecting a request for rate limit reasons after all retries"""
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at per_minute units per minute, holding at most one minute's worth"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, amount: float) -> float:
+        """Take amount if available and return 0, otherwise return the seconds until it will be"""
+        # A single request larger than the bucket can only ever wait for a full bucket
+        amount = min(amount, self.capacity)
+        with self.lock:
+            self._refill()
+            if self.available >= amount:
+                self.available -= amount
+                return 0.0
+            return (amount - self.available) / self.rate
+
+    def acquire(self, amount: float):
+        """Block until amount is available and take it"""
+        while True:
+            wait_seconds = self.try_acquire(amount)
+            if wait_seconds <= 0:
+                return
+            time.sleep(min(wait_seconds, 1.0))
+
+    def release(self, amount: float):
+        """Return units taken for a request that was never sent"""
+        with self.lock:
+            self.available = min(self.capacity, self.available + amount)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits for one model"""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    def acquire(self, estimated_tokens: int):
+        self.requests.acquire(1)
+        self.tokens.acquire(estimated_tokens)
+
+    def try_acquire(self, estimated_tokens: int) -> bool:
+        """Take capacity only if it is available right now"""
+        if self.requests.try_acquire(1) > 0:
+            return False
+        if self.tokens.try_acquire(estimated_tokens) > 0:
+            self.requests.release(1)
+            return False
+        return True
+
+
+class LatencyTracker:
+    """Rolling window of call durations used to pick the hedging deadline"""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, fraction: float, min_samples: int = 20):
+        """The given percentile of recent durations, or None until enough calls have been seen"""
+        with self.lock:
+            if len(self.samples) < min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class SharedOpenAIClient:
+    """
+    Process-wide OpenAI client. All calls share one pooled HTTP connection pool and are admitted
+    through a per-model token bucket (requests and tokens per minute), retried with jittered
+    exponential backoff on rate limits and transient errors, and optionally hedged: when a call
+    runs past the p95 latency of similar calls, a duplicate is sent and the first answer wins.
+    The limits apply per process, so with several workers set them to each worker's share.
+    """
+
+    def __init__(self, api_key: str):
+        self.requests_per_minute = int(os.environ.get('OPENAI_REQUESTS_PER_MINUTE', 500))
+        self.tokens_per_minute = int(os.environ.get('OPENAI_TOKENS_PER_MINUTE', 300000))
+        self.max_retries = int(os.environ.get('OPENAI_MAX_RETRIES', 4))
+        self.hedge_requests = os.environ.get('OPENAI_HEDGE_REQUESTS', 'false').lower() == 'true'
+        max_connections = int(os.environ.get('OPENAI_MAX_CONNECTIONS', 20))
+
+        # Retries are handled here so they go through the rate limiter; the SDK's own retries are disabled
+        self.client = openai.OpenAI(
+            api_key=api_key,
+            max_retries=0,
+            http_client=openai.DefaultHttpxClient(
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+            )
+        )
+
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._latencies: Dict[Tuple[str, int], LatencyTracker] = {}
+        self._lock = threading.Lock()
+        self._hedge_executor = ThreadPoolExecutor(max_workers=2 * max_connections) if self.hedge_requests else None
+
+    def _limiter(self, model: str) -> RateLimiter:
+        with self._lock:
+            if model not in self._limiters:
+                self._limiters[model] = RateLimiter(self.requests_per_minute, self.tokens_per_minute)
+            return self._limiters[model]
+
+    def _latency(self, model: str, max_tokens: int) -> LatencyTracker:
+        with self._lock:
+            key = (model, max_tokens or 0)
+            if key not in self._latencies:
+                self._latencies[key] = LatencyTracker()
+            return self._latencies[key]
+
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, never shorter than a Retry-After header"""
+        delay = random.uniform(0, min(30.0, 2 ** attempt))
+        response = getattr(error, 'response', None)
+        if response is not None:
+            try:
+                delay = max(delay, float(response.headers.get('retry-after', 0)))
+            except (TypeError, ValueError):
+                pass
+        return delay
+
+    def _send(self, kwargs: Dict, tracker: LatencyTracker):
+        started = time.monotonic()
+        response = self.client.chat.completions.create(**kwargs)
+        if not kwargs.get('stream'):
+            tracker.record(time.monotonic() - started)
+        return response
+
+    def _send_hedged(self, kwargs: Dict, tracker: LatencyTracker, limiter: RateLimiter, estimated_tokens: int):
+        """Send the request, and a duplicate if the first one is slower than the recent p95"""
+        deadline = tracker.percentile(0.95)
+        primary = self._hedge_executor.submit(self._send, kwargs, tracker)
+        if deadline is None:
+            return primary.result()
+
+        done, _ = wait([primary], timeout=deadline)
+        if done or not limiter.try_acquire(estimated_tokens):
+            return primary.result()
+
+        print(f"OpenAI call to {kwargs.get('model')} exceeded the p95 deadline of {deadline:.1f}s, sending a hedged request")
+        pending = {primary, self._hedge_executor.submit(self._send, kwargs, tracker)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except Exception as e:
+                    error = e
+        raise error
+
+    def create_chat_completion(self, **kwargs):
+        """
+        Drop-in for client.chat.completions.create with rate limiting, retries and optional hedging
+        """
+        model = kwargs.get('model')
+        estimated_tokens = estimate_message_tokens(kwargs.get('messages', [])) + (kwargs.get('max_tokens') or 0)
+        limiter = self._limiter(model)
+        tracker = self._latency(model, kwargs.get('max_tokens'))
+        hedge = self._hedge_executor is not None and not kwargs.get('stream')
+
+        attempt = 0
+        while True:
+            limiter.acquire(estimated_tokens)
+            try:
+                if hedge:
+                    return self._send_hedged(kwargs, tracker, limiter, estimated_tokens)
+                return self._send(kwargs, tracker)
+            except RETRYABLE_ERRORS as e:
+                # An exhausted quota will not recover by waiting
+                if getattr(e, 'code', None) == 'insufficient_quota' or attempt >= self.max_retries:
+                    if isinstance(e, openai.RateLimitError):
+                        raise OpenAIBusyError(f"OpenAI rate limit reached, please try again shortly: {str(e)}")
+                    raise
+                delay = self._retry_delay(attempt, e)
+                attempt += 1
+                print(f"OpenAI call to {model} failed ({type(e).__name__}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+
+_clients: Dict[str, SharedOpenAIClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_openai_client(api_key: str = None) -> SharedOpenAIClient:
+    """Return the shared client for an API key, creating it on first use"""
+    api_key = api_key or os.environ.get('OPENAI_API_KEY')
+    if not api_key:
+        raise Exception("OPENAI_API_KEY environment variable not set")
+
+    client = _clients.get(api_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(api_key)
+            if client is None:
+                client = SharedOpenAIClient(api_key)
+                _clients[api_key] = client
+    return client
@@ -0,0 +1,142 @@
+import gzip
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Project root traces directory used when PROMPT_TRACE_DIR is not set
+DEFAULT_TRACE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "traces"
+)
+
+
+class PromptTraceSink:
+    """
+    Opt-in store of the prompts and responses sent to the model, for debugging.
+
+    A fraction sample_rate of analysis requests is traced (0 disables tracing). Records are
+    queued and written by a background thread as one gzip-compressed JSON file per call, so
+    the request path never touches the disk; when the queue is full records are dropped.
+    Only the newest max_files trace files are kept.
+    """
+
+    def __init__(self, directory: str, sample_rate: float = 0.0, max_files: int = 200, queue_size: int = 100):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self.dropped = 0
+        self._sequence = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def new_trace_id(self) -> Optional[str]:
+        """Decide whether to trace a request; returns its trace id, or None when it is not sampled"""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        return uuid.uuid4().hex[:12]
+
+    def record(self, trace_id: str, label: str, messages: List[Dict[str, str]], response_text: Optional[str],
+               metadata: Dict[str, Any] = None):
+        """Queue one model call for writing; never blocks the caller"""
+        if trace_id is None:
+            return
+
+        entry = {
+            'trace_id': trace_id,
+            'label': label,
+            'recorded_at': datetime.utcnow().isoformat() + 'Z',
+            'sizes': {
+                'messages': len(messages),
+                'prompt_chars': sum(len(message['content']) for message in messages),
+                'message_chars': [len(message['content']) for message in messages],
+                'response_chars': len(response_text or '')
+            },
+            'metadata': metadata or {},
+            'messages': messages,
+            'response': response_text
+        }
+
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            print(f"Prompt trace queue full, dropped trace {trace_id}/{label}")
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='prompt-trace-writer', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            try:
+                self._write(entry)
+            except Exception as e:
+                print(f"Warning: Could not write prompt trace: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, entry: Dict[str, Any]):
+        os.makedirs(self.directory, exist_ok=True)
+        label = re.sub(r'[^A-Za-z0-9_-]+', '_', entry['label'])
+        # Timestamp plus a sequence number, so name order is write order for rotation
+        self._sequence += 1
+        file_name = f"{time.strftime('%Y%m%d-%H%M%S')}-{self._sequence:06d}-{entry['trace_id']}-{label}.json.gz"
+        path = os.path.join(self.directory, file_name)
+
+        # Write to a temporary name first so a reader never sees a partial file
+        with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+        self._rotate()
+
+    def _rotate(self):
+        """Delete the oldest trace files beyond max_files"""
+        files = sorted(name for name in os.listdir(self.directory) if name.endswith('.json.gz'))
+        for name in files[:max(0, len(files) - self.max_files)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def flush(self, timeout: float = 5.0):
+        """Wait for queued traces to be written (used by scripts before exiting)"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+
+_sink: Optional[PromptTraceSink] = None
+_sink_lock = threading.Lock()
+
+
+def get_prompt_trace_sink() -> PromptTraceSink:
+    """Return the per-process trace sink configured from the environment"""
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = PromptTraceSink(
+                    directory=os.environ.get('PROMPT_TRACE_DIR') or DEFAULT_TRACE_DIR,
+                    sample_rate=float(os.environ.get('PROMPT_TRACE_SAMPLE_RATE', 0)),
+                    max_files=int(os.environ.get('PROMPT_TRACE_MAX_FILES', 200))
+                )
+    return _sink
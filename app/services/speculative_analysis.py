@@ -0,0 +1,138 @@
+import os
+import threading
+from typing import Dict, Optional
+
+
+class SpeculativeAnalysisScheduler:
+    """
+    Starts the AI analysis of an RFP in the background shortly after documents are uploaded,
+    so the result is cached (or nearly finished) by the time the user asks for it.
+
+    Uploads are debounced per RFP: every upload restarts the RFP's timer, so a multi-file upload
+    triggers a single analysis once delay seconds pass without another upload. The analysis runs
+    through the normal pipeline, including the single-flight lock and the analysis cache.
+
+    Timers live in each worker process, so uploads of one RFP served by different workers start a
+    timer in each. To merge them anyway, a timer remembers the RFP's newest document id when it is
+    started and stands down if a later document has been uploaded since: that upload's own timer,
+    in whichever worker served it, runs the analysis instead.
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._timers: Dict[int, threading.Timer] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.delay > 0
+
+    def schedule(self, rfp_id: int):
+        """(Re)start the debounce timer for an RFP"""
+        if not self.enabled:
+            return
+        latest_document = latest_document_id(rfp_id)
+        with self._lock:
+            existing = self._timers.get(rfp_id)
+            if existing is not None:
+                existing.cancel()
+            timer = threading.Timer(self.delay, self._fire, args=(rfp_id, latest_document))
+            timer.daemon = True
+            self._timers[rfp_id] = timer
+            timer.start()
+        print(f"Speculative analysis of RFP {rfp_id} scheduled in {self.delay:g}s")
+
+    def cancel(self, rfp_id: int):
+        """Drop a pending analysis, e.g. when the RFP is deleted"""
+        with self._lock:
+            timer = self._timers.pop(rfp_id, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _fire(self, rfp_id: int, latest_document: Optional[int]):
+        with self._lock:
+            if self._timers.get(rfp_id) is threading.current_thread():
+                del self._timers[rfp_id]
+        try:
+            current = latest_document_id(rfp_id)
+            if latest_document is not None and current is not None and current > latest_document:
+                print(f"Speculative analysis of RFP {rfp_id} left to the timer of its later upload")
+                return
+            run_speculative_analysis(rfp_id)
+        except Exception as e:
+            print(f"Speculative analysis of RFP {rfp_id} failed: {e}")
+
+
+def latest_document_id(rfp_id: int) -> Optional[int]:
+    """Id of the RFP's most recently uploaded document, or None (also when the database cannot be reached)"""
+    from app.services.database import get_database_connection
+
+    try:
+        conn = get_database_connection()
+    except Exception as e:
+        print(f"Could not look up the latest document of RFP {rfp_id}: {e}")
+        return None
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT max(id) FROM documents WHERE rfp_id = %s", (rfp_id,))
+        return cursor.fetchone()[0]
+    except Exception as e:
+        print(f"Could not look up the latest document of RFP {rfp_id}: {e}")
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def run_speculative_analysis(rfp_id: int):
+    """
+    Analyse an RFP the same way /api/ai-analyze does and store the result. Nothing is done when
+    the current documents already have a cached analysis; when another request is analysing the
+    RFP this waits for it and only runs if its result does not cover the current documents.
+    """
+    from app.services.analysis_pipeline import (
+        AnalysisRequestError, prepare_analysis, finalize_analysis, begin_analysis, should_wait_for_leader, wait_for_leader
+    )
+
+    try:
+        job = prepare_analysis(rfp_id)
+    except AnalysisRequestError as e:
+        print(f"Skipping speculative analysis of RFP {rfp_id}: {e}")
+        return
+
+    if job['cached']:
+        print(f"Speculative analysis of RFP {rfp_id} not needed, the current documents are already analysed")
+        return
+
+    lock = begin_analysis(job)
+    try:
+        if should_wait_for_leader(lock):
+            wait_for_leader(job, lock)
+            if job['cached']:
+                return
+
+        print(f"Running speculative analysis of RFP {rfp_id}")
+        analysis = job['kb_service'].run_analysis(job['rfp_text'], job['rfp_metadata'], mode=job['mode'],
+                                                  documents=job['analysis_documents'])
+        result = finalize_analysis(job, analysis)
+        print(f"Speculative analysis of RFP {rfp_id} stored, timings: {result['timings_ms']}")
+    finally:
+        lock.release()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_speculative_scheduler() -> SpeculativeAnalysisScheduler:
+    """Return the per-process scheduler configured from ANALYSIS_SPECULATIVE_DELAY (0 disables it)"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = SpeculativeAnalysisScheduler(float(os.environ.get('ANALYSIS_SPECULATIVE_DELAY', 0)))
+    return _scheduler
+
+
+def schedule_speculative_analysis(rfp_id: int):
+    get_speculative_scheduler().schedule(rfp_id)
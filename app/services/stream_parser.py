@@ -0,0 +1,100 @@
+import json
+from typing import Any, List, Tuple
+
+
+class IncrementalSectionParser:
+    """
+    Incremental scanner for a JSON object that arrives in pieces, such as a streamed
+    completion. Every time a value nested under an object key finishes, feed() reports
+    it as (key_path, parsed_value), e.g. (('analysis', 'fit_assessment'), "High ...").
+    Text before the first opening brace (such as a ```json fence) is ignored.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._started = False
+        # Each frame is [container_type, start_offset, current_key, expecting_key]
+        self._stack = []
+        self._in_string = False
+        self._escaped = False
+        self._token_start = None
+        self._primitive_start = None
+
+    def _current_path(self) -> Tuple[str, ...]:
+        return tuple(frame[2] for frame in self._stack if frame[0] == 'object' and frame[2] is not None)
+
+    def _complete_value(self, raw: str, results: List[Tuple[Tuple[str, ...], Any]]):
+        if not self._stack or self._stack[-1][0] != 'object':
+            return
+        path = self._current_path()
+        try:
+            results.append((path, json.loads(raw)))
+        except ValueError:
+            pass
+
+    def _finish_primitive(self, end: int, results: List[Tuple[Tuple[str, ...], Any]]):
+        if self._primitive_start is not None:
+            self._complete_value(self._text[self._primitive_start:end].strip(), results)
+            self._primitive_start = None
+
+    def feed(self, chunk: str) -> List[Tuple[Tuple[str, ...], Any]]:
+        """Consume the next piece of text and return the values completed by it"""
+        results = []
+        self._text += chunk
+        text = self._text
+
+        while self._pos < len(text):
+            i = self._pos
+            char = text[i]
+            self._pos += 1
+
+            if not self._started:
+                if char == '{':
+                    self._started = True
+                    self._stack.append(['object', i, None, True])
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    raw = text[self._token_start:i + 1]
+                    frame = self._stack[-1] if self._stack else None
+                    if frame and frame[0] == 'object' and frame[3]:
+                        try:
+                            frame[2] = json.loads(raw)
+                        except ValueError:
+                            frame[2] = None
+                        frame[3] = False
+                    else:
+                        self._complete_value(raw, results)
+                continue
+
+            if not self._stack:
+                # Top-level object already closed; ignore trailing text
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._token_start = i
+            elif char in '{[':
+                self._stack.append(['object' if char == '{' else 'array', i, None, char == '{'])
+            elif char in '}]':
+                self._finish_primitive(i, results)
+                frame = self._stack.pop()
+                if self._stack:
+                    self._complete_value(text[frame[1]:i + 1], results)
+            elif char == ',':
+                self._finish_primitive(i, results)
+                if self._stack[-1][0] == 'object':
+                    self._stack[-1][3] = True
+            elif char == ':':
+                continue
+            elif not char.isspace() and self._primitive_start is None:
+                self._primitive_start = i
+
+        return results
@@ -0,0 +1,87 @@
+import hashlib
+import re
+from typing import Any, Dict, List, Tuple
+
+# A line is boilerplate when it appears at the top or bottom of at least this share of the pages
+# (and on at least BOILERPLATE_MIN_PAGES pages)
+BOILERPLATE_PAGE_RATIO = 0.5
+BOILERPLATE_MIN_PAGES = 3
+
+# Non-blank lines at each end of a page that are checked for repeats; headers, footers, page
+# numbers and disclaimers sit there, while repeats in the body (table cells etc.) are content
+EDGE_LINES = 4
+
+_DIGITS = re.compile(r"\d+")
+_PAGE_NUMBER = re.compile(r"^[-–—\s]*(page|p\.|pg\.?)?\s*#\s*((of|/)\s*#)?[-–—\s]*$")
+_SPACES = re.compile(r"[ \t\f\v ]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def _line_key(line: str) -> bytes:
+    """
+    Hash of a line with whitespace collapsed. Numbers are masked in page number lines only, so
+    'Page 3 of 40' matches 'Page 4 of 40' but 'Section 3' does not match 'Section 4'.
+    """
+    normalized = _SPACES.sub(' ', line).strip().lower()
+    masked = _DIGITS.sub('#', normalized)
+    if _PAGE_NUMBER.match(masked):
+        normalized = masked
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).digest()
+
+
+def _edge_indexes(lines: List[str]) -> List[int]:
+    non_blank = [i for i, line in enumerate(lines) if line.strip()]
+    return sorted(set(non_blank[:EDGE_LINES] + non_blank[-EDGE_LINES:]))
+
+
+def collapse_whitespace(text: str) -> str:
+    """Collapse runs of spaces and tabs, drop trailing spaces and keep at most one blank line in a row"""
+    lines = [_SPACES.sub(' ', line).rstrip() for line in text.split('\n')]
+    return _BLANK_LINES.sub('\n\n', '\n'.join(lines))
+
+
+def normalize_pages(pages: List[str], strip_repeated: bool = True) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Remove headers, footers, page numbers and disclaimers repeated across the pages of a document
+    and collapse whitespace. Each page's lines are hashed and counted by the number of pages they
+    open or close; lines above the threshold are dropped from every page but the first one they
+    appear on, so their text still reaches the analysis once. Returns the pages and the saving.
+    """
+    page_lines = [page.split('\n') for page in pages]
+    edges = [_edge_indexes(lines) for lines in page_lines]
+
+    repeated = set()
+    threshold = max(BOILERPLATE_MIN_PAGES, BOILERPLATE_PAGE_RATIO * len(pages))
+    if strip_repeated and len(pages) >= BOILERPLATE_MIN_PAGES:
+        page_counts = {}
+        for lines, indexes in zip(page_lines, edges):
+            for key in {_line_key(lines[i]) for i in indexes}:
+                page_counts[key] = page_counts.get(key, 0) + 1
+        repeated = {key for key, count in page_counts.items() if count >= threshold}
+
+    seen = set()
+    lines_removed = 0
+    normalized = []
+    for lines, indexes in zip(page_lines, edges):
+        drop = set()
+        for i in indexes:
+            key = _line_key(lines[i])
+            if key in repeated:
+                if key in seen:
+                    drop.add(i)
+                else:
+                    seen.add(key)
+        lines_removed += len(drop)
+        page = '\n'.join(line for i, line in enumerate(lines) if i not in drop)
+        normalized.append(collapse_whitespace(page))
+
+    bytes_before = sum(len(page.encode('utf-8')) for page in pages)
+    bytes_after = sum(len(page.encode('utf-8')) for page in normalized)
+    stats = {
+        'repeated_lines': len(repeated),
+        'lines_removed': lines_removed,
+        'bytes_before': bytes_before,
+        'bytes_after': bytes_after,
+        'bytes_saved': bytes_before - bytes_after
+    }
+    return normalized, stats
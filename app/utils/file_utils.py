@@ -1,12 +1,8 @@
 def extract_text_from_pdf(file_path):
     """Extract text from PDF file"""
     try:
-        import PyPDF2
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text()
+        from app.services.document_extraction import get_document_extractor
+        text, _ = get_document_extractor().extract_file(file_path, '.pdf')
         return text
     except Exception as e:
         print(f"Error extracting text from PDF: {e}")
@@ -15,11 +11,8 @@ def extract_text_from_pdf(file_path):
 def extract_text_from_docx(file_path):
     """Extract text from DOCX file"""
     try:
-        from docx import Document
-        doc = Document(file_path)
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
+        from app.services.document_extraction import get_document_extractor
+        text, _ = get_document_extractor().extract_file(file_path, '.docx')
         return text
     except Exception as e:
         print(f"Error extracting text from DOCX: {e}")
@@ -75,15 +75,73 @@ CREATE TABLE IF NOT EXISTS rfp_metadata (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Create the document_contents table (extracted text stored once per uploaded file, keyed by a SHA-256 of its bytes)
+-- With text_storage 'blob' the text is kept in zstd-compressed files outside the database (DOCUMENT_TEXT_STORAGE)
+CREATE TABLE IF NOT EXISTS document_contents (
+    content_hash CHAR(64) PRIMARY KEY,
+    document_text TEXT,
+    simhash BIGINT,
+    text_length INTEGER,
+    page_count INTEGER,
+    estimated_tokens INTEGER,
+    normalization_bytes_saved INTEGER DEFAULT 0,
+    text_storage VARCHAR(16) DEFAULT 'database',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create the document_pages table (extracted text page by page, with precomputed sizes and search vectors)
+-- Pages of blob-stored contents have no page_text, only the offset and length of their compressed frame
+CREATE TABLE IF NOT EXISTS document_pages (
+    content_hash CHAR(64) NOT NULL REFERENCES document_contents(content_hash) ON DELETE CASCADE,
+    page_number INTEGER NOT NULL,
+    page_text TEXT,
+    char_count INTEGER NOT NULL,
+    estimated_tokens INTEGER NOT NULL,
+    blob_offset BIGINT,
+    blob_length INTEGER,
+    search_vector tsvector,
+    PRIMARY KEY (content_hash, page_number)
+);
+
 -- Create the documents table (child table for RFP documents)
+-- Uploads reference their text in document_contents; document_text is only set on older rows
 CREATE TABLE IF NOT EXISTS documents (
     id SERIAL PRIMARY KEY,
     rfp_id INTEGER NOT NULL REFERENCES rfp_metadata(id) ON DELETE CASCADE,
     document_name VARCHAR(255) NOT NULL,
     document_text TEXT,
+    content_hash CHAR(64) REFERENCES document_contents(content_hash),
+    duplicate_of INTEGER REFERENCES documents(id) ON DELETE SET NULL,
+    page_count INTEGER,
+    text_length INTEGER,
+    estimated_tokens INTEGER,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Create the document_summaries table (cached per-document summaries, keyed by document and content hash)
+CREATE TABLE IF NOT EXISTS document_summaries (
+    document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    content_hash CHAR(64) NOT NULL,
+    summary TEXT NOT NULL,
+    model VARCHAR(100),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (document_id, content_hash)
+);
+
+-- Create the analysis_cache table (AI analysis results keyed by a hash of documents, knowledge base, model and prompt)
+CREATE TABLE IF NOT EXISTS analysis_cache (
+    cache_key CHAR(64) PRIMARY KEY,
+    rfp_id INTEGER REFERENCES rfp_metadata(id) ON DELETE SET NULL,
+    model VARCHAR(100),
+    prompt_version VARCHAR(100),
+    knowledge_base_version CHAR(64),
+    analysis JSONB NOT NULL,
+    member_matching JSONB,
+    hit_count INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Create the scraped_tenders table for storing tender scraping results
 CREATE TABLE IF NOT EXISTS scraped_tenders (
     id SERIAL PRIMARY KEY,
@@ -108,6 +166,9 @@ CREATE INDEX IF NOT EXISTS idx_rfp_metadata_country ON rfp_metadata(country);
 CREATE INDEX IF NOT EXISTS idx_rfp_metadata_due_date ON rfp_metadata(due_date);
 CREATE INDEX IF NOT EXISTS idx_documents_rfp_id ON documents(rfp_id);
 CREATE INDEX IF NOT EXISTS idx_documents_document_name ON documents(document_name);
+CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents(content_hash);
+CREATE INDEX IF NOT EXISTS idx_analysis_cache_rfp_id ON analysis_cache(rfp_id);
+CREATE INDEX IF NOT EXISTS idx_analysis_cache_last_used_at ON analysis_cache(last_used_at);
 
 -- Create indexes for scraped_tenders table
 CREATE INDEX IF NOT EXISTS idx_scraped_tenders_title ON scraped_tenders(title);
@@ -118,6 +179,7 @@ CREATE INDEX IF NOT EXISTS idx_scraped_tenders_processed ON scraped_tenders(proc
 
 -- Add a full-text search index for document content
 CREATE INDEX IF NOT EXISTS idx_documents_text_search ON documents USING gin(to_tsvector('english', document_text));
+CREATE INDEX IF NOT EXISTS idx_document_pages_search ON document_pages USING gin(search_vector);
 
 -- Add a full-text search index for scraped tenders
 CREATE INDEX IF NOT EXISTS idx_scraped_tenders_text_search ON scraped_tenders USING gin(to_tsvector('english', title || ' ' || COALESCE(description, '')));
@@ -0,0 +1,23 @@
+-- Stop matching empty and very short document texts as near-duplicates
+-- Run this script to update your existing database
+
+-- Texts with fewer than 50 word shingles no longer get a SimHash, so they only match by file hash.
+-- Empty texts (scanned PDFs) all had the SimHash 0; short texts stored in the database are found
+-- by their word count. Short texts kept in the blob store keep their SimHash.
+UPDATE document_contents SET simhash = NULL
+WHERE simhash = 0
+   OR (document_text IS NOT NULL
+       AND coalesce(array_length(regexp_split_to_array(trim(document_text), '\W+'), 1), 0) < 52);
+
+-- Restore documents that were marked as near-duplicates through one of those texts; copies of the
+-- same file (same content hash) stay marked
+UPDATE documents d SET duplicate_of = NULL
+FROM documents o, document_contents dc, document_contents oc
+WHERE d.duplicate_of = o.id
+  AND dc.content_hash = d.content_hash
+  AND oc.content_hash = o.content_hash
+  AND d.content_hash <> o.content_hash
+  AND (dc.simhash IS NULL OR oc.simhash IS NULL);
+
+-- Verify the changes
+SELECT count(*) AS contents_without_simhash FROM document_contents WHERE simhash IS NULL;
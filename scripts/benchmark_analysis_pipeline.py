@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the AI analysis and member matching endpoints.
+
+Seeds synthetic RFPs and documents into the configured database, drives
+/api/ai-analyze/<id> and /api/rfp/<id>/find-members through the Flask test client,
+and reports latency percentiles plus the per-stage breakdown (database, prompt build,
+LLM, parse, member matching) returned by the endpoints. The seeded RFPs are deleted
+afterwards unless --keep is given.
+
+The benchmark writes to a database, so it must be given one: --database-url for a scratch
+database (never the app's configured DATABASE_URL), or --allow-writes for the local development
+database used when DATABASE_URL is not set.
+
+Run it offline against the local OpenAI stand-in:
+    python scripts/benchmark_analysis_pipeline.py --allow-writes --start-mock --rfps 5 --runs 3
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+# Add the app directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.dirname(__file__))
+
+SAMPLE_PARAGRAPHS = [
+    "The Ministry of Environment invites proposals for the development of a national climate adaptation "
+    "strategy, including a vulnerability assessment of key sectors and a prioritised investment plan.",
+    "The consultant will deliver a greenhouse gas inventory aligned with the GHG Protocol, a decarbonisation "
+    "roadmap with interim targets, and a stakeholder engagement report.",
+    "Proposals must be submitted by 2025-11-30. The estimated budget is 250000 USD over eighteen months. "
+    "Questions should be sent to procurement@example.org.",
+    "The team should include a climate risk specialist, an ESG reporting expert and a circular economy "
+    "advisor with experience in the agriculture and energy sectors.",
+    "Evaluation criteria: technical approach (40%), team qualifications (30%), past performance (20%) and "
+    "price (10%). Joint ventures and subcontracting arrangements are permitted.",
+]
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def synthetic_document(index, target_chars):
+    """Repeat the sample paragraphs, numbered so every document is distinct, up to target_chars"""
+    paragraphs = []
+    length = 0
+    n = 0
+    while length < target_chars:
+        paragraph = f"{index}.{n} {SAMPLE_PARAGRAPHS[n % len(SAMPLE_PARAGRAPHS)]}"
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+        n += 1
+    return "\n\n".join(paragraphs)
+
+
+def seed_rfps(rfp_count, documents_per_rfp, document_chars):
+    """Insert benchmark RFPs with documents and return their ids"""
+    from app.services.database import get_database_connection
+
+    conn = get_database_connection()
+    cursor = conn.cursor()
+    rfp_ids = []
+    try:
+        for i in range(rfp_count):
+            cursor.execute("""
+                INSERT INTO rfp_metadata (project_name, organization_group, country)
+                VALUES (%s, %s, %s)
+                RETURNING id
+            """, (f"Benchmark RFP {i + 1}", "Benchmark", "Kenya"))
+            rfp_id = cursor.fetchone()[0]
+            rfp_ids.append(rfp_id)
+            for d in range(documents_per_rfp):
+                cursor.execute("""
+                    INSERT INTO documents (rfp_id, document_name, document_text)
+                    VALUES (%s, %s, %s)
+                """, (rfp_id, f"benchmark_{i + 1}_{d + 1}.pdf", synthetic_document(i * 100 + d, document_chars)))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    return rfp_ids
+
+
+def delete_rfps(rfp_ids):
+    from app.services.database import get_database_connection
+
+    conn = get_database_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM analysis_cache WHERE rfp_id = ANY(%s)", (rfp_ids,))
+        cursor.execute("DELETE FROM rfp_metadata WHERE id = ANY(%s)", (rfp_ids,))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def same_database(first_url, second_url):
+    """True when two database URLs point at the same database on the same server"""
+    def key(url):
+        parsed = urlparse(url.replace('postgres://', 'postgresql://', 1))
+        return (parsed.hostname or 'localhost').lower(), parsed.port or 5432, parsed.path.lstrip('/')
+    return key(first_url) == key(second_url)
+
+
+def timed_post(app, url, body=None):
+    """POST through a fresh test client and return (seconds, status, json)"""
+    with app.test_client() as client:
+        started = time.perf_counter()
+        response = client.post(url, json=body or {})
+        elapsed = time.perf_counter() - started
+    return elapsed, response.status_code, response.get_json(silent=True) or {}
+
+
+def report(name, results):
+    """Print latency percentiles and the mean of every stage timing for one endpoint"""
+    latencies = [r[0] for r in results if r[1] == 200]
+    errors = [r for r in results if r[1] != 200]
+    print(f"\n{name}: {len(results)} requests, {len(errors)} errors")
+    if errors:
+        print(f"  first error: HTTP {errors[0][1]} {errors[0][2].get('error', '')}")
+    if not latencies:
+        return
+
+    print(f"  latency  mean {sum(latencies) / len(latencies) * 1000:8.1f} ms   "
+          f"p50 {percentile(latencies, 0.5) * 1000:8.1f} ms   p95 {percentile(latencies, 0.95) * 1000:8.1f} ms")
+
+    stages = {}
+    for _, status, payload in results:
+        if status == 200:
+            for stage, ms in (payload.get('timings_ms') or {}).items():
+                stages.setdefault(stage, []).append(ms)
+    for stage, values in sorted(stages.items()):
+        print(f"  {stage:<16} mean {sum(values) / len(values):8.1f} ms   p95 {percentile(values, 0.95):8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the AI analysis and member matching pipeline')
+    parser.add_argument('--rfps', type=int, default=3, help='Number of RFPs to seed')
+    parser.add_argument('--documents', type=int, default=2, help='Documents per RFP')
+    parser.add_argument('--document-chars', type=int, default=20000, help='Characters per document')
+    parser.add_argument('--runs', type=int, default=2, help='Analyses per RFP')
+    parser.add_argument('--concurrency', type=int, default=1, help='Concurrent requests')
+    parser.add_argument('--mode', choices=['cascade', 'combined', 'parallel'], default=None, help='Analysis mode')
+    parser.add_argument('--use-cache', action='store_true', help='Allow analysis cache hits (default forces a refresh)')
+    parser.add_argument('--start-mock', action='store_true', help='Start the local OpenAI stand-in and point the app at it')
+    parser.add_argument('--mock-port', type=int, default=8765)
+    parser.add_argument('--mock-latency', type=float, default=0.5)
+    parser.add_argument('--mock-tokens-per-second', type=float, default=200.0)
+    parser.add_argument('--mock-error-rate', type=float, default=0.0)
+    parser.add_argument('--keep', action='store_true', help='Keep the seeded RFPs')
+    parser.add_argument('--database-url', help='Scratch database to seed and benchmark against')
+    parser.add_argument('--allow-writes', action='store_true',
+                        help='Seed the local development database (only when DATABASE_URL is not set)')
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    # Seed rows are inserted and deleted, so never run against the app's configured database
+    configured_url = os.environ.get('DATABASE_URL')
+    if args.database_url:
+        if configured_url and same_database(args.database_url, configured_url):
+            parser.error('--database-url is the database configured for the app (DATABASE_URL); use a scratch database')
+        os.environ['DATABASE_URL'] = args.database_url
+    elif args.allow_writes:
+        if configured_url:
+            parser.error('DATABASE_URL is set, so --allow-writes would write to the app database; '
+                         'pass a scratch database with --database-url instead')
+    else:
+        parser.error('the benchmark writes to the database: pass --database-url for a scratch database, '
+                     'or --allow-writes to use the local development database')
+
+    if args.start_mock:
+        from mock_openai_server import start_mock_server, MockSettings
+        start_mock_server(port=args.mock_port, settings=MockSettings(
+            latency=args.mock_latency,
+            tokens_per_second=args.mock_tokens_per_second,
+            error_rate=args.mock_error_rate
+        ))
+        os.environ['OPENAI_BASE_URL'] = f"http://127.0.0.1:{args.mock_port}/v1"
+        os.environ.setdefault('OPENAI_API_KEY', 'mock')
+        print(f"Using mock OpenAI server at {os.environ['OPENAI_BASE_URL']}")
+
+    from app import create_app
+    app = create_app()
+    app.config['LOGIN_DISABLED'] = True
+
+    print(f"Seeding {args.rfps} RFPs with {args.documents} documents of {args.document_chars} characters")
+    rfp_ids = seed_rfps(args.rfps, args.documents, args.document_chars)
+
+    try:
+        body = {'force_refresh': not args.use_cache}
+        if args.mode:
+            body['mode'] = args.mode
+
+        jobs = [rfp_id for _ in range(args.runs) for rfp_id in rfp_ids]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            analyze_results = list(executor.map(
+                lambda rfp_id: timed_post(app, f'/api/ai-analyze/{rfp_id}', body), jobs))
+            members_results = list(executor.map(
+                lambda rfp_id: timed_post(app, f'/api/rfp/{rfp_id}/find-members'), jobs))
+        wall = time.perf_counter() - started
+
+        print(f"\nCompleted {len(jobs) * 2} requests in {wall:.1f}s with concurrency {args.concurrency}")
+        report('/api/ai-analyze/<id>', analyze_results)
+        report('/api/rfp/<id>/find-members', members_results)
+
+        usage = [r[2].get('usage') for r in analyze_results if r[1] == 200 and r[2].get('usage')]
+        if usage:
+            print(f"\nTokens per analysis: {sum(u['prompt_tokens'] for u in usage) / len(usage):.0f} prompt "
+                  f"({sum(u['cached_prompt_tokens'] for u in usage) / len(usage):.0f} cached), "
+                  f"{sum(u['completion_tokens'] for u in usage) / len(usage):.0f} completion")
+
+    finally:
+        if args.keep:
+            print(f"\nKept benchmark RFPs: {rfp_ids}")
+        else:
+            delete_rfps(rfp_ids)
+            print(f"\nDeleted {len(rfp_ids)} benchmark RFPs")
+
+
+if __name__ == '__main__':
+    main()
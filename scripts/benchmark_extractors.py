@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Compare the document text extraction engines over a local corpus of sample RFP files.
+
+Every installed PDF engine (and python-docx / the legacy .doc converter for Word files) is run
+on every file in a fresh process, reporting extraction time, pages per second, peak memory and
+text yield. Yield is reported as characters and words, and as agreement: the share of the words
+found by at least two engines that this engine also found, which flags engines that drop or
+garble text.
+
+    python scripts/benchmark_extractors.py sample_documents/ --runs 3
+
+Use the results to choose PDF_EXTRACTION_ENGINE, or the automatic preference order in
+app/services/extraction_engines.py.
+"""
+
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Add the app directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+WORD_PATTERN = re.compile(r"[A-Za-z0-9]{2,}")
+
+
+def measure(path, engine_name):
+    """Run one engine on one file in this (fresh) process and return its measurements"""
+    import resource
+    from app.services.extraction_engines import PDF_ENGINES, extract_docx_text, extract_legacy_doc_text
+
+    extension = os.path.splitext(path)[1].lower()
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    pages = None
+    if extension == '.pdf':
+        engine = PDF_ENGINES[engine_name]()
+        engine.open(path)
+        try:
+            pages = engine.page_count()
+            text = "".join(engine.page_text(number) + "\n" for number in range(pages))
+        finally:
+            engine.close()
+    elif extension == '.doc':
+        text = extract_legacy_doc_text(path)
+    else:
+        text = extract_docx_text(path)
+    seconds = time.perf_counter() - started
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {
+        'seconds': seconds,
+        'pages': pages,
+        'peak_memory_mb': max(0, peak_kb - baseline_kb) / 1024,
+        'characters': len(text),
+        'words': WORD_PATTERN.findall(text.lower())
+    }
+
+
+def engines_for(path, pdf_engines):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.pdf':
+        return pdf_engines
+    if extension == '.doc':
+        return ['legacy-doc']
+    return ['python-docx']
+
+
+def corpus_files(directory):
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            if name.lower().endswith(('.pdf', '.doc', '.docx')):
+                files.append(os.path.join(root, name))
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the document text extraction engines')
+    parser.add_argument('corpus', nargs='?', default='sample_documents', help='Directory of sample PDF/DOC/DOCX files')
+    parser.add_argument('--engines', nargs='*', default=None, help='PDF engines to compare (default: all installed)')
+    parser.add_argument('--runs', type=int, default=1, help='Timed runs per file and engine (the fastest is kept)')
+    args = parser.parse_args()
+
+    from app.services.extraction_engines import available_pdf_engines
+
+    pdf_engines = args.engines or available_pdf_engines()
+    files = corpus_files(args.corpus)
+    if not files:
+        print(f"No PDF, DOC or DOCX files found in {args.corpus}")
+        return
+    print(f"Benchmarking {len(files)} files with PDF engines: {', '.join(pdf_engines)}")
+
+    # One process per measurement, so imports, caches and memory peaks do not carry over
+    context = multiprocessing.get_context('spawn')
+    totals = {}
+    for path in files:
+        results = {}
+        for engine_name in engines_for(path, pdf_engines):
+            best = None
+            for _ in range(args.runs):
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    try:
+                        result = executor.submit(measure, path, engine_name).result()
+                    except Exception as e:
+                        result = {'error': str(e)}
+                if 'error' in result or best is None or result['seconds'] < best['seconds']:
+                    best = result
+                if 'error' in result:
+                    break
+            results[engine_name] = best
+
+        # Words found by at least two engines are taken as the reference text of the file
+        word_sets = {name: set(result['words']) for name, result in results.items() if 'error' not in result}
+        if len(word_sets) > 1:
+            counts = {}
+            for words in word_sets.values():
+                for word in words:
+                    counts[word] = counts.get(word, 0) + 1
+            consensus = {word for word, count in counts.items() if count >= 2}
+        else:
+            consensus = next(iter(word_sets.values()), set())
+
+        print(f"\n{os.path.relpath(path, args.corpus)} ({os.path.getsize(path) / 1024:.0f} KB)")
+        for engine_name, result in results.items():
+            if 'error' in result:
+                print(f"  {engine_name:<12} error: {result['error']}")
+                continue
+            agreement = len(word_sets[engine_name] & consensus) / len(consensus) if consensus else 1.0
+            pages_per_second = result['pages'] / result['seconds'] if result['pages'] and result['seconds'] > 0 else None
+            print(f"  {engine_name:<12} {result['seconds'] * 1000:9.1f} ms"
+                  f"{f'  {pages_per_second:8.1f} pages/s' if pages_per_second else ' ' * 18}"
+                  f"  {result['peak_memory_mb']:7.1f} MB  {result['characters']:9d} chars"
+                  f"  {len(result['words']):8d} words  {agreement:6.1%} agreement")
+
+            total = totals.setdefault(engine_name, {'seconds': 0.0, 'pages': 0, 'agreement': [], 'memory': 0.0})
+            total['seconds'] += result['seconds']
+            total['pages'] += result['pages'] or 0
+            total['agreement'].append(agreement)
+            total['memory'] = max(total['memory'], result['peak_memory_mb'])
+
+    print("\nTotals")
+    for engine_name, total in totals.items():
+        pages_per_second = total['pages'] / total['seconds'] if total['pages'] and total['seconds'] > 0 else None
+        print(f"  {engine_name:<12} {total['seconds']:8.2f} s"
+              f"{f'  {pages_per_second:8.1f} pages/s' if pages_per_second else ' ' * 18}"
+              f"  peak {total['memory']:7.1f} MB"
+              f"  mean agreement {sum(total['agreement']) / len(total['agreement']):6.1%}")
+
+
+if __name__ == '__main__':
+    main()
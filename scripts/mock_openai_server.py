@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI chat completions endpoint, for benchmarking and testing the
+analysis and member matching pipeline without live API calls.
+
+Point the app at it with:
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=mock python run.py
+
+Responses follow the structure each prompt asks for (the JSON schema after "exact structure:",
+keyword and member ranking arrays, plain text summaries). Latency, token throughput and error
+injection are configurable from the command line.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHARS_PER_TOKEN = 4
+
+FILLER = ("OnePointFive has delivered comparable climate strategy, decarbonisation and ESG reporting work "
+          "for clients in this sector, and the RFP requirements map closely onto that experience. ")
+
+
+class MockSettings:
+    def __init__(self, latency=0.5, tokens_per_second=200.0, completion_tokens=400, error_rate=0.0,
+                 error_status=429, seed=None):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.request_count = 0
+
+
+# Realistic values for metadata fields, so extracted metadata passes validation
+METADATA_VALUES = {
+    "organization_group": "Ministry of Environment",
+    "country": "Kenya",
+    "region": "East Africa",
+    "industry": "Energy Environmental",
+    "opf_gap_size": "Medium",
+    "posting_contact": "procurement@example.org",
+    "project_cost": 250000,
+    "currency": "USD",
+    "due_date": "2025-11-30"
+}
+
+
+def _filler_text(tokens):
+    """Roughly tokens worth of plausible analysis prose"""
+    target_chars = max(1, tokens) * CHARS_PER_TOKEN
+    return (FILLER * (target_chars // len(FILLER) + 1))[:target_chars].strip()
+
+
+def _fill_schema(structure, leaf_tokens):
+    """Replace every leaf instruction in a requested JSON structure with filler text"""
+    if isinstance(structure, dict):
+        return {
+            key: METADATA_VALUES[key] if key in METADATA_VALUES else _fill_schema(value, leaf_tokens)
+            for key, value in structure.items()
+        }
+    return _filler_text(leaf_tokens)
+
+
+def _count_leaves(structure):
+    if isinstance(structure, dict):
+        return sum(_count_leaves(value) for value in structure.values())
+    return 1
+
+
+def build_response_text(messages, completion_tokens):
+    """Produce content in the shape the prompt asks for"""
+    prompt = "\n".join(message.get('content') or '' for message in messages)
+
+    # Analysis prompts end with the schema after "exact structure:"
+    marker = prompt.rfind('exact structure:')
+    if marker != -1:
+        start = prompt.find('{', marker)
+        try:
+            structure, _ = json.JSONDecoder().raw_decode(prompt[start:])
+            leaf_tokens = completion_tokens // max(1, _count_leaves(structure))
+            return json.dumps(_fill_schema(structure, leaf_tokens))
+        except ValueError:
+            pass
+
+    if 'expertise keywords' in prompt:
+        return json.dumps(["carbon accounting", "ESG reporting", "climate risk", "renewable energy", "circular economy"])
+
+    if 'matching team members' in prompt:
+        return json.dumps([
+            {
+                "member_id": index,
+                "name": f"Mock Member {index}",
+                "relevance_score": 10 - index,
+                "explanation": "Matched by the mock server",
+                "key_skills": ["carbon accounting", "ESG reporting"]
+            }
+            for index in range(1, 9)
+        ])
+
+    return "- " + _filler_text(completion_tokens)
+
+
+def _usage(prompt_tokens, completion_tokens):
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": 0, "audio_tokens": 0}
+    }
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    settings = MockSettings()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        settings = self.settings
+
+        with settings.lock:
+            settings.request_count += 1
+            inject_error = settings.random.random() < settings.error_rate
+
+        if inject_error:
+            status = settings.error_status
+            error_type = 'rate_limit_exceeded' if status == 429 else 'server_error'
+            self._send_json(status, {"error": {"message": f"Injected {status} from mock server", "type": error_type, "code": error_type}},
+                            headers={'Retry-After': '1'} if status == 429 else None)
+            return
+
+        messages = request.get('messages', [])
+        max_tokens = request.get('max_tokens') or settings.completion_tokens
+        completion_tokens = min(settings.completion_tokens, max_tokens)
+        content = build_response_text(messages, completion_tokens)
+        prompt_tokens = sum(len(message.get('content') or '') for message in messages) // CHARS_PER_TOKEN
+        completion_tokens = len(content) // CHARS_PER_TOKEN
+
+        time.sleep(settings.latency)
+
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = request.get('model', 'mock')
+
+        if request.get('stream'):
+            self._stream(completion_id, created, model, content, prompt_tokens, completion_tokens,
+                         (request.get('stream_options') or {}).get('include_usage', False))
+            return
+
+        # Non-streaming responses arrive after the whole completion has been "generated"
+        if settings.tokens_per_second > 0:
+            time.sleep(completion_tokens / settings.tokens_per_second)
+
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": _usage(prompt_tokens, completion_tokens)
+        })
+
+    def _stream(self, completion_id, created, model, content, prompt_tokens, completion_tokens, include_usage):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        def send_chunk(payload):
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        def chunk(delta, finish_reason=None):
+            return {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+
+        # Emit about four tokens per chunk, paced to the configured throughput
+        piece_chars = 4 * CHARS_PER_TOKEN
+        delay = 4 / self.settings.tokens_per_second if self.settings.tokens_per_second > 0 else 0
+        send_chunk(chunk({"role": "assistant", "content": ""}))
+        for start in range(0, len(content), piece_chars):
+            send_chunk(chunk({"content": content[start:start + piece_chars]}))
+            if delay:
+                time.sleep(delay)
+        send_chunk(chunk({}, finish_reason="stop"))
+
+        if include_usage:
+            send_chunk({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [],
+                "usage": _usage(prompt_tokens, completion_tokens)
+            })
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def create_mock_server(host='127.0.0.1', port=8765, settings=None):
+    """Create a mock server bound to host:port with its own settings"""
+    handler = type('ConfiguredMockOpenAIHandler', (MockOpenAIHandler,), {'settings': settings or MockSettings()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_mock_server(host='127.0.0.1', port=8765, settings=None):
+    """Start the mock server on a background thread and return the server object"""
+    server = create_mock_server(host, port, settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local mock of the OpenAI chat completions API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.5, help='Seconds before the first token')
+    parser.add_argument('--tokens-per-second', type=float, default=200.0, help='Completion token throughput')
+    parser.add_argument('--completion-tokens', type=int, default=400, help='Completion tokens per response (capped by max_tokens)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with an error')
+    parser.add_argument('--error-status', type=int, default=429, help='HTTP status used for injected errors')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for error injection')
+    args = parser.parse_args()
+
+    settings = MockSettings(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed
+    )
+    server = create_mock_server(args.host, args.port, settings)
+
+    print(f"Mock OpenAI server listening on http://{args.host}:{args.port}/v1")
+    print(f"Set OPENAI_BASE_URL=http://{args.host}:{args.port}/v1 to use it")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping mock server")
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
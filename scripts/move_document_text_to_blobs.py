@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Move extracted document text stored in Postgres into the compressed blob store.
+
+Run after add_document_blob_storage.sql, with the same DOCUMENT_BLOB_DIR as the application and
+DOCUMENT_TEXT_STORAGE=blob set for it, so new uploads go to the blob store as well:
+
+    python scripts/move_document_text_to_blobs.py --batch 50
+
+Each content is written to its blob before its text is cleared in the database, one transaction
+per content, so the script can be stopped and re-run at any point. Run VACUUM FULL on
+document_contents and document_pages afterwards to return the space to the operating system.
+"""
+
+import argparse
+import os
+import sys
+
+# Add the app directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.database import get_database_connection
+
+
+def move_content(cursor, store, content_hash):
+    """Write one content's pages to the blob store and keep only their pointers in the database"""
+    cursor.execute("""
+        SELECT page_number, page_text FROM document_pages
+        WHERE content_hash = %s ORDER BY page_number
+        FOR UPDATE
+    """, (content_hash,))
+    pages = cursor.fetchall()
+    if not pages:
+        # Contents stored before pages existed: the whole text becomes one page
+        cursor.execute("SELECT document_text FROM document_contents WHERE content_hash = %s", (content_hash,))
+        pages = [(1, cursor.fetchone()[0] or '')]
+        cursor.execute("""
+            INSERT INTO document_pages (content_hash, page_number, page_text, char_count, estimated_tokens, search_vector)
+            VALUES (%s, 1, %s, %s, %s, to_tsvector('english', %s))
+        """, (content_hash, pages[0][1], len(pages[0][1]), (len(pages[0][1]) + 3) // 4, pages[0][1]))
+
+    pointers = store.write(content_hash, [page_text or '' for _, page_text in pages])
+    for (page_number, _), (blob_offset, blob_length) in zip(pages, pointers):
+        cursor.execute("""
+            UPDATE document_pages SET page_text = NULL, blob_offset = %s, blob_length = %s
+            WHERE content_hash = %s AND page_number = %s
+        """, (blob_offset, blob_length, content_hash, page_number))
+    cursor.execute("""
+        UPDATE document_contents SET document_text = NULL, text_storage = 'blob'
+        WHERE content_hash = %s
+    """, (content_hash,))
+    return sum(len(page_text or '') for _, page_text in pages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move stored document text into the compressed blob store')
+    parser.add_argument('--batch', type=int, default=50, help='Contents selected per query')
+    parser.add_argument('--limit', type=int, default=None, help='Stop after this many contents')
+    args = parser.parse_args()
+
+    from app.services.document_blobs import get_document_blob_store
+
+    store = get_document_blob_store()
+    print(f"Moving document text to {store.directory}")
+
+    conn = get_database_connection()
+    cursor = conn.cursor()
+    moved = 0
+    characters = 0
+    try:
+        while args.limit is None or moved < args.limit:
+            cursor.execute("""
+                SELECT content_hash FROM document_contents
+                WHERE COALESCE(text_storage, 'database') = 'database'
+                ORDER BY created_at
+                LIMIT %s
+            """, (args.batch,))
+            content_hashes = [row[0] for row in cursor.fetchall()]
+            if not content_hashes:
+                break
+            for content_hash in content_hashes:
+                characters += move_content(cursor, store, content_hash)
+                conn.commit()
+                moved += 1
+                if args.limit is not None and moved >= args.limit:
+                    break
+            print(f"Moved {moved} contents ({characters} characters)")
+    finally:
+        cursor.close()
+        conn.close()
+
+    print(f"Done: {moved} contents moved to the blob store")
+
+
+if __name__ == '__main__':
+    main()
@@ -66,6 +66,15 @@ class DatabaseSearchApp {
             });
         }
 
+        // Full-text search across RFP documents
+        const documentSearchForm = document.getElementById('documentSearchForm');
+        if (documentSearchForm) {
+            documentSearchForm.addEventListener('submit', (e) => {
+                e.preventDefault();
+                this.searchDocuments();
+            });
+        }
+
         // Document upload form submission
         const uploadDocumentBtn = document.getElementById('uploadDocumentBtn');
         if (uploadDocumentBtn) {
@@ -641,6 +650,64 @@ class DatabaseSearchApp {
         });
     }
 
+    async searchDocuments(offset = 0) {
+        const query = document.getElementById('documentSearchInput').value.trim();
+        if (!query) return;
+        
+        const rfpDetails = document.getElementById('rfpDetails');
+        if (offset === 0) {
+            rfpDetails.innerHTML = '<div class="p-4"><i class="fas fa-spinner fa-spin fa-2x text-muted"></i></div>';
+        }
+        
+        try {
+            const response = await fetch(`/api/documents/search?q=${encodeURIComponent(query)}&offset=${offset}`);
+            const data = await response.json();
+            if (!data.success) {
+                this.showError(data.error || 'Search failed');
+                return;
+            }
+            
+            let html = offset === 0
+                ? `<h5 class="mb-3">${data.total_rfps} RFP${data.total_rfps === 1 ? '' : 's'} mention "${this.escapeHtml(query)}" <small class="text-muted">(${data.search_ms} ms)</small></h5>`
+                : '';
+            data.rfps.forEach(rfp => {
+                const hits = rfp.hits.map(hit => `
+                    <div class="mt-2">
+                        <small class="text-muted"><i class="fas fa-file-alt me-1"></i>${this.escapeHtml(hit.document_name)}${hit.page ? `, page ${hit.page}` : ''}</small>
+                        <p class="mb-0" style="font-family: 'Azeret Mono', monospace; font-size: 0.85em; color: #666;">${hit.snippet_html}</p>
+                    </div>
+                `).join('');
+                html += `
+                    <div class="card mb-3">
+                        <div class="card-body">
+                            <h6 class="mb-1"><a href="#" onclick="event.preventDefault(); app.selectRfpById(${rfp.rfp_id})">${this.escapeHtml(rfp.project_name)}</a></h6>
+                            <small class="text-muted">${this.escapeHtml(rfp.organization_group)} • ${rfp.hit_count} matching page${rfp.hit_count === 1 ? '' : 's'}</small>
+                            ${hits}
+                        </div>
+                    </div>
+                `;
+            });
+            
+            if (offset === 0) {
+                rfpDetails.innerHTML = '<div id="documentSearchResults" class="text-start"></div>';
+            }
+            const results = document.getElementById('documentSearchResults');
+            document.getElementById('documentSearchMore')?.remove();
+            results.insertAdjacentHTML('beforeend', html);
+            if (data.next_offset !== null) {
+                results.insertAdjacentHTML('beforeend', `<button id="documentSearchMore" class="btn btn-outline-secondary btn-sm" onclick="app.searchDocuments(${data.next_offset})">More results</button>`);
+            }
+        } catch (error) {
+            console.error('Error searching documents:', error);
+            this.showError('An error occurred while searching the documents');
+        }
+    }
+
+    selectRfpById(rfpId) {
+        const rfp = (this.currentRfps || []).find(item => item.id === rfpId);
+        if (rfp) this.selectRfp(rfp);
+    }
+
     selectRfp(rfp, event = null) {
         // Remove active class from all items
         document.querySelectorAll('#rfpList .list-group-item').forEach(item => {
@@ -830,10 +897,9 @@ class DatabaseSearchApp {
             return;
         }
         
-        // Validate file size (10MB limit)
-        if (file.size > 10 * 1024 * 1024) {
-            this.showError('File size must be less than 10MB');
-            return;
+        // Several files or a ZIP archive go through the batch endpoint in one request
+        if (fileInput.files.length > 1 || file.name.toLowerCase().endsWith('.zip')) {
+            return this.uploadDocumentBatch(Array.from(fileInput.files));
         }
         
         // Validate file type
@@ -843,6 +909,11 @@ class DatabaseSearchApp {
             return;
         }
         
+        // Files over 10MB are sent in resumable chunks
+        if (file.size > 10 * 1024 * 1024) {
+            return this.uploadDocumentChunked(file);
+        }
+        
         // Show progress bar
         const progressBar = document.getElementById('uploadProgress');
         const progressBarInner = progressBar.querySelector('.progress-bar');
@@ -910,6 +981,141 @@ class DatabaseSearchApp {
         }
     }
 
+    async uploadDocumentChunked(file) {
+        const progressBar = document.getElementById('uploadProgress');
+        const progressBarInner = progressBar.querySelector('.progress-bar');
+        progressBar.style.display = 'block';
+        progressBarInner.style.width = '0%';
+        progressBarInner.textContent = 'Uploading...';
+        
+        const uploadBtn = document.getElementById('uploadDocumentBtn');
+        const originalText = uploadBtn.innerHTML;
+        uploadBtn.disabled = true;
+        uploadBtn.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Uploading...';
+        
+        try {
+            const startResponse = await fetch(`/api/document-upload/${this.uploadingRfpId}/chunked`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ document_name: file.name, size: file.size })
+            });
+            const upload = await startResponse.json();
+            if (!startResponse.ok) {
+                this.showError(upload.error || 'Failed to start the upload');
+                return;
+            }
+            
+            // Send the chunks in order; after a failed chunk ask the server where to resume
+            let offset = upload.received;
+            let failures = 0;
+            while (offset < file.size) {
+                const end = Math.min(offset + upload.chunk_size, file.size);
+                try {
+                    const response = await fetch(`/api/chunked-upload/${upload.upload_id}`, {
+                        method: 'PUT',
+                        headers: { 'Content-Range': `bytes ${offset}-${end - 1}/${file.size}` },
+                        body: file.slice(offset, end)
+                    });
+                    const result = await response.json();
+                    if (!response.ok && result.received === undefined) {
+                        throw new Error(result.error || 'Upload failed');
+                    }
+                    offset = result.received !== undefined ? result.received : end;
+                    if (response.ok) {
+                        failures = 0;
+                    } else if (++failures > 5) {
+                        throw new Error(result.error);
+                    }
+                } catch (error) {
+                    if (++failures > 5) throw error;
+                    console.warn(`Chunk upload failed, retrying (${failures}/5):`, error);
+                    await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+                    const status = await fetch(`/api/chunked-upload/${upload.upload_id}`).then(r => r.json()).catch(() => null);
+                    if (status && status.received !== undefined) offset = status.received;
+                }
+                const percent = Math.round(offset / file.size * 100);
+                progressBarInner.style.width = percent + '%';
+                progressBarInner.textContent = `${percent}%`;
+            }
+            
+            progressBarInner.textContent = 'Extracting text...';
+            const response = await fetch(`/api/chunked-upload/${upload.upload_id}/finalize`, { method: 'POST' });
+            const result = await response.json();
+            
+            if (result.success) {
+                progressBarInner.textContent = 'Complete!';
+                const uploadModal = bootstrap.Modal.getInstance(document.getElementById('uploadDocumentModal'));
+                uploadModal.hide();
+                this.showSuccess(`Document "${result.document.document_name}" uploaded successfully!`);
+                this.loadDocuments(this.uploadingRfpId);
+            } else {
+                this.showError(result.error || 'Failed to upload document');
+            }
+        } catch (error) {
+            console.error('Error uploading document:', error);
+            this.showError('An error occurred while uploading the document');
+        } finally {
+            uploadBtn.disabled = false;
+            uploadBtn.innerHTML = originalText;
+            setTimeout(() => {
+                progressBar.style.display = 'none';
+            }, 2000);
+        }
+    }
+
+    async uploadDocumentBatch(files) {
+        const progressBar = document.getElementById('uploadProgress');
+        const progressBarInner = progressBar.querySelector('.progress-bar');
+        progressBar.style.display = 'block';
+        progressBarInner.style.width = '100%';
+        progressBarInner.textContent = `Uploading ${files.length} file(s)...`;
+        
+        const uploadBtn = document.getElementById('uploadDocumentBtn');
+        const originalText = uploadBtn.innerHTML;
+        uploadBtn.disabled = true;
+        uploadBtn.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Uploading...';
+        
+        try {
+            const formData = new FormData();
+            files.forEach(file => formData.append('documents', file));
+            
+            const response = await fetch(`/api/document-upload-batch/${this.uploadingRfpId}`, {
+                method: 'POST',
+                body: formData
+            });
+            const result = await response.json();
+            
+            if (result.success) {
+                progressBarInner.textContent = 'Complete!';
+                const uploadModal = bootstrap.Modal.getInstance(document.getElementById('uploadDocumentModal'));
+                uploadModal.hide();
+                
+                let message = `${result.stored} document(s) uploaded`;
+                if (result.duplicates) message += `, ${result.duplicates} duplicate(s)`;
+                if (result.skipped.length) message += `, ${result.skipped.length} file(s) skipped`;
+                this.showSuccess(message);
+                
+                const failed = result.documents.filter(doc => doc.status === 'error');
+                if (failed.length) {
+                    this.showError(failed.map(doc => `${doc.document_name}: ${doc.error}`).join('\n'));
+                }
+                
+                this.loadDocuments(this.uploadingRfpId);
+            } else {
+                this.showError(result.error || 'Failed to upload documents');
+            }
+        } catch (error) {
+            console.error('Error uploading documents:', error);
+            this.showError('An error occurred while uploading the documents');
+        } finally {
+            uploadBtn.disabled = false;
+            uploadBtn.innerHTML = originalText;
+            setTimeout(() => {
+                progressBar.style.display = 'none';
+            }, 2000);
+        }
+    }
+
     async saveRfp() {
         const projectName = document.getElementById('projectName').value.trim();
         const projectLink = document.getElementById('projectLink').value.trim();
@@ -1123,13 +1329,14 @@ class DatabaseSearchApp {
                                 <div class="d-flex align-items-center mb-2">
                                     <span class="badge bg-secondary me-2">${fileExtension}</span>
                                     <h6 class="mb-0">${this.escapeHtml(doc.document_name)}</h6>
+                                    ${doc.duplicate_of ? '<span class="badge bg-warning text-dark ms-2" title="Duplicate of another document of this RFP, not included in the AI analysis">Duplicate</span>' : ''}
                                 </div>
                                 <small class="text-muted">
                                     <i class="fas fa-calendar me-1"></i>Uploaded ${uploadDate}
                                 </small>
                                 <div class="mt-2">
                                     <small class="text-muted">
-                                        <i class="fas fa-file-text me-1"></i>Text preview:
+                                        <i class="fas fa-file-text me-1"></i>Text preview (${doc.page_count ? `${doc.page_count.toLocaleString()} pages, ` : ''}${(doc.text_length || 0).toLocaleString()} characters, ~${(doc.estimated_tokens || 0).toLocaleString()} tokens):
                                     </small>
                                     <p class="mt-1 mb-0" style="font-family: 'Azeret Mono', monospace; font-size: 0.85em; color: #666;">
                                         ${this.escapeHtml(doc.text_preview)}
@@ -1235,7 +1442,7 @@ class DatabaseSearchApp {
         }
     }
 
-    generateAiAnalysis() {
+    generateAiAnalysis(forceRefresh = false) {
         // Check if there are documents for the current RFP
         if (!this.selectedRfp) {
             alert('Please select an RFP first.');
@@ -1248,79 +1455,160 @@ class DatabaseSearchApp {
             return;
         }
         
-        // Show loading state
+        // Show loading state with placeholders that fill in as each section streams in
         const aiContent = document.getElementById('aiAnalysisContent');
         aiContent.innerHTML = `
-            <div class="text-center">
+            <div class="text-center mb-3">
                 <div class="spinner-border text-primary" role="status">
                     <span class="visually-hidden">Loading...</span>
                 </div>
-                <p class="mt-3">Analyzing RFP against company knowledge base...</p>
-                <small class="text-muted">This may take a few moments</small>
+                <p class="mt-3" id="aiAnalysisStatus">Analyzing RFP against company knowledge base...</p>
+                <small class="text-muted" id="aiAnalysisProgress">This may take a few moments</small>
             </div>
+            <div id="aiAnalysisStreamSections"></div>
         `;
         
-        // Call AI analysis API
-        fetch(`/api/ai-analyze/${this.selectedRfp.id}`, {
+        this.streamAiAnalysis(this.selectedRfp.id, forceRefresh)
+            .then(data => this.handleAiAnalysisResult(data))
+            .catch(error => {
+                console.error('AI Analysis error:', error);
+                this.showError(error.message || 'An error occurred during AI analysis');
+                this.resetAiAnalysisContent();
+            });
+    }
+
+    async streamAiAnalysis(rfpId, forceRefresh) {
+        const response = await fetch(`/api/ai-analyze/${rfpId}/stream`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
-            }
-        })
-        .then(response => response.json())
-        .then(data => {
-            console.log('AI Analysis response:', data); // Debug logging
-            if (data.success) {
-                console.log('Analysis data:', data.analysis); // Debug logging
+            },
+            body: JSON.stringify({ force_refresh: forceRefresh })
+        });
+        
+        // Errors detected before streaming starts come back as plain JSON
+        const contentType = response.headers.get('Content-Type') || '';
+        if (!contentType.includes('text/event-stream')) {
+            const data = await response.json();
+            throw new Error(data.error || 'AI analysis failed');
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let receivedChars = 0;
+        let result = null;
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            
+            // Server-sent events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
                 
-                // Check if metadata was extracted and populated
-                const extractedMetadata = data.analysis.extracted_metadata || {};
-                const populatedFields = Object.keys(extractedMetadata).filter(key => 
-                    extractedMetadata[key] && extractedMetadata[key] !== 'null' && extractedMetadata[key] !== ''
-                );
+                let eventName = 'message';
+                let dataText = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) eventName = line.slice(7);
+                    else if (line.startsWith('data: ')) dataText += line.slice(6);
+                });
+                const payload = dataText ? JSON.parse(dataText) : {};
                 
-                if (populatedFields.length > 0) {
-                    this.showSuccess(`AI Analysis completed! Automatically populated ${populatedFields.length} metadata fields: ${populatedFields.join(', ')}`);
-                } else {
-                    this.showSuccess('AI Analysis completed successfully!');
+                if (eventName === 'token') {
+                    receivedChars += payload.content.length;
+                    const progress = document.getElementById('aiAnalysisProgress');
+                    if (progress) progress.textContent = `Received ${receivedChars.toLocaleString()} characters of analysis`;
+                } else if (eventName === 'section') {
+                    this.displayStreamedSection(payload.section, payload.content);
+                } else if (eventName === 'status') {
+                    const status = document.getElementById('aiAnalysisStatus');
+                    if (status) status.textContent = payload.message;
+                } else if (eventName === 'complete') {
+                    result = payload;
+                } else if (eventName === 'error') {
+                    throw new Error(payload.error || 'AI analysis failed');
                 }
-                
-                this.displayAiAnalysis(data.analysis, data.member_matching);
-                
-                // Refresh RFP details to show the saved analysis and populated metadata
-                this.loadRfpList().then(() => {
-                    const updatedRfp = this.currentRfps.find(rfp => rfp.id === this.selectedRfp.id);
-                    if (updatedRfp) {
-                        this.selectedRfp = updatedRfp;
-                        this.displayRfpDetails(updatedRfp);
-                        // Also reload documents to fix the loading state
-                        this.loadDocuments(updatedRfp.id);
-                    }
-                });
-            } else {
-                this.showError(data.error || 'AI analysis failed');
-                aiContent.innerHTML = `
-                    <div class="text-center">
-                        <button class="btn btn-primary" onclick="app.generateAiAnalysis()">
-                            <i class="fas fa-robot me-2"></i>Generate AI Analysis
-                        </button>
-                    </div>
-                `;
             }
-        })
-        .catch(error => {
-            console.error('AI Analysis error:', error);
-            this.showError('An error occurred during AI analysis');
-            aiContent.innerHTML = `
-                <div class="text-center">
-                    <button class="btn btn-primary" onclick="app.generateAiAnalysis()">
-                        <i class="fas fa-robot me-2"></i>Generate AI Analysis
-                    </button>
+        }
+        
+        if (!result) {
+            throw new Error('The analysis stream ended before the analysis completed');
+        }
+        return result;
+    }
+
+    displayStreamedSection(section, content) {
+        const titles = {
+            fit_assessment: 'Fit Assessment',
+            competitive_position: 'Competitive Position',
+            key_strengths: 'Key Strengths',
+            gaps_challenges: 'Gaps & Challenges',
+            resource_requirements: 'Resource Requirements',
+            risk_assessment: 'Risk Assessment',
+            recommendations: 'Recommendations'
+        };
+        const container = document.getElementById('aiAnalysisStreamSections');
+        if (!container || !titles[section]) return;
+        
+        container.insertAdjacentHTML('beforeend', `
+            <div class="card mb-3">
+                <div class="card-header">
+                    <h6 class="mb-0">${titles[section]}</h6>
                 </div>
-            `;
+                <div class="card-body">
+                    <p class="mb-0">${this.escapeHtml(typeof content === 'string' ? content : JSON.stringify(content))}</p>
+                </div>
+            </div>
+        `);
+    }
+
+    handleAiAnalysisResult(data) {
+        console.log('AI Analysis response:', data); // Debug logging
+        console.log('Analysis data:', data.analysis); // Debug logging
+        
+        // Check if metadata was extracted and populated
+        const extractedMetadata = data.analysis.extracted_metadata || {};
+        const populatedFields = Object.keys(extractedMetadata).filter(key => 
+            extractedMetadata[key] && extractedMetadata[key] !== 'null' && extractedMetadata[key] !== ''
+        );
+        
+        if (data.cached) {
+            this.showSuccess('Loaded saved AI analysis - documents have not changed since the last run. Use Re-run Analysis to regenerate.');
+        } else if (populatedFields.length > 0) {
+            this.showSuccess(`AI Analysis completed! Automatically populated ${populatedFields.length} metadata fields: ${populatedFields.join(', ')}`);
+        } else {
+            this.showSuccess('AI Analysis completed successfully!');
+        }
+        
+        this.displayAiAnalysis(data.analysis, data.member_matching);
+        
+        // Refresh RFP details to show the saved analysis and populated metadata
+        this.loadRfpList().then(() => {
+            const updatedRfp = this.currentRfps.find(rfp => rfp.id === this.selectedRfp.id);
+            if (updatedRfp) {
+                this.selectedRfp = updatedRfp;
+                this.displayRfpDetails(updatedRfp);
+                // Also reload documents to fix the loading state
+                this.loadDocuments(updatedRfp.id);
+            }
         });
     }
 
+    resetAiAnalysisContent() {
+        const aiContent = document.getElementById('aiAnalysisContent');
+        aiContent.innerHTML = `
+            <div class="text-center">
+                <button class="btn btn-primary" onclick="app.generateAiAnalysis()">
+                    <i class="fas fa-robot me-2"></i>Generate AI Analysis
+                </button>
+            </div>
+        `;
+    }
+
     displayAiAnalysis(analysis, memberMatching = null) {
         console.log('Displaying analysis:', analysis); // Debug logging
         console.log('Member matching:', memberMatching); // Debug logging
@@ -1504,7 +1792,7 @@ class DatabaseSearchApp {
                 ${memberMatchingHtml}
                 
                 <div class="text-center mt-3">
-                    <button class="btn btn-outline-primary" onclick="app.generateAiAnalysis()">
+                    <button class="btn btn-outline-primary" onclick="app.generateAiAnalysis(true)">
                         <i class="fas fa-refresh me-2"></i>Re-run Analysis
                     </button>
                 </div>
@@ -1537,7 +1825,7 @@ class DatabaseSearchApp {
                         <button class="btn btn-outline-success btn-sm me-2" onclick="app.findRelevantMembers()">
                             <i class="fas fa-user-friends me-2"></i>Find Team Members
                         </button>
-                        <button class="btn btn-outline-primary btn-sm" onclick="app.generateAiAnalysis()">
+                        <button class="btn btn-outline-primary btn-sm" onclick="app.generateAiAnalysis(true)">
                             <i class="fas fa-refresh me-2"></i>Re-run Analysis
                         </button>
                     </div>
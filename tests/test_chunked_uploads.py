@@ -0,0 +1,142 @@
+import io
+import os
+
+import pytest
+
+from app.services.chunked_uploads import ChunkedUploadError, ChunkedUploadStore, parse_content_range
+
+
+DATA = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ChunkedUploadStore(str(tmp_path), max_bytes=1024 * 1024)
+
+
+def send(store, upload_id, start, end, data=DATA):
+    return store.write_chunk(upload_id, io.BytesIO(data[start:end]), start, end, len(data))
+
+
+def test_parse_content_range():
+    assert parse_content_range('bytes 0-99/1000') == (0, 100, 1000)
+    assert parse_content_range(' bytes 900-999/1000 ') == (900, 1000, 1000)
+
+
+@pytest.mark.parametrize('header', [None, '', 'bytes */1000', 'bytes 0-99', 'items 0-99/1000', 'bytes -1-99/1000'])
+def test_parse_content_range_requires_the_header(header):
+    with pytest.raises(ChunkedUploadError) as error:
+        parse_content_range(header)
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize('header', ['bytes 100-99/1000', 'bytes 0-1000/1000', 'bytes 5-5/5'])
+def test_parse_content_range_rejects_impossible_ranges(header):
+    with pytest.raises(ChunkedUploadError, match='Invalid Content-Range'):
+        parse_content_range(header)
+
+
+def test_create_checks_size(store):
+    with pytest.raises(ChunkedUploadError) as error:
+        store.create(1, 'tender.pdf', 0)
+    assert error.value.status_code == 400
+
+    with pytest.raises(ChunkedUploadError) as error:
+        store.create(1, 'tender.pdf', 2 * 1024 * 1024)
+    assert error.value.status_code == 413
+
+
+def test_chunks_in_order_complete_the_upload(store):
+    upload_id = store.create(1, 'tender.pdf', len(DATA))['upload_id']
+
+    for start in range(0, len(DATA), 4096):
+        manifest = send(store, upload_id, start, min(start + 4096, len(DATA)))
+
+    assert manifest['received'] == len(DATA)
+    manifest, path, content_hash = store.complete(upload_id)
+    with open(path, 'rb') as f:
+        assert f.read() == DATA
+    assert manifest['document_name'] == 'tender.pdf'
+    assert len(content_hash) == 64
+
+
+def test_overlapping_retry_is_accepted(store):
+    upload_id = store.create(1, 'tender.pdf', len(DATA))['upload_id']
+    send(store, upload_id, 0, 6000)
+
+    # A client that missed the response resends from an earlier offset
+    assert send(store, upload_id, 4000, 8000)['received'] == 8000
+    # A chunk entirely below the received offset changes nothing
+    assert send(store, upload_id, 0, 1000)['received'] == 8000
+
+    send(store, upload_id, 8000, len(DATA))
+    _, path, _ = store.complete(upload_id)
+    with open(path, 'rb') as f:
+        assert f.read() == DATA
+
+
+def test_out_of_order_chunk_reports_resume_offset(store):
+    upload_id = store.create(1, 'tender.pdf', len(DATA))['upload_id']
+    send(store, upload_id, 0, 1000)
+
+    with pytest.raises(ChunkedUploadError) as error:
+        send(store, upload_id, 2000, 3000)
+
+    assert error.value.status_code == 409
+    assert error.value.received == 1000
+    assert store.status(upload_id)['received'] == 1000
+
+
+def test_dropped_chunk_keeps_the_bytes_that_arrived(store):
+    upload_id = store.create(1, 'tender.pdf', len(DATA))['upload_id']
+
+    with pytest.raises(ChunkedUploadError) as error:
+        store.write_chunk(upload_id, io.BytesIO(DATA[:1500]), 0, 4000, len(DATA))
+
+    assert error.value.received == 1500
+    # The client resumes from the reported offset
+    assert send(store, upload_id, 1500, len(DATA))['received'] == len(DATA)
+    _, path, _ = store.complete(upload_id)
+    with open(path, 'rb') as f:
+        assert f.read() == DATA
+
+
+def test_total_must_match_the_started_size(store):
+    upload_id = store.create(1, 'tender.pdf', len(DATA))['upload_id']
+
+    with pytest.raises(ChunkedUploadError) as error:
+        store.write_chunk(upload_id, io.BytesIO(b'x' * 10), 0, 10, len(DATA) + 1)
+    assert error.value.status_code == 400
+    assert error.value.received == 0
+
+
+def test_incomplete_upload_cannot_complete(store):
+    upload_id = store.create(1, 'tender.pdf', len(DATA))['upload_id']
+    send(store, upload_id, 0, 100)
+
+    with pytest.raises(ChunkedUploadError) as error:
+        store.complete(upload_id)
+    assert error.value.status_code == 409
+    assert error.value.received == 100
+
+
+def test_unknown_and_discarded_uploads(store):
+    with pytest.raises(ChunkedUploadError) as error:
+        store.status('../../etc/passwd')
+    assert error.value.status_code == 404
+
+    upload_id = store.create(1, 'tender.pdf', len(DATA))['upload_id']
+    store.discard(upload_id)
+    with pytest.raises(ChunkedUploadError) as error:
+        send(store, upload_id, 0, 100)
+    assert error.value.status_code == 404
+    assert os.listdir(store.directory) == []
+
+
+def test_cleanup_expired(store):
+    upload_id = store.create(1, 'tender.pdf', len(DATA))['upload_id']
+    manifest_path = os.path.join(store.directory, upload_id + '.json')
+    os.utime(manifest_path, (0, 0))
+
+    assert store.cleanup_expired() == 1
+    assert not os.path.exists(manifest_path)
@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from app.services.document_blobs import DocumentBlobError, DocumentBlobStore
+
+
+CONTENT_HASH = 'ab' * 32
+PAGES = ['First page\n', '', 'Dritte Seite – ünïcödé ✓\n' * 200, 'Last page']
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DocumentBlobStore(str(tmp_path), compression_level=3)
+
+
+def test_write_and_read_round_trip(store):
+    pointers = store.write(CONTENT_HASH, PAGES)
+
+    assert len(pointers) == len(PAGES)
+    assert [store.read_page(CONTENT_HASH, offset, length) for offset, length in pointers] == PAGES
+    assert store.read_text(CONTENT_HASH) == "".join(PAGES)
+    assert store.read_text(CONTENT_HASH, pointers[2:]) == "".join(PAGES[2:])
+
+
+def test_frames_are_contiguous(store):
+    pointers = store.write(CONTENT_HASH, PAGES)
+
+    assert pointers[0][0] == 0
+    for (offset, length), (next_offset, _) in zip(pointers, pointers[1:]):
+        assert offset + length == next_offset
+    assert os.path.getsize(store.path(CONTENT_HASH)) == pointers[-1][0] + pointers[-1][1]
+
+
+def test_large_document_spans_several_reads(store):
+    pages = [f'page {number} ' + os.urandom(40000).hex() for number in range(5)]
+    store.write(CONTENT_HASH, pages)
+
+    assert store.read_text(CONTENT_HASH) == "".join(pages)
+
+
+def test_empty_page_list(store):
+    assert store.write(CONTENT_HASH, []) == []
+
+    assert store.read_text(CONTENT_HASH) == ''
+    assert store.read_text(CONTENT_HASH, []) == ''
+
+
+def test_rewrite_replaces_blob(store):
+    store.write(CONTENT_HASH, ['old'])
+    store.remove(CONTENT_HASH)
+    pointers = store.write(CONTENT_HASH, ['new text'])
+
+    assert store.read_page(CONTENT_HASH, *pointers[0]) == 'new text'
+
+
+def test_missing_blob(store):
+    with pytest.raises(DocumentBlobError, match='missing'):
+        store.read_text(CONTENT_HASH)
+
+    store.write(CONTENT_HASH, PAGES)
+    store.remove(CONTENT_HASH)
+    store.remove(CONTENT_HASH)
+    with pytest.raises(DocumentBlobError, match='missing'):
+        store.read_page(CONTENT_HASH, 0, 10)
+
+
+def test_truncated_blob(store):
+    pointers = store.write(CONTENT_HASH, PAGES)
+    path = store.path(CONTENT_HASH)
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:pointers[2][0] + 10])
+
+    with pytest.raises(DocumentBlobError, match='corrupt'):
+        store.read_text(CONTENT_HASH)
+    with pytest.raises(DocumentBlobError, match='corrupt'):
+        store.read_page(CONTENT_HASH, *pointers[3])
+    assert store.read_page(CONTENT_HASH, *pointers[0]) == PAGES[0]
+
+
+def test_corrupt_blob(store):
+    path = store.path(CONTENT_HASH)
+    os.makedirs(os.path.dirname(path))
+    with open(path, 'wb') as f:
+        f.write(b'not a zstd frame at all')
+
+    with pytest.raises(DocumentBlobError, match='corrupt'):
+        store.read_text(CONTENT_HASH)
+    with pytest.raises(DocumentBlobError, match='corrupt'):
+        store.read_page(CONTENT_HASH, 0, 5)
+
+
+@pytest.mark.parametrize('content_hash', ['', 'AB' * 32, 'ab' * 31, '../' + 'a' * 61])
+def test_invalid_content_hash(store, content_hash):
+    with pytest.raises(DocumentBlobError, match='Invalid content hash'):
+        store.path(content_hash)
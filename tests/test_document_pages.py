@@ -0,0 +1,48 @@
+import pytest
+
+from app.services.document_extraction import WORD_PAGE_CHARS, split_text_pages
+
+
+SAMPLES = [
+    '',
+    'one line without a newline',
+    'first\nsecond\n',
+    '\n\n\n',
+    'windows\r\nline ends\r\nand a form\x0cfeed\n',
+    'ünïcödé ✓ text\n' * 500,
+    ''.join(f'Paragraph {i}: ' + 'word ' * (i % 40) + '\n' for i in range(2000))
+]
+
+
+@pytest.mark.parametrize('text', SAMPLES)
+@pytest.mark.parametrize('page_chars', [1, 10, 100, WORD_PAGE_CHARS])
+def test_pages_join_back_to_the_text(text, page_chars):
+    assert "".join(split_text_pages(text, page_chars)) == text
+
+
+def test_empty_text_is_one_empty_page():
+    assert split_text_pages('') == ['']
+
+
+def test_short_text_is_one_page():
+    assert split_text_pages('a\nb\n', page_chars=100) == ['a\nb\n']
+
+
+def test_pages_break_at_line_ends_once_full():
+    text = 'aaaa\nbbbb\ncccc\ndd'
+
+    assert split_text_pages(text, page_chars=8) == ['aaaa\nbbbb\n', 'cccc\ndd']
+
+
+def test_long_line_is_not_split():
+    line = 'x' * 50
+
+    assert split_text_pages(line + '\nend', page_chars=10) == [line + '\n', 'end']
+
+
+def test_every_page_but_the_last_reaches_the_page_size():
+    pages = split_text_pages(SAMPLES[-1], page_chars=WORD_PAGE_CHARS)
+
+    assert len(pages) > 1
+    assert all(len(page) >= WORD_PAGE_CHARS for page in pages[:-1])
+    assert all(page.endswith('\n') for page in pages[:-1])
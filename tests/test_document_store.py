@@ -0,0 +1,151 @@
+import hashlib
+import re
+
+from app.services.document_store import (
+    SIMHASH_MIN_SHINGLES, compute_simhash, find_duplicates, hamming_distance, insert_document
+)
+
+
+def reference_simhash(text):
+    """The plain per-bit SimHash loop, to check the vectorized version against"""
+    words = re.findall(r"\w+", text.lower())
+    shingles = [" ".join(words[i:i + 3]) for i in range(len(words) - 2)]
+    weights = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    simhash = sum(1 << bit for bit in range(64) if weights[bit] > 0)
+    return simhash - (1 << 64) if simhash >= 1 << 63 else simhash
+
+
+TENDER = ("The Ministry of Environment invites proposals for a national climate adaptation strategy, "
+          "including a vulnerability assessment of key sectors and a prioritised investment plan. "
+          "Proposals must be submitted by 30 November and the estimated budget is 250000 USD. ") * 20
+
+
+class FakeCursor:
+    """Returns the queued results in order and records every statement"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append((' '.join(sql.split()), params))
+        self.current = self.results.pop(0) if self.results else None
+
+    def fetchall(self):
+        return self.current
+
+    def fetchone(self):
+        return self.current[0]
+
+
+def test_simhash_matches_reference():
+    for text in (TENDER, TENDER.upper(), ' '.join(f'word{i}' for i in range(SIMHASH_MIN_SHINGLES + 2))):
+        assert compute_simhash(text) == reference_simhash(text)
+
+
+def test_short_texts_have_no_simhash():
+    for text in ('', '   \n\x0c  ', 'Request for Proposals - Cover Sheet',
+                 ' '.join(f'word{i}' for i in range(SIMHASH_MIN_SHINGLES + 1))):
+        assert compute_simhash(text) is None
+
+
+def test_simhash_fits_signed_bigint():
+    for text in (TENDER, TENDER.upper() + ' extra', ' '.join('abcdefg') * 10):
+        assert -(1 << 63) <= compute_simhash(text) < 1 << 63
+
+
+def test_simhash_ignores_case_and_punctuation():
+    assert compute_simhash(TENDER.upper().replace(',', ' ').replace('.', '!')) == compute_simhash(TENDER)
+
+
+def test_small_edit_is_a_near_duplicate():
+    edited = TENDER.replace('30 November', '15 December', 1)
+
+    assert hamming_distance(compute_simhash(TENDER), compute_simhash(edited)) <= 3
+    assert hamming_distance(compute_simhash(TENDER), compute_simhash('Unrelated call for catering services ' * 40)) > 3
+
+
+def test_hamming_distance_of_signed_values():
+    assert hamming_distance(-1, 0) == 64
+    assert hamming_distance(-1, -2) == 1
+    assert hamming_distance(5, 5) == 0
+
+
+def test_find_duplicates_returns_exact_and_near_matches(monkeypatch):
+    monkeypatch.setenv('DOCUMENT_SIMHASH_DISTANCE', '3')
+    cursor = FakeCursor([
+        (1, 'old.pdf', 'hash-a', 0b1111),
+        (2, 'copy.pdf', 'hash-b', -1),
+        (3, 'other.pdf', 'hash-c', 0b1)
+    ])
+
+    matches = find_duplicates(cursor, 7, 'hash-b', 0b0111)
+
+    assert matches == [
+        {'id': 1, 'document_name': 'old.pdf', 'match': 'near'},
+        {'id': 2, 'document_name': 'copy.pdf', 'match': 'exact'},
+        {'id': 3, 'document_name': 'other.pdf', 'match': 'near'}
+    ]
+    assert cursor.statements[0][1] == (7,)
+
+
+def stored_item(content_hash, simhash):
+    return {'document_name': 'tender_v2.pdf', 'content_hash': content_hash, 'document_text': 'text',
+            'pages': None, 'simhash': simhash, 'stored': True, 'extraction': {'reused': True}}
+
+
+def test_near_duplicate_upload_supersedes_older_documents():
+    cursor = FakeCursor(
+        [(1, 'tender_v1.pdf', 'hash-a', 0b1111)],
+        [(5, 'tender_v2.pdf', None)],
+        None
+    )
+
+    result = insert_document(cursor, 7, stored_item('hash-b', 0b1110))
+
+    assert result['duplicate'] is None
+    assert result['supersedes'] == [{'id': 1, 'document_name': 'tender_v1.pdf', 'match': 'near'}]
+    insert_sql, insert_params = cursor.statements[1]
+    assert insert_sql.startswith('INSERT INTO documents') and insert_params[2] is None
+    update_sql, update_params = cursor.statements[2]
+    assert update_sql.startswith('UPDATE documents SET duplicate_of')
+    assert update_params == (5, 7, [1], [1])
+
+
+def test_exact_copy_is_marked_as_duplicate():
+    cursor = FakeCursor(
+        [(1, 'tender.pdf', 'hash-a', 0b1111), (2, 'tender_v0.pdf', 'hash-z', 0b1110)],
+        [(5, 'tender copy.pdf', None)]
+    )
+
+    result = insert_document(cursor, 7, stored_item('hash-a', 0b1111))
+
+    assert result['duplicate'] == {'id': 1, 'document_name': 'tender.pdf', 'match': 'exact'}
+    assert result['supersedes'] == []
+    assert cursor.statements[1][1][2] == 1
+    assert len(cursor.statements) == 2
+
+
+def test_different_files_with_empty_text_are_not_duplicates():
+    # Two scanned PDFs: different files, no extracted text. Older contents stored the SimHash 0.
+    cursor = FakeCursor(
+        [(1, 'scan_a.pdf', 'hash-a', None), (2, 'scan_b.pdf', 'hash-b', 0)],
+        [(5, 'scan_c.pdf', None)]
+    )
+
+    result = insert_document(cursor, 7, stored_item('hash-c', compute_simhash('')))
+
+    assert result['duplicate'] is None
+    assert result['supersedes'] == []
+    assert cursor.statements[1][1][2] is None
+    assert len(cursor.statements) == 2
+
+
+def test_empty_text_still_matches_the_same_file():
+    cursor = FakeCursor([(1, 'scan.pdf', 'hash-a', None)])
+
+    assert find_duplicates(cursor, 7, 'hash-a', None) == [{'id': 1, 'document_name': 'scan.pdf', 'match': 'exact'}]
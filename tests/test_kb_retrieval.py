@@ -0,0 +1,83 @@
+from app.services.kb_retrieval import BM25Index, chunk_documents, estimate_tokens, split_text, tokenize
+
+
+def make_index(texts, chunk_chars=1200):
+    return BM25Index(chunk_documents([(f"doc{i}.txt", text) for i, text in enumerate(texts)], chunk_chars))
+
+
+def test_tokenize_drops_stopwords_and_single_characters():
+    assert tokenize("The Scope 3 emissions of a supplier, e.g. X") == ['scope', 'emissions', 'supplier']
+
+
+def test_estimate_tokens_rounds_up():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('abc') == 1
+    assert estimate_tokens('abcde') == 2
+
+
+def test_chunk_documents_keeps_paragraphs_together_and_numbers_positions():
+    text = "\n\n".join(["alpha " * 50, "beta " * 50, "gamma " * 50])
+    passages = chunk_documents([("kb.txt", text)], chunk_chars=400)
+    assert [p['position'] for p in passages] == list(range(len(passages)))
+    assert all(p['source'] == 'kb.txt' for p in passages)
+    assert "\n\n".join(p['text'] for p in passages).split() == text.split()
+
+
+def test_split_text_respects_max_chars():
+    text = "\n".join(f"line {i} " + "x" * 30 for i in range(100))
+    pieces = split_text(text, 200)
+    assert all(len(piece) <= 200 for piece in pieces)
+    assert " ".join(pieces).split() == text.split()
+
+
+def test_score_ranks_passage_with_rare_query_term_first():
+    index = make_index([
+        "climate finance for renewable energy projects",
+        "renewable energy grid integration",
+        "carbon accounting and scope emissions reporting",
+    ])
+    ranked = index.score("scope emissions reporting for renewable energy")
+    assert ranked[0][1] == 2
+    assert [score for score, _ in ranked] == sorted((score for score, _ in ranked), reverse=True)
+
+
+def test_score_without_matching_terms_is_empty():
+    index = make_index(["climate finance", "grid integration"])
+    assert index.score("zebra xylophone") == []
+    assert index.score("") == []
+
+
+def test_longer_passage_scores_lower_for_same_term_frequency():
+    index = make_index(["solar", "solar " + "filler words here " * 20])
+    scores = dict((position, score) for score, position in index.score("solar"))
+    assert scores[0] > scores[1]
+
+
+def test_select_context_returns_everything_within_budget():
+    index = make_index(["first passage", "second passage"])
+    context, stats = index.select_context("anything", token_budget=10_000)
+    assert stats['passages_selected'] == 2
+    assert "=== doc0.txt ===" in context and "=== doc1.txt ===" in context
+
+
+def test_select_context_keeps_budget_and_corpus_order():
+    texts = [f"topic{i} " * 40 for i in range(6)]
+    index = make_index(texts)
+    budget = index.passages[0]['tokens'] * 2
+    context, stats = index.select_context("topic4 topic1", token_budget=budget)
+    assert stats['context_tokens'] <= budget + 20
+    assert stats['sources'] == ['doc1.txt', 'doc4.txt']
+    assert context.index('doc1.txt') < context.index('doc4.txt')
+
+
+def test_select_context_falls_back_to_corpus_order_when_nothing_matches():
+    index = make_index([f"topic{i} " * 40 for i in range(4)])
+    _, stats = index.select_context("unrelated", token_budget=index.passages[0]['tokens'] + 1)
+    assert stats['sources'] == ['doc0.txt']
+
+
+def test_empty_index():
+    index = BM25Index([])
+    assert index.score("anything") == []
+    context, stats = index.select_context("anything", token_budget=100)
+    assert context == '' and stats['passages_selected'] == 0
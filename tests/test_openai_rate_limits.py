@@ -0,0 +1,113 @@
+import pytest
+
+from app.services import openai_client
+from app.services.openai_client import LatencyTracker, RateLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(openai_client.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(openai_client.time, 'sleep', clock.sleep)
+    return clock
+
+
+def test_bucket_starts_full(clock):
+    bucket = TokenBucket(60)
+
+    assert bucket.try_acquire(60) == 0
+    assert bucket.available == 0
+
+
+def test_empty_bucket_reports_wait_and_refills(clock):
+    bucket = TokenBucket(60)
+    bucket.try_acquire(60)
+
+    # 60 per minute refills one unit per second
+    assert bucket.try_acquire(5) == pytest.approx(5.0)
+    assert bucket.available == 0
+
+    clock.now += 2
+    assert bucket.try_acquire(5) == pytest.approx(3.0)
+
+    clock.now += 3
+    assert bucket.try_acquire(5) == 0
+    assert bucket.available == pytest.approx(0)
+
+
+def test_refill_is_capped_at_capacity(clock):
+    bucket = TokenBucket(60)
+    bucket.try_acquire(30)
+
+    clock.now += 3600
+    assert bucket.try_acquire(0) == 0
+    assert bucket.available == 60
+
+
+def test_request_larger_than_bucket_waits_for_a_full_bucket(clock):
+    bucket = TokenBucket(60)
+
+    assert bucket.try_acquire(500) == 0
+    assert bucket.available == 0
+    assert bucket.try_acquire(500) == pytest.approx(60.0)
+
+
+def test_acquire_sleeps_until_available(clock):
+    bucket = TokenBucket(60)
+    bucket.try_acquire(60)
+
+    bucket.acquire(3)
+
+    assert clock.slept == [1.0, 1.0, 1.0]
+    assert bucket.available == pytest.approx(0)
+
+
+def test_release_is_capped_at_capacity(clock):
+    bucket = TokenBucket(60)
+    bucket.try_acquire(10)
+
+    bucket.release(100)
+
+    assert bucket.available == 60
+
+
+def test_rate_limiter_returns_request_when_tokens_are_short(clock):
+    limiter = RateLimiter(requests_per_minute=10, tokens_per_minute=1000)
+
+    assert limiter.try_acquire(800)
+    assert not limiter.try_acquire(800)
+    # The request slot taken before the token check failed is given back
+    assert limiter.requests.available == 9
+    assert limiter.tokens.available == 200
+
+
+def test_rate_limiter_refuses_without_request_slots(clock):
+    limiter = RateLimiter(requests_per_minute=1, tokens_per_minute=1000)
+
+    assert limiter.try_acquire(10)
+    assert not limiter.try_acquire(10)
+    assert limiter.tokens.available == 990
+
+
+def test_latency_percentile_needs_enough_samples():
+    tracker = LatencyTracker(window=100)
+    for seconds in range(1, 20):
+        tracker.record(seconds)
+    assert tracker.percentile(0.95) is None
+
+    tracker.record(20)
+    assert tracker.percentile(0.95) == 20
+    assert tracker.percentile(0.5) == 11
@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+from app.services import document_extraction
+from app.services.document_extraction import DocumentExtractor, extract_pdf_pages
+
+
+class FakeEngine:
+    def open(self, path):
+        pass
+
+    def page_text(self, page_number):
+        return f"page {page_number + 1}"
+
+    def close(self):
+        pass
+
+
+def run_in_thread(target):
+    results = []
+    thread = threading.Thread(target=lambda: results.append(target()))
+    thread.start()
+    thread.join()
+    return results[0]
+
+
+@pytest.fixture
+def blank_pdf(tmp_path):
+    from PyPDF2 import PdfWriter
+
+    writer = PdfWriter()
+    for _ in range(3):
+        writer.add_blank_page(width=200, height=200)
+    path = tmp_path / 'blank.pdf'
+    with open(path, 'wb') as f:
+        writer.write(f)
+    return str(path)
+
+
+def test_page_budget_off_the_main_thread_is_logged(monkeypatch, capsys):
+    monkeypatch.setitem(document_extraction.PDF_ENGINES, 'fake', FakeEngine)
+
+    pages = run_in_thread(lambda: extract_pdf_pages('tender.pdf', 0, 2, page_time_budget=5, engine_name='fake'))
+
+    assert pages == [('page 1', False), ('page 2', False)]
+    assert 'without the 5s page time budget' in capsys.readouterr().out
+
+
+def test_page_budget_on_the_main_thread_is_not_logged(monkeypatch, capsys):
+    monkeypatch.setitem(document_extraction.PDF_ENGINES, 'fake', FakeEngine)
+
+    assert extract_pdf_pages('tender.pdf', 0, 1, page_time_budget=5, engine_name='fake') == [('page 1', False)]
+    assert 'page time budget' not in capsys.readouterr().out
+
+
+def test_small_pdf_goes_to_the_pool_when_a_page_budget_is_set(blank_pdf):
+    extractor = DocumentExtractor(workers=2, page_time_budget=5, total_time_budget=60)
+    try:
+        pages, stats = run_in_thread(lambda: extractor.extract_pdf(blank_pdf, engine_name='pypdf2'))
+        assert extractor._pool is not None
+    finally:
+        extractor._reset_pool()
+
+    assert len(pages) == 3
+    assert stats['pages'] == 3
+    assert stats['workers'] == 1
+    assert stats['timed_out_pages'] == []
+
+
+def test_small_pdf_is_extracted_inline_without_a_budget(blank_pdf, monkeypatch):
+    extractor = DocumentExtractor(workers=2, page_time_budget=0)
+    monkeypatch.setattr(extractor, '_get_pool', lambda: pytest.fail('the pool should not be used'))
+
+    pages, stats = extractor.extract_pdf(blank_pdf, engine_name='pypdf2')
+
+    assert len(pages) == 3
+    assert stats['workers'] == 1
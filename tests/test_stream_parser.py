@@ -0,0 +1,85 @@
+import json
+
+from app.services.stream_parser import IncrementalSectionParser
+
+
+DOCUMENT = {
+    'analysis': {
+        'fit_assessment': 'High: "core" match',
+        'risks': ['tight deadline', 'on-site work'],
+        'score': 7.5,
+        'eligible': True
+    },
+    'extracted_metadata': {'due_date': None}
+}
+
+
+def feed_all(parser, chunks):
+    results = []
+    for chunk in chunks:
+        results.extend(parser.feed(chunk))
+    return results
+
+
+def test_reports_nested_values_in_order():
+    results = feed_all(IncrementalSectionParser(), [json.dumps(DOCUMENT)])
+
+    assert results == [
+        (('analysis', 'fit_assessment'), 'High: "core" match'),
+        (('analysis', 'risks'), ['tight deadline', 'on-site work']),
+        (('analysis', 'score'), 7.5),
+        (('analysis', 'eligible'), True),
+        (('analysis',), DOCUMENT['analysis']),
+        (('extracted_metadata', 'due_date'), None),
+        (('extracted_metadata',), DOCUMENT['extracted_metadata'])
+    ]
+
+
+def test_any_chunking_gives_the_same_values():
+    text = json.dumps(DOCUMENT, indent=2)
+    expected = feed_all(IncrementalSectionParser(), [text])
+
+    for size in (1, 2, 3, 7, 64):
+        chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        assert feed_all(IncrementalSectionParser(), chunks) == expected
+
+
+def test_chunk_split_inside_string_escape():
+    parser = IncrementalSectionParser()
+
+    assert parser.feed('{"summary": "say \\') == []
+    assert parser.feed('"hi\\') == []
+    assert parser.feed('" and \\u00e9') == []
+    assert parser.feed('"}') == [(('summary',), 'say "hi" and é')]
+
+
+def test_value_is_reported_once_complete():
+    parser = IncrementalSectionParser()
+
+    assert parser.feed('{"a": {"b": "one", "c": 1') == [(('a', 'b'), 'one')]
+    # A number is only known to be complete when the next token arrives
+    assert parser.feed('2') == []
+    assert parser.feed('}') == [(('a', 'c'), 12), (('a',), {'b': 'one', 'c': 12})]
+
+
+def test_ignores_text_around_the_object():
+    text = 'Here you go:\n```json\n{"a": {"b": "{not a brace}"}}\n```\n{"ignored": 1}'
+
+    assert feed_all(IncrementalSectionParser(), [text]) == [
+        (('a', 'b'), '{not a brace}'),
+        (('a',), {'b': '{not a brace}'})
+    ]
+
+
+def test_array_items_are_not_reported_separately():
+    results = feed_all(IncrementalSectionParser(), ['{"items": [{"x": 1}, "y"]}'])
+
+    assert results == [(('items', 'x'), 1), (('items',), [{'x': 1}, 'y'])]
+
+
+def test_empty_and_truncated_input():
+    parser = IncrementalSectionParser()
+
+    assert parser.feed('') == []
+    assert parser.feed('{"a": "unterminated') == []
+    assert parser.feed('') == []
@@ -0,0 +1,81 @@
+from app.services.text_normalization import collapse_whitespace, normalize_pages
+
+
+def make_pages(count, body=lambda number: f"Section {number}\nBody text of page {number}."):
+    return [
+        f"ACME Ministry - RFP 2025/17\nConfidential\n{body(number)}\nPage {number} of {count}"
+        for number in range(1, count + 1)
+    ]
+
+
+def test_empty_page_list():
+    pages, stats = normalize_pages([])
+
+    assert pages == []
+    assert stats == {'repeated_lines': 0, 'lines_removed': 0, 'bytes_before': 0, 'bytes_after': 0, 'bytes_saved': 0}
+
+
+def test_empty_pages():
+    pages, stats = normalize_pages(['', '', '', ''])
+
+    assert pages == ['', '', '', '']
+    assert stats['lines_removed'] == 0
+
+
+def test_repeated_header_footer_and_page_numbers_are_kept_once():
+    pages, stats = normalize_pages(make_pages(5))
+
+    assert pages[0] == "ACME Ministry - RFP 2025/17\nConfidential\nSection 1\nBody text of page 1.\nPage 1 of 5"
+    for number, page in enumerate(pages[1:], start=2):
+        assert page == f"Section {number}\nBody text of page {number}."
+    assert stats['repeated_lines'] == 3
+    assert stats['lines_removed'] == 12
+    assert stats['bytes_saved'] == stats['bytes_before'] - stats['bytes_after'] > 0
+
+
+def test_numbered_content_lines_are_not_boilerplate():
+    # 'Section N' sits on the page edge of every page but differs per page
+    pages, _ = normalize_pages(make_pages(4))
+
+    assert [page.count('Section') for page in pages] == [1, 1, 1, 1]
+
+
+def test_repeats_in_the_body_are_content():
+    # Only the EDGE_LINES non-blank lines at each end of a page are checked for repeats
+    def body(number):
+        return "\n".join([f"Section {number}", f"Scope {number}", "table row", "table row", "table row",
+                          f"Note {number}", f"Contact {number}", f"Deadline {number}"])
+
+    pages, _ = normalize_pages(make_pages(4, body))
+
+    assert all(page.count('table row') == 3 for page in pages)
+
+
+def test_needs_enough_pages():
+    pages, stats = normalize_pages(make_pages(2))
+
+    assert pages == make_pages(2)
+    assert stats['repeated_lines'] == 0
+
+
+def test_lines_on_under_half_of_the_pages_are_kept():
+    source = make_pages(8)
+    source = [page.replace('Confidential\n', '') if number > 3 else page for number, page in enumerate(source, 1)]
+
+    pages, _ = normalize_pages(source)
+
+    assert sum(page.count('Confidential') for page in pages) == 3
+
+
+def test_strip_repeated_off_only_collapses_whitespace():
+    source = [page.replace('Body', 'Body   \t text\n\n\n\n') for page in make_pages(4)]
+
+    pages, stats = normalize_pages(source, strip_repeated=False)
+
+    assert pages == [collapse_whitespace(page) for page in source]
+    assert stats['lines_removed'] == 0
+    assert all(page.startswith('ACME Ministry') for page in pages)
+
+
+def test_collapse_whitespace():
+    assert collapse_whitespace("a  \t b   \n\n\n\nc \n") == "a b\n\nc\n"